@@ -0,0 +1,205 @@
+# Text to glyph outlines.
+# Basic process:
+#   1.the fonts under SVG_FONT_DIRS are indexed once by family and weight (name and OS/2 tables),
+#     a (family, weight) request picks the upright face with the closest weight
+#   2.every character is mapped through the cmap of the requested font, characters it does not
+#     cover fall back to SVG_FALLBACK_FONTS; pen positions come from the horizontal metrics and
+#     the pair kerning of the legacy 'kern' table (no complex shaping: ligatures, GPOS, RTL)
+#   3.glyph outlines are SVG path data in font units, cached per (font, weight, glyph) in a
+#     byte-bounded LRU; a document defines every distinct glyph once in <defs> and places it
+#     with <use>, so repeated characters and repeated requests only cost the layout
+# fontTools is optional, without it layout_text() reports the outline mode as unavailable.
+
+import functools
+import hashlib
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from config import SVG_FALLBACK_FONTS, SVG_FONT_DIRS, SVG_GLYPH_CACHE_MB
+from utils.cache import SizedLRU
+
+try:
+    from fontTools.pens.svgPathPen import SVGPathPen
+    from fontTools.ttLib import TTCollection, TTFont
+except ImportError:
+    TTFont = None
+
+FONT_SUFFIXES = (".ttf", ".otf", ".ttc", ".otc")
+WEIGHTS = {"thin": 100, "extra-light": 200, "light": 300, "lighter": 300, "normal": 400, "regular": 400,
+           "medium": 500, "semi-bold": 600, "bold": 700, "bolder": 700, "extra-bold": 800, "black": 900}
+
+# (font id, weight, glyph name) -> SVG path data in font units
+glyph_cache = SizedLRU(SVG_GLYPH_CACHE_MB * 1024 * 1024)
+# TTFont loads tables lazily and is not thread safe, outlines are extracted under this lock
+_font_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class FontFace:
+    path: str
+    number: int
+    family: str
+    weight: int
+
+    @property
+    def id(self) -> str:
+        return hashlib.sha1(f"{self.path}#{self.number}".encode("utf-8")).hexdigest()[:8]
+
+
+@dataclass
+class TextLayout:
+    # glyph element id -> path data in font units
+    glyphs: dict[str, str] = field(default_factory=dict)
+    # (glyph element id, x, y, scale) in pixels relative to the text origin (first baseline)
+    placements: list[tuple[str, float, float, float]] = field(default_factory=list)
+    width: float = 0.0
+    height: float = 0.0
+    descent: float = 0.0
+    fonts: list[str] = field(default_factory=list)
+
+
+def parse_weight(weight: str | int) -> int:
+    if isinstance(weight, int) or str(weight).isdigit():
+        return min(max(int(weight), 1), 1000)
+    return WEIGHTS.get(str(weight).strip().lower().replace("_", "-"), 400)
+
+
+def _read_faces(path: Path) -> list[FontFace]:
+    # the faces of a collection share one file handle, it is closed once after every face was read
+    if path.suffix.lower() in (".ttc", ".otc"):
+        source = TTCollection(str(path), lazy=True)
+        fonts = source.fonts
+    else:
+        source = TTFont(str(path), lazy=True)
+        fonts = [source]
+    faces = []
+    try:
+        for number, font in enumerate(fonts):
+            names = font["name"]
+            family = names.getDebugName(16) or names.getDebugName(1)
+            style = (names.getDebugName(17) or names.getDebugName(2) or "").lower()
+            if not family or "italic" in style or "oblique" in style:
+                continue
+            weight = font["OS/2"].usWeightClass if "OS/2" in font else 400
+            faces.append(FontFace(str(path), number, family, weight))
+    finally:
+        source.close()
+    return faces
+
+
+@functools.lru_cache(maxsize=1)
+def font_index() -> dict[str, list[FontFace]]:
+    """family (lower case) -> upright faces, scanned once"""
+    index: dict[str, list[FontFace]] = {}
+    for directory in SVG_FONT_DIRS:
+        if not os.path.isdir(directory):
+            continue
+        for path in sorted(Path(directory).rglob("*")):
+            if path.suffix.lower() not in FONT_SUFFIXES:
+                continue
+            try:
+                faces = _read_faces(path)
+            except Exception as e:
+                # unreadable or unsupported font files are skipped
+                logger.warning("skipping font %s: %s", path, e)
+                continue
+            for face in faces:
+                index.setdefault(face.family.lower(), []).append(face)
+    return index
+
+
+def resolve_font(family: str, weight: int) -> FontFace | None:
+    faces = font_index().get(family.strip().lower())
+    if not faces:
+        return None
+    return min(faces, key=lambda face: (abs(face.weight - weight), face.weight < weight))
+
+
+@functools.lru_cache(maxsize=16)
+def _load(path: str, number: int):
+    return TTFont(path, fontNumber=number, lazy=True)
+
+
+def _outline(face: FontFace, font, glyph_name: str) -> str:
+    key = (face.id, face.weight, glyph_name)
+    d = glyph_cache.get(key)
+    if d is None:
+        glyph_set = font.getGlyphSet()
+        pen = SVGPathPen(glyph_set)
+        glyph_set[glyph_name].draw(pen)
+        d = pen.getCommands()
+        glyph_cache.set(key, d)
+    return d
+
+
+def _kerning(font) -> dict:
+    if "kern" not in font:
+        return {}
+    for table in font["kern"].kernTables:
+        if getattr(table, "kernTable", None):
+            return table.kernTable
+    return {}
+
+
+def layout_text(text: str, font_family: str, font_weight: str | int, font_size: float, required: bool = False) -> TextLayout | None:
+    """
+    Glyph outlines and positions of `text` (lines split on newlines)
+    Returns None when fontTools or a usable font is missing, or raises ValueError with `required`
+    """
+    if TTFont is None:
+        if required:
+            raise ValueError("轮廓文本需要安装 fontTools")
+        return None
+    weight = parse_weight(font_weight)
+    chain = []
+    for family in [font_family, *SVG_FALLBACK_FONTS]:
+        face = resolve_font(family, weight)
+        if face is not None and face not in chain:
+            chain.append(face)
+    if not chain:
+        if required:
+            raise ValueError(f"找不到字体文件: {font_family}, 请检查 SVG_FONT_DIRS")
+        return None
+
+    layout = TextLayout()
+    with _font_lock:
+        fonts = [(face, _load(face.path, face.number)) for face in chain]
+        cmaps = [font.getBestCmap() or {} for _, font in fonts]
+        primary_face, primary = fonts[0]
+        scale = font_size / primary["head"].unitsPerEm
+        hhea = primary["hhea"]
+        line_height = (hhea.ascent - hhea.descent + hhea.lineGap) * scale
+        layout.descent = -hhea.descent * scale
+
+        used = set()
+        for row, line in enumerate(text.split("\n")):
+            pen_x, previous = 0.0, None
+            baseline = row * line_height
+            for char in line:
+                index = next((i for i, cmap in enumerate(cmaps) if ord(char) in cmap), 0)
+                face, font = fonts[index]
+                glyph_name = cmaps[index].get(ord(char), ".notdef")
+                glyph_scale = font_size / font["head"].unitsPerEm
+                if previous is not None and previous[0] == index:
+                    pen_x += _kerning(font).get((previous[1], glyph_name), 0) * glyph_scale
+                d = _outline(face, font, glyph_name)
+                if d:
+                    glyph_id = f"g{face.id}-{font.getGlyphID(glyph_name)}"
+                    layout.glyphs[glyph_id] = d
+                    layout.placements.append((glyph_id, pen_x, baseline, glyph_scale))
+                used.add(face.family)
+                pen_x += font["hmtx"][glyph_name][0] * glyph_scale
+                previous = (index, glyph_name)
+            layout.width = max(layout.width, pen_x)
+        layout.height = baseline
+    layout.fonts = sorted(used) or [primary_face.family]
+    return layout
+
+
+def glyph_cache_stats() -> dict:
+    return glyph_cache.stats()
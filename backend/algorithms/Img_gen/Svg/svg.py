@@ -1,5 +1,10 @@
+import math
+
 import svgwrite
 
+from algorithms.Img_gen.Svg.glyphs import TextLayout, layout_text
+from config import SVG_TEXT_MODE
+
 def gen_svg(
     text: str,
     x: int = 10,
@@ -10,7 +15,8 @@ def gen_svg(
     fill: str = "#000000",
     stroke: str | None = None,
     stroke_width: int = 1,
-    style: dict[str, str] | None = None
+    style: dict[str, str] | None = None,
+    text_mode: str | None = None
 ) -> str:
     """
     Generate an SVG with vector text.
@@ -26,10 +32,22 @@ def gen_svg(
         stroke (str, optional): Stroke color of the text
         stroke_width (int): Width of the stroke
         style (Dict[str, str], optional): Additional CSS styles
+        text_mode (str): "path" glyph outlines from a local font, "text" a <text> element
+            rendered with the client's fonts, "auto" outlines when a font is available,
+            SVG_TEXT_MODE when omitted
         
     Returns:
         str: SVG string with the vector text
     """
+    text_mode = text_mode or SVG_TEXT_MODE
+    if text_mode not in ("auto", "path", "text"):
+        raise ValueError(f"无效的文本模式: {text_mode}, 可选值为 auto, path, text")
+    layout = None
+    if text_mode != "text":
+        layout = layout_text(text, font_family, font_weight, font_size, required=text_mode == "path")
+    if layout is not None:
+        return _outline_svg(text, layout, x, y, fill, stroke, stroke_width, style)
+
     # Create new SVG document
     dwg = svgwrite.Drawing(size=(f"{font_size * len(text)}px", f"{font_size * 1.5}px"))
     
@@ -53,11 +71,49 @@ def gen_svg(
     # Create text element
     text_element = dwg.text(text, insert=(x, y), style=";".join([f"{k}:{v}" for k, v in base_style.items()]))
     
-    # Convert text to path for true vector format
-    # This ensures the text remains editable as vectors
-    text_element["pathLength"] = "1"  # Makes the text scalable as a path
-    
     # Add the text element to the drawing
     dwg.add(text_element)
     
     return dwg.tostring()
+
+
+def _outline_svg(
+    text: str,
+    layout: TextLayout,
+    x: int,
+    y: int,
+    fill: str,
+    stroke: str | None,
+    stroke_width: int,
+    style: dict[str, str] | None
+) -> str:
+    """SVG with every distinct glyph defined once in <defs> and placed with <use>"""
+    margin = stroke_width if stroke else 0
+    # the element structure is fixed, skipping svgwrite's per-attribute validation makes
+    # a cached layout cheap to serialize
+    dwg = svgwrite.Drawing(size=(
+        f"{math.ceil(x + layout.width + margin)}px",
+        f"{math.ceil(y + layout.height + layout.descent + margin)}px",
+    ), debug=False)
+    # the text stays searchable and accessible
+    dwg.set_desc(title=text, desc="font: " + ", ".join(layout.fonts))
+
+    for glyph_id, d in layout.glyphs.items():
+        dwg.defs.add(dwg.path(d=d, id=glyph_id))
+
+    base_style = {"fill": fill}
+    if stroke:
+        base_style["stroke"] = stroke
+    if style:
+        base_style.update(style)
+    group = dwg.g(style=";".join(f"{k}:{v}" for k, v in base_style.items()))
+
+    for glyph_id, gx, gy, scale in layout.placements:
+        # glyphs are in font units with the y axis up
+        use = dwg.use(f"#{glyph_id}", transform=f"translate({x + gx:.2f},{y + gy:.2f}) scale({scale:.6g},{-scale:.6g})")
+        if stroke:
+            # the stroke is drawn in font units, undo the glyph scale
+            use["stroke-width"] = f"{stroke_width / scale:.6g}"
+        group.add(use)
+    dwg.add(group)
+    return dwg.tostring()
@@ -171,13 +171,14 @@ class KDiffusionStableDiffusionXLPipeline(StableDiffusionXLPipeline):
             assert negative_pooled_prompt_embeds is not None, "Failed to generate negative_pooled_prompt_embeds"
 
         # Batch
+        # Embeds are either shared by the whole batch (1, ...) or given per item (batch_size, ...)
         latents_in = latents.to(device)
         add_time_ids = add_time_ids.repeat(batch_size, 1).to(device)
         add_neg_time_ids = add_neg_time_ids.repeat(batch_size, 1).to(device)
-        prompt_embeds = prompt_embeds.repeat(batch_size, 1, 1).to(device)
-        negative_prompt_embeds = negative_prompt_embeds.repeat(batch_size, 1, 1).to(device)
-        pooled_prompt_embeds = pooled_prompt_embeds.repeat(batch_size, 1).to(device)
-        negative_pooled_prompt_embeds = negative_pooled_prompt_embeds.repeat(batch_size, 1).to(device)
+        prompt_embeds = prompt_embeds.repeat(batch_size // prompt_embeds.shape[0], 1, 1).to(device)
+        negative_prompt_embeds = negative_prompt_embeds.repeat(batch_size // negative_prompt_embeds.shape[0], 1, 1).to(device)
+        pooled_prompt_embeds = pooled_prompt_embeds.repeat(batch_size // pooled_prompt_embeds.shape[0], 1).to(device)
+        negative_pooled_prompt_embeds = negative_pooled_prompt_embeds.repeat(batch_size // negative_pooled_prompt_embeds.shape[0], 1).to(device)
 
         # Feeds
         sampler_kwargs = dict(
@@ -1,5 +1,8 @@
 import os
 import random
+import functools
+import threading
+import time
 import torch
 import safetensors.torch as sf
 from transformers import CLIPTextModel, CLIPTokenizer
@@ -11,16 +14,11 @@ from diffusers.models.attention_processor import AttnProcessor2_0
 from algorithms.Img_gen.Trans.diffusers_kdiffusion_sdxl import KDiffusionStableDiffusionXLPipeline
 from algorithms.Img_gen.Trans.vae import TransparentVAEDecoder, TransparentVAEEncoder
 from utils.model import download_model
+from utils.metrics import stage, stage_latency
 
-def gen_trans(width: int = 1024,
-              height: int = 1024,
-              prompt_pos: str = "glass bottle, high quality",
-              prompt_neg: str = "face asymmetry, eyes asymmetry, deformed eyes, open mouth"
-              ):
-    
-    if width % 8 != 0 or height % 8 != 0:
-        raise ValueError("Width and height must be multiples of 8.")
-    
+# Models are loaded once and stay resident, every generation reuses them
+@functools.lru_cache(maxsize=1)
+def load_trans_models():
     # Load models
     # RealVisXL_V4.0 is a specific version of SDXL
     # We use float16 and fp16 for more compatibility and less memory usage
@@ -84,27 +82,78 @@ def gen_trans(width: int = 1024,
         scheduler=None,  # We completely give up diffusers sampling system and use A1111's method
     )
 
-    with torch.inference_mode():
+    text_encoder.to(device) # type: ignore
+    text_encoder_2.to(device) # type: ignore
+    unet.to(device) # type: ignore
+    vae.to(device) # type: ignore
+    transparent_decoder.to(device)
+    transparent_encoder.to(device)
+    return pipeline, transparent_encoder, transparent_decoder
+
+# The resident models are shared, runs on the GPU are serialized
+_gpu_lock = threading.Lock()
+
+def _sync(device: torch.device):
+    # CUDA kernels run asynchronously, wait for them so a stage is charged its own GPU time
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+
+def gen_trans(width: int = 1024,
+              height: int = 1024,
+              prompt_pos: str = "glass bottle, high quality",
+              prompt_neg: str = "face asymmetry, eyes asymmetry, deformed eyes, open mouth",
+              seed: int | None = None
+              ):
+    return gen_trans_batch(width, height, [prompt_pos], [prompt_neg], None if seed is None else [seed])
+
+def gen_trans_batch(width: int,
+                    height: int,
+                    prompts_pos: list[str],
+                    prompts_neg: list[str],
+                    seeds: list[int] | None = None
+                    ):
+    """
+    Generate one transparent image per (prompt_pos, prompt_neg) pair in a single
+    sampling run, all images share the same size.
+    Every item draws its initial noise from its own seed, so an image does not
+    depend on the other items of the batch; random seeds are used when omitted.
+    """
+    if width % 8 != 0 or height % 8 != 0:
+        raise ValueError("Width and height must be multiples of 8.")
+    if len(prompts_pos) != len(prompts_neg) or not prompts_pos:
+        raise ValueError("正向与负向提示词数量必须一致且不为空")
+    if seeds is None:
+        seeds = [random.randint(0, 1000000) for _ in prompts_pos]
+    if len(seeds) != len(prompts_pos):
+        raise ValueError("随机种子数量必须与提示词数量一致")
+
+    pipeline, _, transparent_decoder = load_trans_models()
+    unet, vae = pipeline.unet, pipeline.vae
+    device = unet.device
+    batch_size = len(prompts_pos)
+
+    with _gpu_lock, torch.inference_mode():
         guidance_scale = 7.0
-        seed=random.randint(0, 1000000)
-        rng = torch.Generator(device=device).manual_seed(seed)
-        text_encoder.to(device) # type: ignore
-        text_encoder_2.to(device) # type: ignore
-        unet.to(device) # type: ignore
-        vae.to(device) # type: ignore
-        transparent_decoder.to(device)
-        transparent_encoder.to(device)
-        
-        positive_cond, positive_pooler = pipeline.encode_cropped_prompt_77tokens(prompt_pos)
-        negative_cond, negative_pooler = pipeline.encode_cropped_prompt_77tokens(prompt_neg)
+        rng = [torch.Generator(device=device).manual_seed(seed) for seed in seeds]
+
+        with stage("sdxl", "text_encode"):
+            positive = [pipeline.encode_cropped_prompt_77tokens(p) for p in prompts_pos]
+            negative = [pipeline.encode_cropped_prompt_77tokens(p) for p in prompts_neg]
+            _sync(device)
+        positive_cond = torch.cat([c for c, _ in positive])
+        positive_pooler = torch.cat([p for _, p in positive])
+        negative_cond = torch.cat([c for c, _ in negative])
+        negative_pooler = torch.cat([p for _, p in negative])
 
         # (BCHW) -> (BCHW/8)
-        initial_latent = torch.zeros(size=(1, 4, height//8, width//8), dtype=unet.dtype, device=unet.device)
+        initial_latent = torch.zeros(size=(batch_size, 4, height//8, width//8), dtype=unet.dtype, device=unet.device)
+        num_inference_steps = 25
+        sampling_start = time.perf_counter()
         latents_out = pipeline(
             initial_latent=initial_latent,
             strength=1.0,
-            num_inference_steps=25,
-            batch_size=1,
+            num_inference_steps=num_inference_steps,
+            batch_size=batch_size,
             prompt_embeds=positive_cond,
             negative_prompt_embeds=negative_cond,
             pooled_prompt_embeds=positive_pooler,
@@ -112,8 +161,15 @@ def gen_trans(width: int = 1024,
             generator=rng,
             guidance_scale=guidance_scale,
         )
+        _sync(device)
+        sampling_s = time.perf_counter() - sampling_start
+        stage_latency.observe(("sdxl", "sampling"), sampling_s)
+        # steps are not synchronized one by one (that would stall the kernel queue), the mean is recorded per step
+        for _ in range(num_inference_steps):
+            stage_latency.observe(("sdxl", "sampling_step"), sampling_s / num_inference_steps)
 
-        result_list = transparent_decoder(vae, latents_out.to(dtype=vae.dtype, device=vae.device)/0.18215)
+        with stage("sdxl", "decode"):
+            result_list = transparent_decoder(vae, latents_out.to(dtype=vae.dtype, device=vae.device)/0.18215)
         image_list = [Image.fromarray(result) for result in result_list]
         return image_list
 
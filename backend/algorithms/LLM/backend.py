@@ -0,0 +1,284 @@
+# Pluggable LLM backends.
+# Every backend shares the same life cycle:
+#   1.load: download into the project cache dir, from_pretrained, optional int8 quantization
+#   2.chat: apply the chat template, look up the response cache, generate, parse the output
+#   3.profile: latency/throughput characteristics, seeded with published priors and
+#     refined with an exponential moving average of the measured runs
+# Subclasses only describe what differs between models: the model id, the priors,
+# whether a thinking mode exists and how the generated ids are split into thinking/content.
+
+import gc
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any
+
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer, StoppingCriteria, StoppingCriteriaList
+
+from algorithms.LLM.cache import response_cache
+from algorithms.LLM.quantize import check_quantization, quantize_model
+from utils.metrics import llm_seconds, llm_tokens, stage_latency
+
+# 项目内模型存储路径（与代码文件同级的 models 文件夹）
+MODEL_CACHE_DIR = os.path.join(os.path.dirname(__file__), "models")
+
+
+class _TimingCriteria(StoppingCriteria):
+    # never stops the generation, only records when the first token is out (end of prefill)
+    def __init__(self):
+        self.first_token_at: float | None = None
+
+    def __call__(self, input_ids, scores, **kwargs):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        return torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+
+
+class BackendProfile:
+    """
+    Latency/throughput characteristics of a backend
+    Starts from published priors and follows the measured runs with an EWMA
+    """
+    def __init__(self, prefill_tok_s: float, decode_tok_s: float, new_tokens: float = 256.0, alpha: float = 0.2):
+        self.prefill_tok_s = prefill_tok_s
+        self.decode_tok_s = decode_tok_s
+        self.new_tokens = new_tokens
+        self.alpha = alpha
+        self.samples = 0
+        self._lock = threading.Lock()
+
+    def _ewma(self, old: float, new: float) -> float:
+        # the first measurement replaces the prior
+        return new if self.samples == 0 else (1 - self.alpha) * old + self.alpha * new
+
+    def record(self, prompt_tokens: int, new_tokens: int, prefill_s: float, decode_s: float):
+        with self._lock:
+            if prefill_s > 0:
+                self.prefill_tok_s = self._ewma(self.prefill_tok_s, prompt_tokens / prefill_s)
+            if new_tokens > 1 and decode_s > 0:
+                self.decode_tok_s = self._ewma(self.decode_tok_s, (new_tokens - 1) / decode_s)
+            self.new_tokens = self._ewma(self.new_tokens, new_tokens)
+            self.samples += 1
+
+    def estimate_latency_ms(self, prompt_tokens: int, max_new_tokens: int) -> float:
+        # generations usually stop at EOS long before max_new_tokens
+        new_tokens = min(max_new_tokens, self.new_tokens)
+        return 1000 * (prompt_tokens / self.prefill_tok_s + new_tokens / self.decode_tok_s)
+
+    def as_dict(self) -> dict:
+        return {
+            "prefill_tok_s": round(self.prefill_tok_s, 1),
+            "decode_tok_s": round(self.decode_tok_s, 1),
+            "avg_new_tokens": round(self.new_tokens, 1),
+            "samples": self.samples,
+        }
+
+
+class LLMBackend(ABC):
+    name: str = ""
+    model_name: str = ""
+    supports_thinking: bool = False
+    # published priors (tokens/s) used until the backend has served a request
+    prior_prefill_tok_s: float = 500.0
+    prior_decode_tok_s: float = 20.0
+
+    def __init__(
+        self,
+        torch_dtype: str | None = "auto",
+        device_map: str | dict[str, Any] = "auto",
+        quantization: str | None = None
+    ):
+        check_quantization(quantization)
+        self.torch_dtype = torch_dtype
+        self.device_map = device_map
+        self.quantization = quantization
+        self.tokenizer = None
+        self.model = None
+        self.profile = BackendProfile(self.prior_prefill_tok_s, self.prior_decode_tok_s)
+        self._load_lock = threading.Lock()
+        # requests being served, an unload waits for the last one
+        self._active = 0
+        self._retired = False
+
+    @property
+    def model_id(self) -> str:
+        return f"{self.model_name}:{self.quantization or self.torch_dtype}"
+
+    @property
+    def loaded(self) -> bool:
+        return self.model is not None
+
+    def load(self):
+        with self._load_lock:
+            if self.loaded:
+                return self
+            # 如果文件夹不存在则自动创建
+            os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+
+            torch_dtype, device_map = self.torch_dtype, self.device_map
+            # the int8 runtimes are CPU kernels, so a quantized model is always loaded on CPU in fp32
+            if self.quantization is not None:
+                torch_dtype, device_map = torch.float32, "cpu"
+
+            tokenizer = AutoTokenizer.from_pretrained(self.model_name, cache_dir=MODEL_CACHE_DIR)
+            model = AutoModelForCausalLM.from_pretrained(
+                self.model_name,
+                torch_dtype=torch_dtype,
+                device_map=device_map,
+                cache_dir=MODEL_CACHE_DIR
+            )
+            self.tokenizer = tokenizer
+            self.model = quantize_model(model, self.quantization)
+        return self
+
+    def unload(self):
+        """
+        Drop the weights of a backend evicted from the pool
+        A backend still serving requests (or handed out before the eviction) is unloaded after its last request
+        """
+        with self._load_lock:
+            self._retired = True
+            if not self._active:
+                self._release()
+
+    def _release(self):
+        # called with _load_lock held
+        self.model = None
+        self.tokenizer = None
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def build_messages(self, prompt: str, system_message: str | None = None) -> list[dict[str, str]]:
+        messages = []
+        if system_message:
+            messages.append({"role": "system", "content": system_message})
+        messages.append({"role": "user", "content": prompt})
+        return messages
+
+    def apply_template(self, messages: list[dict[str, str]], enable_thinking: bool) -> str:
+        return self.tokenizer.apply_chat_template( # type: ignore
+            messages,
+            tokenize=False,
+            add_generation_prompt=True,
+            enable_thinking=enable_thinking
+        )
+
+    @abstractmethod
+    def parse_output(self, output_ids: list[int]) -> dict[str, str]:
+        """Split the generated ids into thinking_content and content"""
+
+    def count_tokens(self, text: str) -> int:
+        if self.tokenizer is None:
+            # rough estimate before the tokenizer is loaded
+            return max(1, len(text) // 4)
+        return len(self.tokenizer(text)["input_ids"])
+
+    def estimate_latency_ms(self, prompt: str, max_new_tokens: int) -> float:
+        return self.profile.estimate_latency_ms(self.count_tokens(prompt), max_new_tokens)
+
+    def chat(
+        self,
+        prompt: str,
+        system_message: str | None = None,
+        enable_thinking: bool = False,
+        do_sample: bool | None = None,
+        max_new_tokens: int = 32768,
+        prompt_lookup_num_tokens: int | None = None
+    ) -> dict[str, str]:
+        with self._load_lock:
+            self._active += 1
+        try:
+            return self._chat(prompt, system_message, enable_thinking, do_sample, max_new_tokens, prompt_lookup_num_tokens)
+        finally:
+            with self._load_lock:
+                self._active -= 1
+                if self._retired and not self._active:
+                    self._release()
+
+    def _chat(
+        self,
+        prompt: str,
+        system_message: str | None,
+        enable_thinking: bool,
+        do_sample: bool | None,
+        max_new_tokens: int,
+        prompt_lookup_num_tokens: int | None
+    ) -> dict[str, str]:
+        self.load()
+        if enable_thinking and not self.supports_thinking:
+            enable_thinking = False
+
+        text = self.apply_template(self.build_messages(prompt, system_message), enable_thinking)
+
+        # effective generation config: model defaults overridden by the request
+        gen_kwargs: dict[str, Any] = {"max_new_tokens": max_new_tokens}
+        if do_sample is not None:
+            gen_kwargs["do_sample"] = do_sample
+        # prompt-lookup decoding: draft tokens by n-gram matching against the prompt,
+        # verified in a single forward pass, no draft model needed
+        if prompt_lookup_num_tokens:
+            gen_kwargs["prompt_lookup_num_tokens"] = prompt_lookup_num_tokens
+        generation_config = self.model.generation_config.to_diff_dict() # type: ignore
+        generation_config.pop("transformers_version", None)
+        generation_config.update(gen_kwargs)
+
+        cache_key = None
+        if response_cache.is_deterministic(generation_config):
+            cache_key = response_cache.make_key(self.model_id, text, generation_config, enable_thinking)
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                return dict(cached)
+        else:
+            response_cache.bypass()
+
+        # tokenizer returns a BatchEncoding; move contained tensors to the model device explicitly
+        model_inputs = self.tokenizer([text], return_tensors="pt") # type: ignore
+        model_inputs = {k: v.to(self.model.device) if hasattr(v, "to") else v for k, v in model_inputs.items()} # type: ignore
+        prompt_tokens = model_inputs["input_ids"].shape[1]
+
+        # conduct text completion
+        timing = _TimingCriteria()
+        start = time.perf_counter()
+        try:
+            generated_ids = self.model.generate( # type: ignore
+                **model_inputs,
+                **gen_kwargs,
+                stopping_criteria=StoppingCriteriaList([timing])
+            )
+        except Exception:
+            import traceback
+            traceback.print_exc()
+            raise
+        end = time.perf_counter()
+        output_ids: list[int] = generated_ids[0][prompt_tokens:].tolist()
+
+        first_token_at = timing.first_token_at or end
+        prefill_s, decode_s = first_token_at - start, end - first_token_at
+        self.profile.record(prompt_tokens, len(output_ids), prefill_s, decode_s)
+        self._record_metrics(prompt_tokens, len(output_ids), prefill_s, decode_s)
+
+        result = self.parse_output(output_ids)
+        if cache_key is not None:
+            response_cache.set(cache_key, result)
+        return dict(result)
+
+    def _record_metrics(self, prompt_tokens: int, new_tokens: int, prefill_s: float, decode_s: float):
+        # the first generated token comes out of the prefill pass
+        llm_tokens.inc((self.model_id, "prompt"), prompt_tokens)
+        llm_tokens.inc((self.model_id, "generated"), max(0, new_tokens - 1))
+        llm_seconds.inc((self.model_id, "prefill"), prefill_s)
+        llm_seconds.inc((self.model_id, "decode"), decode_s)
+        stage_latency.observe((self.model_id, "prefill"), prefill_s)
+        stage_latency.observe((self.model_id, "decode"), decode_s)
+
+    def describe(self) -> dict:
+        return {
+            "name": self.name,
+            "model_id": self.model_id,
+            "loaded": self.loaded,
+            "supports_thinking": self.supports_thinking,
+            **self.profile.as_dict(),
+        }
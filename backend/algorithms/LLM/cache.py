@@ -0,0 +1,59 @@
+# Response cache for deterministic (greedy) LLM generations.
+# The key is built from everything that determines the output of a greedy run:
+#   model id (including the quantized runtime), the normalized chat template output,
+#   the effective generation config and enable_thinking.
+# Settings that cannot change a greedy output (assisted decoding only drafts tokens that the
+# model then verifies, sampling knobs are unused without do_sample) are left out of the key,
+# so identical prompts hit whatever speed-up the request asked for.
+# Stochastic runs (do_sample=True) are never looked up nor stored.
+
+import hashlib
+import json
+import unicodedata
+from typing import Any
+
+from config import LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL
+from utils.cache import TTLCache
+
+OUTPUT_INVARIANT = (
+    "prompt_lookup_num_tokens", "max_matching_ngram_size", "num_assistant_tokens",
+    "num_assistant_tokens_schedule", "use_cache", "temperature", "top_p", "top_k", "min_p", "typical_p",
+)
+
+def normalize_template(text: str) -> str:
+    # the same prompt typed in different editors differs in unicode form, line endings and trailing spaces
+    text = unicodedata.normalize("NFC", text).replace("\r\n", "\n")
+    return "\n".join(line.rstrip() for line in text.split("\n"))
+
+
+class LLMResponseCache(TTLCache):
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600.0):
+        super().__init__(max_entries=max_entries, ttl=ttl)
+        self.bypasses = 0
+
+    @staticmethod
+    def is_deterministic(generation_config: dict[str, Any]) -> bool:
+        return not generation_config.get("do_sample", False)
+
+    @staticmethod
+    def make_key(model_id: str, text: str, generation_config: dict[str, Any], enable_thinking: bool) -> str:
+        payload = json.dumps(
+            {
+                "model": model_id,
+                "text": normalize_template(text),
+                "generation_config": {k: v for k, v in generation_config.items() if k not in OUTPUT_INVARIANT},
+                "enable_thinking": enable_thinking,
+            },
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def bypass(self):
+        self.bypasses += 1
+
+    def stats(self) -> dict:
+        return {**super().stats(), "bypasses": self.bypasses}
+
+
+response_cache = LLMResponseCache(max_entries=LLM_CACHE_MAX_ENTRIES, ttl=LLM_CACHE_TTL)
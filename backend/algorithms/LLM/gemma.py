@@ -1,80 +1,30 @@
-from transformers import pipeline
-import torch
-import os
+from algorithms.LLM.backend import LLMBackend
+
+class GemmaBackend(LLMBackend):
+    name = "gemma"
+    model_name = "google/gemma-3-1b-it"
+    supports_thinking = False
+    prior_prefill_tok_s = 600.0
+    prior_decode_tok_s = 25.0
+
+    def parse_output(self, output_ids: list[int]) -> dict[str, str]:
+        # Gemma has no thinking mode, everything generated is content
+        content: str = self.tokenizer.decode(output_ids, skip_special_tokens=True).strip("\n") # type: ignore
+        return {
+            "thinking_content": "",
+            "content": content
+        }
 
 def llm_gemma(
     prompt: str = "introduce llm to me in detail.",
-    system_message: str = "You are a helpful assistant."
+    system_message: str = "You are a helpful assistant.",
+    quantization: str | None = None
 ) -> dict[str, str]:
-    # 项目内模型存储路径（与代码文件同级的 models 文件夹）
-    model_cache_dir = os.path.join(os.path.dirname(__file__), "models")
-    # 如果文件夹不存在则自动创建
-    os.makedirs(model_cache_dir, exist_ok=True)
-
-    model_name: str = "google/gemma-3-1b-it"
-
-    # load the pipeline with model caching
-    try:
-        pipe = pipeline(
-            "text-generation", 
-            model=model_name, 
-            device="cuda" if torch.cuda.is_available() else "cpu", 
-            torch_dtype=torch.bfloat16 if torch.cuda.is_available() else torch.float32,
-            model_kwargs={"cache_dir": model_cache_dir}
-        )
-    except Exception:
-        import traceback
-        traceback.print_exc()
-        raise
-
-    # prepare the model input
-    messages = [
-        [
-            {
-                "role": "system",
-                "content": [{"type": "text", "text": system_message}]
-            },
-            {
-                "role": "user",
-                "content": [{"type": "text", "text": prompt}]
-            },
-        ],
-    ]
-
-    # conduct text completion
-    try:
-        output = pipe(messages, max_new_tokens=32768)
-        # Extract the generated text from the pipeline output
-        content = ""
-        if output and len(output) > 0:
-            # Get the generated text - Gemma pipeline returns different structure
-            generated_text = output[0][0]['generated_text']
-            
-            # Find the assistant's response
-            for msg in generated_text:
-                if msg.get('role') == 'assistant':
-                    msg_content = msg.get('content', [])
-                    if isinstance(msg_content, list) and len(msg_content) > 0:
-                        # Handle list format
-                        text_item = msg_content[0]
-                        if isinstance(text_item, dict) and 'text' in text_item:
-                            content = text_item['text']
-                        elif isinstance(text_item, str):
-                            content = text_item
-                    elif isinstance(msg_content, str):
-                        # Handle string format
-                        content = msg_content
-                    break
-    except Exception:
-        import traceback
-        traceback.print_exc()
-        raise
-
-    # 返回字典形式的结果
-    return {
-        "content": content
-    }
+    # Import here to avoid circular imports
+    from algorithms.stub import llm_engine
+    backend = llm_engine().get("gemma", quantization=quantization)
+    return backend.chat(prompt, system_message=system_message)
 
 if __name__ == "__main__":
     result = llm_gemma()
-    print(result["content"])
\ No newline at end of file
+    print(result["content"])
@@ -0,0 +1,158 @@
+# Warm pool of LLM backends.
+# Loaded backends stay resident, keyed by (name, torch_dtype, device_map, quantization),
+# so switching between models per request never reloads weights.
+# Only the backends enabled in LLM_BACKENDS in the variants of LLM_VARIANTS can be loaded, so
+# clients cannot make the pool load (and evict the warm backends for) arbitrary copies; at most
+# LLM_POOL_MAX_MODELS stay loaded, the least recently used one is unloaded. Quantized runtimes
+# always load fp32 on CPU, their key ignores the requested dtype and device map.
+# The router picks, among the backends able to serve a request, the one with the
+# lowest estimated latency according to the published/measured profiles.
+
+import threading
+from collections import OrderedDict
+from typing import Any
+
+from algorithms.LLM.backend import LLMBackend
+from algorithms.LLM.gemma import GemmaBackend
+from algorithms.LLM.qwen import QwenBackend
+from algorithms.LLM.quantize import check_quantization
+from config import LLM_BACKENDS, LLM_POOL_MAX_MODELS, LLM_VARIANTS
+
+BACKENDS: dict[str, type[LLMBackend]] = {
+    QwenBackend.name: QwenBackend,
+    GemmaBackend.name: GemmaBackend,
+}
+TORCH_DTYPES = ("auto", "float16", "bfloat16", "float32", None)
+DEVICE_MAPS = ("auto", "cpu", "cuda")
+# what a request that does not choose a variant passes
+DEFAULT_VARIANT = ("auto", "auto", None)
+
+Variant = tuple[str | None, str, str | None]
+
+
+def normalize_variant(torch_dtype: str | None, device_map, quantization: str | None) -> Variant:
+    # the int8 runtimes are CPU kernels, a quantized model is always loaded on CPU in fp32
+    if quantization is not None:
+        return ("float32", "cpu", quantization)
+    return (torch_dtype, device_map, None)
+
+
+def parse_variants(values: list[str]) -> list[Variant]:
+    """'float16:cuda:' -> ('float16', 'cuda', None)"""
+    variants = []
+    for value in values:
+        torch_dtype, device_map, quantization = (value.split(":") + ["", ""])[:3]
+        torch_dtype = None if torch_dtype == "none" else torch_dtype or "auto"
+        device_map = device_map or "auto"
+        if torch_dtype not in TORCH_DTYPES or device_map not in DEVICE_MAPS:
+            raise ValueError(f"无效的模型变体: {value}")
+        check_quantization(quantization or None)
+        variants.append(normalize_variant(torch_dtype, device_map, quantization or None))
+    return variants or [DEFAULT_VARIANT]
+
+
+class WarmPool:
+    def __init__(self, configured: list[str], max_models: int = LLM_POOL_MAX_MODELS, variants: list[str] = LLM_VARIANTS):
+        for name in configured:
+            if name not in BACKENDS:
+                raise ValueError(f"未知的模型后端: {name}, 可选值为 {', '.join(BACKENDS)}")
+        self.configured = configured
+        self.variants = parse_variants(variants)
+        self.max_models = max(1, max_models)
+        # least recently used first
+        self._backends: OrderedDict[tuple, LLMBackend] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _variant(self, torch_dtype, device_map, quantization) -> Variant:
+        if (torch_dtype, device_map, quantization) == DEFAULT_VARIANT:
+            return self.variants[0]
+        variant = normalize_variant(torch_dtype, device_map, quantization)
+        if variant not in self.variants:
+            allowed = ", ".join(f"{d}:{m}:{q or ''}" for d, m, q in self.variants)
+            raise ValueError(f"未配置的模型变体: {variant[0]}:{variant[1]}:{variant[2] or ''}, 可选值为 {allowed}")
+        return variant
+
+    @staticmethod
+    def _key(name: str, variant: Variant) -> tuple:
+        return (name, *variant)
+
+    def get(
+        self,
+        name: str,
+        torch_dtype: str | None = "auto",
+        device_map: str | dict[str, Any] = "auto",
+        quantization: str | None = None
+    ) -> LLMBackend:
+        if name not in self.configured:
+            raise ValueError(f"未知的模型后端: {name}, 可选值为 {', '.join(self.configured)}")
+        variant = self._variant(torch_dtype, device_map, quantization)
+        key = self._key(name, variant)
+        evicted = []
+        with self._lock:
+            backend = self._backends.get(key)
+            if backend is None:
+                backend = BACKENDS[name](torch_dtype=variant[0], device_map=variant[1], quantization=variant[2])
+                self._backends[key] = backend
+                while len(self._backends) > self.max_models:
+                    evicted.append(self._backends.popitem(last=False)[1])
+            else:
+                self._backends.move_to_end(key)
+        # loading and unloading happen outside the pool lock, the backend serializes its own loading
+        for old in evicted:
+            old.unload()
+        return backend.load()
+
+    def route(
+        self,
+        prompt: str,
+        model: str | None = None,
+        enable_thinking: bool = False,
+        max_new_tokens: int = 32768,
+        max_latency_ms: float | None = None,
+        torch_dtype: str | None = "auto",
+        device_map: str | dict[str, Any] = "auto",
+        quantization: str | None = None
+    ) -> LLMBackend:
+        """
+        Pick the backend for a request
+        An explicit `model` is always honoured, otherwise the fastest configured
+        backend that supports the request and meets its latency budget is chosen
+        """
+        if model is not None:
+            return self.get(model, torch_dtype, device_map, quantization)
+
+        candidates = [
+            BACKENDS[name] for name in self.configured
+            if not enable_thinking or BACKENDS[name].supports_thinking
+        ]
+        if not candidates:
+            raise ValueError("没有可处理该请求的模型后端")
+        variant = self._variant(torch_dtype, device_map, quantization)
+
+        # profiles of resident backends are measured, the others still use their priors
+        estimates = []
+        for cls in candidates:
+            with self._lock:
+                backend = self._backends.get(self._key(cls.name, variant))
+            if backend is None:
+                backend = cls(torch_dtype=variant[0], device_map=variant[1], quantization=variant[2])
+            estimates.append((backend.estimate_latency_ms(prompt, max_new_tokens), cls.name))
+        estimates.sort()
+
+        latency_ms, name = estimates[0]
+        if max_latency_ms is not None and latency_ms > max_latency_ms:
+            raise ValueError(f"没有模型后端能在 {max_latency_ms:.0f}ms 内完成请求 (最快预计 {latency_ms:.0f}ms)")
+        return self.get(name, torch_dtype, device_map, quantization)
+
+    def warmup(self):
+        # the default variant of every configured backend
+        for name in self.configured:
+            self.get(name, *DEFAULT_VARIANT)
+
+    def describe(self) -> list[dict]:
+        with self._lock:
+            backends = list(self._backends.values())
+        return [backend.describe() for backend in backends]
+
+
+llm_pool = WarmPool(LLM_BACKENDS)
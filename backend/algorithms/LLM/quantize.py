@@ -0,0 +1,69 @@
+# Int8 quantized runtimes for CPU-only LLM inference.
+# Two modes are supported:
+#   1.int8_dynamic:
+#       torch's dynamic quantization. Linear weights are stored as int8 and the
+#       activations are quantized on the fly, so the matmuls run as int8 GEMMs.
+#   2.int8_weight_only:
+#       Linear weights are stored as int8 with a per-output-channel scale and are
+#       dequantized right before the matmul. Only memory is saved, the compute stays
+#       in floating point, so the outputs stay closer to the fp32 reference.
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+QUANTIZATION_MODES = ("int8_dynamic", "int8_weight_only")
+
+
+class WeightOnlyInt8Linear(nn.Module):
+    def __init__(self, linear: nn.Linear):
+        super().__init__()
+        self.in_features = linear.in_features
+        self.out_features = linear.out_features
+
+        # symmetric per-output-channel quantization: w ≈ w_int8 * scale
+        weight = linear.weight.detach().float()
+        scale = weight.abs().amax(dim=1, keepdim=True).clamp(min=1e-8) / 127.0
+        self.register_buffer("weight_int8", torch.round(weight / scale).clamp(-127, 127).to(torch.int8))
+        self.register_buffer("scale", scale.to(linear.weight.dtype))
+        if linear.bias is not None:
+            self.register_buffer("bias", linear.bias.detach().clone())
+        else:
+            self.bias = None
+
+    def forward(self, x):
+        weight = self.weight_int8.to(x.dtype) * self.scale.to(x.dtype)
+        return F.linear(x, weight, self.bias)
+
+
+def _replace_linear(module: nn.Module):
+    for name, child in module.named_children():
+        if isinstance(child, nn.Linear):
+            setattr(module, name, WeightOnlyInt8Linear(child))
+        else:
+            _replace_linear(child)
+
+
+def check_quantization(quantization: str | None):
+    if quantization is not None and quantization not in QUANTIZATION_MODES:
+        raise ValueError(f"不支持的量化模式: {quantization}, 可选值为 {', '.join(QUANTIZATION_MODES)}")
+
+
+def quantize_model(model: nn.Module, quantization: str | None) -> nn.Module:
+    """
+    Quantize the Linear layers of a causal LM loaded on CPU in fp32.
+
+    The embedding table is left untouched. When the LM head is tied to it
+    (Qwen3-0.6B, Gemma-3-1b), replacing the head only unties the copy used
+    for the output projection.
+    """
+    check_quantization(quantization)
+    if quantization is None:
+        return model
+
+    model.eval()
+    if quantization == "int8_dynamic":
+        model = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8, inplace=True)
+    else:
+        _replace_linear(model)
+    return model
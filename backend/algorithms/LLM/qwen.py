@@ -1,69 +1,52 @@
-from transformers import AutoModelForCausalLM, AutoTokenizer
-from torch import Tensor
-import os
+from typing import Any
 
-def llm_qwen(
-    prompt: str = "Give me a short introduction to large language model.",
-    enable_thinking: bool = False
-) -> dict[str, str]:
-    # 项目内模型存储路径（与代码文件同级的 models 文件夹）
-    model_cache_dir = os.path.join(os.path.dirname(__file__), "models")
-    # 如果文件夹不存在则自动创建
-    os.makedirs(model_cache_dir, exist_ok=True)
+from algorithms.LLM.backend import LLMBackend
 
-    model_name: str = "Qwen/Qwen3-0.6B"
+class QwenBackend(LLMBackend):
+    name = "qwen"
+    model_name = "Qwen/Qwen3-0.6B"
+    supports_thinking = True
+    prior_prefill_tok_s = 800.0
+    prior_decode_tok_s = 35.0
 
-    # load the tokenizer and the model
-    tokenizer = AutoTokenizer.from_pretrained(
-        model_name,
-        cache_dir=model_cache_dir  # 关键：指定项目内路径
-        )
-    model = AutoModelForCausalLM.from_pretrained(
-        model_name,
-        torch_dtype="auto",
-        device_map="auto",
-        cache_dir=model_cache_dir  # 关键：指定项目内路径
-    )
+    def parse_output(self, output_ids: list[int]) -> dict[str, str]:
+        # parsing thinking content
+        try:
+            # rindex finding 151668 (</think>)
+            index: int = len(output_ids) - output_ids[::-1].index(151668)
+        except ValueError:
+            index = 0
 
-    # prepare the model input
-    messages: list[dict[str, str]] = [
-        {"role": "user", "content": prompt}
-    ]
-    text: str = tokenizer.apply_chat_template(
-        messages,
-        tokenize=False,
-        add_generation_prompt=True,
-        enable_thinking=enable_thinking # Switches between thinking and non-thinking modes. Default is True.
-    )
-    # tokenizer returns a BatchEncoding; move contained tensors to the model device explicitly
-    model_inputs = tokenizer([text], return_tensors="pt")
-    # model_inputs = model_inputs.to(model.device)
-    model_inputs: dict = {k: v.to(model.device) if hasattr(v, "to") else v for k, v in model_inputs.items()}
+        thinking_content: str = self.tokenizer.decode(output_ids[:index], skip_special_tokens=True).strip("\n") # type: ignore
+        content: str = self.tokenizer.decode(output_ids[index:], skip_special_tokens=True).strip("\n") # type: ignore
 
-    # conduct text completion
-    try:
-        generated_ids: Tensor = model.generate( # type: ignore
-            **model_inputs,
-            max_new_tokens=32768
-        )
-    except Exception:
-        import traceback
-        traceback.print_exc()
-        raise
-    output_ids: list[int] = generated_ids[0][len(model_inputs['input_ids'][0]):].tolist()
+        # 返回字典形式的结果
+        return {
+            "thinking_content": thinking_content,
+            "content": content
+        }
 
-    # parsing thinking content
-    try:
-        # rindex finding 151668 (</think>)
-        index: int = len(output_ids) - output_ids[::-1].index(151668)
-    except ValueError:
-        index = 0
+def llm_qwen(
+    prompt: str = "Give me a short introduction to large language model.",
+    enable_thinking: bool = False,
+    torch_dtype: str | None = "auto",
+    device_map: str | dict[str, Any] = "auto",
+    quantization: str | None = None,
+    do_sample: bool | None = None,
+    max_new_tokens: int = 32768,
+    prompt_lookup_num_tokens: int | None = None
+) -> dict[str, str]:
+    # Import here to avoid circular imports
+    from algorithms.stub import llm_engine
+    backend = llm_engine().get("qwen", torch_dtype=torch_dtype, device_map=device_map, quantization=quantization)
+    return backend.chat(
+        prompt,
+        enable_thinking=enable_thinking,
+        do_sample=do_sample,
+        max_new_tokens=max_new_tokens,
+        prompt_lookup_num_tokens=prompt_lookup_num_tokens
+    )
 
-    thinking_content: str = tokenizer.decode(output_ids[:index], skip_special_tokens=True).strip("\n")
-    content: str = tokenizer.decode(output_ids[index:], skip_special_tokens=True).strip("\n")
-    
-    # 返回字典形式的结果
-    return {
-        "thinking_content": thinking_content,
-        "content": content
-    }
+if __name__ == "__main__":
+    result = llm_qwen()
+    print(result["content"])
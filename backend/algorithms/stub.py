@@ -0,0 +1,223 @@
+# Stub inference engine for load tests without GPUs or model weights.
+# With STUB_ENGINE=true:
+#   - gen_trans / gen_trans_batch return synthetic transparent images (a soft ellipse whose
+#     colour, size and position derive from the prompt and the seed) instead of running SDXL
+#   - the LLM pool is replaced by StubPool, whose backends answer with text derived from the prompt
+#   - the background (encode_background) and text (gen_svg) renderers already run on the CPU, they
+#     keep their real (deterministic) output and only get the simulated latency (backgrounds on a
+#     cache miss); the services pick every engine through trans_engine() ... svg_engine()
+# Outputs are deterministic for the same inputs, so caches and single-flight behave as in
+# production. The latency per call comes from STUB_LATENCY ("engine=seconds,...") with
+# +-STUB_LATENCY_JITTER, a batch of n layers takes (1 + n) / 2 times the trans latency
+# (batching amortizes half of the cost) and holds the device lock like the real pipeline.
+# Everything around the models (admission, batching, caches, storage, history) is unchanged.
+
+import hashlib
+import random
+import threading
+import time
+from typing import Any
+
+import numpy as np
+from PIL import Image
+
+from algorithms.Img_gen.Rgb.rgb import encode_background, is_background_cached
+from algorithms.Img_gen.Svg.svg import gen_svg
+from config import LLM_BACKENDS, STUB_ENGINE, STUB_LATENCY, STUB_LATENCY_JITTER
+
+WORDS = (
+    "poster", "layer", "light", "glass", "bottle", "summer", "red", "gold", "soft", "shadow",
+    "bright", "studio", "vintage", "minimal", "composition", "texture", "warm", "stage", "colour", "frame",
+)
+
+
+def _parse_latency(value: str) -> dict[str, float]:
+    latency = {}
+    for item in value.split(","):
+        name, _, seconds = item.strip().partition("=")
+        if name and seconds:
+            latency[name] = float(seconds)
+    return latency
+
+
+LATENCY = _parse_latency(STUB_LATENCY)
+
+# one simulated device, batches run one at a time like on the GPU
+_device_lock = threading.Lock()
+
+
+def simulate(engine: str, factor: float = 1.0):
+    """Sleep for the configured latency of `engine`, a no-op unless STUB_ENGINE is set"""
+    if not STUB_ENGINE:
+        return
+    seconds = LATENCY.get(engine, 0.0) * factor
+    if seconds > 0:
+        time.sleep(seconds * (1 + random.uniform(-STUB_LATENCY_JITTER, STUB_LATENCY_JITTER)))
+
+
+def _rng(*parts: Any) -> np.random.Generator:
+    digest = hashlib.sha256("|".join(map(str, parts)).encode("utf-8")).digest()
+    return np.random.default_rng(int.from_bytes(digest[:8], "little"))
+
+
+def _synthetic_layer(width: int, height: int, prompt_pos: str, prompt_neg: str, seed: int) -> Image.Image:
+    rng = _rng(prompt_pos, prompt_neg, seed)
+    color = rng.integers(0, 256, 3, dtype=np.uint8)
+    cx, cy = rng.uniform(0.3, 0.7, 2) * (width, height)
+    rx, ry = rng.uniform(0.15, 0.35, 2) * (width, height)
+    y, x = np.ogrid[:height, :width]
+    distance = ((x - cx) / rx) ** 2 + ((y - cy) / ry) ** 2
+    # opaque centre fading out towards the rim, transparent outside
+    alpha = (np.clip(1.5 - distance, 0, 1) * 255).astype(np.uint8)
+    pixels = np.empty((height, width, 4), dtype=np.uint8)
+    pixels[..., :3] = color
+    pixels[..., 3] = alpha
+    return Image.fromarray(pixels, "RGBA")
+
+
+def gen_trans_batch(width: int,
+                    height: int,
+                    prompts_pos: list[str],
+                    prompts_neg: list[str],
+                    seeds: list[int] | None = None
+                    ):
+    """Same contract and validation as algorithms.Img_gen.Trans.trans.gen_trans_batch"""
+    if width % 8 != 0 or height % 8 != 0:
+        raise ValueError("Width and height must be multiples of 8.")
+    if len(prompts_pos) != len(prompts_neg) or not prompts_pos:
+        raise ValueError("正向与负向提示词数量必须一致且不为空")
+    if seeds is None:
+        seeds = [random.randint(0, 1000000) for _ in prompts_pos]
+    if len(seeds) != len(prompts_pos):
+        raise ValueError("随机种子数量必须与提示词数量一致")
+    with _device_lock:
+        simulate("trans", (1 + len(prompts_pos)) / 2)
+        return [_synthetic_layer(width, height, p, n, s) for p, n, s in zip(prompts_pos, prompts_neg, seeds)]
+
+
+def gen_trans(width: int = 1024,
+              height: int = 1024,
+              prompt_pos: str = "glass bottle, high quality",
+              prompt_neg: str = "face asymmetry, eyes asymmetry, deformed eyes, open mouth",
+              seed: int | None = None
+              ):
+    return gen_trans_batch(width, height, [prompt_pos], [prompt_neg], None if seed is None else [seed])
+
+
+def stub_encode_background(width: int, height: int, params: dict, file_format: str = "png") -> bytes:
+    if not is_background_cached(width, height, params, file_format):
+        simulate("rgb")
+    return encode_background(width, height, params, file_format)
+
+
+def stub_gen_svg(*args, **kwargs) -> str:
+    simulate("svg")
+    return gen_svg(*args, **kwargs)
+
+
+class StubBackend:
+    """Duck-typed LLMBackend: same chat/describe/estimate interface, no model behind it"""
+    supports_thinking = True
+
+    def __init__(self, name: str):
+        self.name = name
+        self.quantization = None
+        self.requests = 0
+
+    @property
+    def model_id(self) -> str:
+        return f"stub/{self.name}"
+
+    @property
+    def loaded(self) -> bool:
+        return True
+
+    def load(self):
+        return self
+
+    def estimate_latency_ms(self, prompt: str, max_new_tokens: int) -> float:
+        return LATENCY.get("llm", 0.0) * 1000
+
+    def chat(
+        self,
+        prompt: str,
+        system_message: str | None = None,
+        enable_thinking: bool = False,
+        do_sample: bool | None = None,
+        max_new_tokens: int = 32768,
+        prompt_lookup_num_tokens: int | None = None
+    ) -> dict[str, str]:
+        simulate("llm")
+        self.requests += 1
+        rng = _rng(self.name, system_message, prompt)
+        words = [WORDS[i] for i in rng.integers(0, len(WORDS), min(max_new_tokens, 48))]
+        return {
+            "thinking_content": "stub reasoning" if enable_thinking else "",
+            "content": f"[{self.model_id}] " + " ".join(words),
+        }
+
+    def describe(self) -> dict:
+        return {
+            "name": self.name,
+            "model_id": self.model_id,
+            "loaded": True,
+            "supports_thinking": self.supports_thinking,
+            "prefill_tok_s": 0.0,
+            "decode_tok_s": 0.0,
+            "avg_new_tokens": 48.0,
+            "samples": self.requests,
+        }
+
+
+class StubPool:
+    """Same interface as algorithms.LLM.pool.WarmPool over StubBackends"""
+    def __init__(self, configured: list[str]):
+        self.configured = configured
+        self._backends = {name: StubBackend(name) for name in configured}
+
+    def get(self, name: str, torch_dtype: str | None = "auto", device_map: str | dict[str, Any] = "auto", quantization: str | None = None) -> StubBackend:
+        if name not in self._backends:
+            raise ValueError(f"未知的模型后端: {name}, 可选值为 {', '.join(self._backends)}")
+        return self._backends[name]
+
+    def route(self, prompt: str, model: str | None = None, max_latency_ms: float | None = None, **kwargs) -> StubBackend:
+        if model is not None:
+            return self.get(model)
+        if not self.configured:
+            raise ValueError("没有可处理该请求的模型后端")
+        return self._backends[self.configured[0]]
+
+    def warmup(self, *args, **kwargs):
+        pass
+
+    def describe(self) -> list[dict]:
+        return [backend.describe() for backend in self._backends.values()]
+
+
+stub_pool = StubPool(LLM_BACKENDS)
+
+
+def trans_engine():
+    """gen_trans_batch of the configured engine, torch/diffusers are only imported for the real one"""
+    if STUB_ENGINE:
+        return gen_trans_batch
+    from algorithms.Img_gen.Trans.trans import gen_trans_batch as real_gen_trans_batch
+    return real_gen_trans_batch
+
+
+def llm_engine():
+    """LLM pool of the configured engine"""
+    if STUB_ENGINE:
+        return stub_pool
+    from algorithms.LLM.pool import llm_pool
+    return llm_pool
+
+
+def background_engine():
+    """encode_background of the configured engine"""
+    return stub_encode_background if STUB_ENGINE else encode_background
+
+
+def svg_engine():
+    """gen_svg of the configured engine"""
+    return stub_gen_svg if STUB_ENGINE else gen_svg
@@ -1,19 +1,23 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from services.auth.auth_service import AuthService
+from sqlalchemy.ext.asyncio import AsyncSession
+from services.auth.auth_service import AuthService, AsyncAuthService
 from models.auth_models import UserLogin, UserRegister, TokenResponse, UserResponse
 from models.db_models import User
-from utils.dependencies import get_db, get_active_user
+from utils.dependencies import get_async_db, get_active_user, get_fresh_user
+from utils.rate_limit import configured_limiter
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
-@router.post("/login", response_model=TokenResponse)
-async def login(user_data: UserLogin, db: Session = Depends(get_db)):
+# credential endpoints are limited per client IP
+rate_limit_auth = configured_limiter("auth", "10/60", per="ip")
+
+@router.post("/login", response_model=TokenResponse, dependencies=[Depends(rate_limit_auth)])
+async def login(user_data: UserLogin, db: AsyncSession = Depends(get_async_db)):
     """
     Authenticate user and return access token with user information
     """
     try:
-        token_response = AuthService.login_user(
+        token_response = await AsyncAuthService.login_user(
             db=db,
             username=user_data.username,
             password=user_data.password
@@ -27,20 +31,14 @@ async def login(user_data: UserLogin, db: Session = Depends(get_db)):
             detail="Internal server error during login"
         )
 
-@router.post("/register", response_model=UserResponse)
-async def register(user_data: UserRegister, db: Session = Depends(get_db)):
+@router.post("/register", response_model=UserResponse, dependencies=[Depends(rate_limit_auth)])
+async def register(user_data: UserRegister, db: AsyncSession = Depends(get_async_db)):
     """
     Register a new user account
     """
     try:
-        db_user = AuthService.create_user(db=db, user_data=user_data)
-        return UserResponse(
-            id=db_user.id,
-            username=db_user.username,
-            email=db_user.email,
-            is_active=db_user.is_active,
-            created_at=db_user.created_at
-        )
+        db_user = await AsyncAuthService.create_user(db=db, user_data=user_data)
+        return UserResponse.model_validate(db_user)
     except HTTPException:
         raise
     except Exception as e:
@@ -56,13 +54,7 @@ async def get_current_user_info(
     """
     Get current authenticated user information
     """
-    return UserResponse(
-        id=current_user.id,
-        username=current_user.username,
-        email=current_user.email,
-        is_active=current_user.is_active,
-        created_at=current_user.created_at
-    )
+    return UserResponse.model_validate(current_user)
 
 @router.post("/verify-token")
 async def verify_token(current_user: User = Depends(get_active_user)):
@@ -71,7 +63,7 @@ async def verify_token(current_user: User = Depends(get_active_user)):
     """
     return {
         "valid": True,
-        "user_id": current_user.id,
+        "user_id": current_user.user_id,
         "username": current_user.username
     }
 
@@ -86,14 +78,15 @@ async def logout():
 async def change_password(
     current_password: str,
     new_password: str,
-    current_user: User = Depends(get_active_user),
-    db: Session = Depends(get_db)
+    # the current password is checked against the database, not a cached (possibly stale) hash
+    current_user: User = Depends(get_fresh_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Change user password
     """
     # Verify current password
-    if not AuthService.verify_password(current_password, current_user.password):
+    if not await AuthService.verify_password_async(current_password, current_user.password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Current password is incorrect"
@@ -107,7 +100,6 @@ async def change_password(
         )
     
     # Update password
-    current_user.password = AuthService.get_password_hash(new_password)
-    db.commit()
+    await AsyncAuthService.change_password(db, current_user.user_id, new_password)
     
     return {"message": "Password updated successfully"}
\ No newline at end of file
@@ -0,0 +1,53 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.history_models import HistoryResponse, HistoryItem
+from models.img_models import ErrorResponse
+from models.db_models import User
+from services.db.db_service import list_history
+from utils.dependencies import get_async_db, get_current_user, get_keyset_params, encode_cursor
+from utils.security import get_api_key
+from utils.rate_limit import configured_limiter
+from dotenv import load_dotenv
+
+load_dotenv()
+
+router = APIRouter(
+    prefix="/history",
+    tags=["生成历史"],
+    dependencies=[Depends(get_api_key), Depends(configured_limiter("history", "120/60"))],
+    responses={
+        400: {"model": ErrorResponse, "description": "无效请求"},
+        401: {"model": ErrorResponse, "description": "API Key 或 Token 验证失败"},  
+        429: {"model": ErrorResponse, "description": "请求过于频繁"},
+        500: {"model": ErrorResponse, "description": "服务器错误"}
+    }
+)
+
+@router.get(
+    path="",
+    response_model=HistoryResponse,
+    summary="查询生成历史",
+    description="按生成时间倒序分页返回当前登录用户(Bearer Token)的生成历史, 使用上一页返回的 next_cursor 获取下一页",
+)
+async def request_history(
+    page: dict = Depends(get_keyset_params),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    # the history of the verified account, never of a user named by the client
+    user_id = current_user.user_id
+    try:
+        results, position = await list_history(db, user_id, limit=page["limit"], before=page["before"])
+        return HistoryResponse(
+            user_id=user_id,
+            items=[HistoryItem.model_validate(result) for result in results],
+            next_cursor=encode_cursor(position),
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail={
+                "user_id": user_id,
+                "error_message": "服务器内部错误，请稍后再试。",
+            }
+        )
@@ -1,7 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from models.img_models import RgbRequest, LayerRequest, SvgRequest, RgbResponse, LayerResponse, SvgResponse, ErrorResponse
-from services.img.img_service import layer_rgb, layer_trans, layer_svg
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from models.img_models import RgbRequest, LayerRequest, LayerBatchRequest, SvgRequest, CompositeRequest, RgbResponse, LayerResponse, LayerBatchResponse, SvgResponse, CompositeResponse, ErrorResponse
+from services.img.img_service import layer_rgb, layer_trans, layer_trans_batch, layer_svg, layer_composite
 from utils.security import get_api_key
+from utils.dependencies import get_account_id
+from utils.rate_limit import configured_limiter
+from utils.admission import AdmissionRejected, DEADLINE_HEADER, deadline_exceeded, too_many_requests
+from utils.responses import ResponseFormat, direct_response
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -9,34 +13,69 @@ load_dotenv()
 router = APIRouter(
     prefix="/img",
     tags=["图像生成"],
-    dependencies=[Depends(get_api_key)],
+    dependencies=[Depends(get_api_key), Depends(configured_limiter("img", "60/60"))],
     responses={
         400: {"model": ErrorResponse, "description": "无效请求"},
         401: {"model": ErrorResponse, "description": "API Key 验证失败"},  
+        429: {"model": ErrorResponse, "description": "请求过于频繁"},
         500: {"model": ErrorResponse, "description": "服务器错误"}
     }
 )
 
+RESPONSE_FORMAT_QUERY = Query(
+    "json",
+    description="json: 返回local_path; binary: 直接返回图像字节, 写盘在响应后进行; stream: 流式返回图像字节, 同时在后台写盘",
+)
+
+def _direct(result: dict, file_format: str, response_format: ResponseFormat):
+    return direct_response(
+        data=result["data"],
+        file_format=file_format,
+        response_format=response_format,
+        persist=result["persist"],
+        headers={
+            "X-Request-Id": result["request_id"],
+            "X-Local-Path": result["local_path"],
+        },
+    )
+
 @router.post(
     path="/rgb",
     response_model=RgbResponse,  
     summary="生成RGB图像",
-    description="生成指定颜色的RGB图像",
+    description="生成纯色、线性/径向渐变、噪声或平铺图案背景",
 )
-async def request_rgb(request: RgbRequest):
+async def request_rgb(request: RgbRequest, response_format: ResponseFormat = RESPONSE_FORMAT_QUERY, deadline_ms: float | None = DEADLINE_HEADER, account_id: str | None = Depends(get_account_id)):
     try:
         result = await layer_rgb(
             user_id=request.user_id,
             width=request.width,
             height=request.height,
-            color=request.color
+            color=request.color,
+            kind=request.kind,
+            colors=request.colors,
+            angle=request.angle,
+            center=(request.center_x, request.center_y),
+            radius=request.radius,
+            scale=request.scale,
+            octaves=request.octaves,
+            seed=request.seed,
+            pattern=request.pattern,
+            tile=request.tile,
+            defer_write=response_format != "json",
+            deadline_ms=deadline_ms,
+            account_id=account_id,
         )
+        if response_format != "json":
+            return _direct(result, "png", response_format)
         
         return RgbResponse(
             request_id=result["request_id"],
             local_path=result["local_path"],
             timestamp=result["timestamp"]
         )
+    except TimeoutError:
+        raise deadline_exceeded(request.user_id)
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -60,23 +99,78 @@ async def request_rgb(request: RgbRequest):
     summary="生成单图层图像",
     description="根据传入文本生成带透明通道的单图层图像",
 )
-async def request_layer(request: LayerRequest):
+async def request_layer(request: LayerRequest, response_format: ResponseFormat = RESPONSE_FORMAT_QUERY, deadline_ms: float | None = DEADLINE_HEADER, account_id: str | None = Depends(get_account_id)):
     try:
+        # admission happens inside the service, after identical in-flight requests were coalesced
         result = await layer_trans(
             user_id=request.user_id,
             width=request.width,
             height=request.height,
             prompt_pos=request.prompt_pos,
-            prompt_neg=request.prompt_neg
+            prompt_neg=request.prompt_neg,
+            defer_write=response_format != "json",
+            num_images=request.num_images,
+            seed=request.seed,
+            deadline_ms=deadline_ms,
+            account_id=account_id,
         )
+        if response_format != "json":
+            return _direct(result, "png", response_format)
         
         return LayerResponse(
             request_id=result["request_id"],
             local_path=result["local_path"],
             timestamp=result["timestamp"],
             prompt_pos=result["prompt_pos"],
-            prompt_neg=result["prompt_neg"]
+            prompt_neg=result["prompt_neg"],
+            images=result["images"]
+        )
+    except AdmissionRejected as e:
+        raise too_many_requests(e, request.user_id)
+    except TimeoutError:
+        raise deadline_exceeded(request.user_id)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "user_id": request.user_id,
+                "error_message": str(e),
+                }
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail={
+                "user_id": request.user_id,
+                "error_message": "服务器内部错误，请稍后再试。",
+            }
+        )
+
+@router.post(
+    path="/layer/batch",
+    response_model=LayerBatchResponse,
+    summary="批量生成单图层图像",
+    description="一次请求生成多个图层或变体, 尺寸相同的项合并为一次批量采样; 单项失败不影响其他项, 结果顺序与请求一致",
+)
+async def request_layer_batch(request: LayerBatchRequest, deadline_ms: float | None = DEADLINE_HEADER, account_id: str | None = Depends(get_account_id)):
+    try:
+        # every sampling run of the batch is admitted into the trans pool on its own
+        result = await layer_trans_batch(
+            user_id=request.user_id,
+            items=[item.model_dump() for item in request.items],
+            deadline_ms=deadline_ms,
+            account_id=account_id,
+        )
+
+        return LayerBatchResponse(
+            user_id=request.user_id,
+            request_id=result["request_id"],
+            timestamp=result["timestamp"],
+            success=all(item["success"] for item in result["results"]),
+            results=result["results"]
         )
+    except AdmissionRejected as e:
+        raise too_many_requests(e, request.user_id)
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -100,7 +194,7 @@ async def request_layer(request: LayerRequest):
     summary="生成矢量文本",
     description="根据传入文本生成矢量文本图像",
 )
-async def request_svg(request: SvgRequest):
+async def request_svg(request: SvgRequest, response_format: ResponseFormat = RESPONSE_FORMAT_QUERY, account_id: str | None = Depends(get_account_id)):
     try:
         result = await layer_svg(
             user_id=request.user_id,
@@ -113,8 +207,13 @@ async def request_svg(request: SvgRequest):
             fill=request.fill,
             stroke=request.stroke,
             stroke_width=request.stroke_width,
-            style=request.style
+            style=request.style,
+            text_mode=request.text_mode,
+            defer_write=response_format != "json",
+            account_id=account_id,
         )
+        if response_format != "json":
+            return _direct(result, "svg", response_format)
         
         return SvgResponse(
             request_id=result["request_id"],
@@ -137,3 +236,41 @@ async def request_svg(request: SvgRequest):
                 "error_message": "服务器内部错误，请稍后再试。",
             }
         )
+
+@router.post(
+    path="/composite",
+    response_model=CompositeResponse,
+    summary="合成图层",
+    description="在服务端按预乘Alpha合成图层栈，仅重新混合发生变化的图层及其上方图层",
+)
+async def request_composite(request: CompositeRequest):
+    try:
+        result = await layer_composite(
+            user_id=request.user_id,
+            width=request.width,
+            height=request.height,
+            layers=[layer.model_dump() for layer in request.layers]
+        )
+
+        return CompositeResponse(
+            request_id=result["request_id"],
+            local_path=result["local_path"],
+            timestamp=result["timestamp"],
+            reblended_from=result["reblended_from"]
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "user_id": request.user_id,
+                "error_message": str(e),
+                }
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail={
+                "user_id": request.user_id,
+                "error_message": "服务器内部错误，请稍后再试。",
+            }
+        )
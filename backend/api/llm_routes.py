@@ -1,7 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from models.qwen_models import QwenRequest, QwenResponse, ErrorResponse
-from services.llm.llm_services import llm_chat
+from models.qwen_models import QwenRequest, QwenResponse, CacheStatsResponse, BackendInfo, ErrorResponse
+from services.llm.llm_services import llm_chat, llm_cache_stats, llm_backends
 from utils.security import get_api_key
+from utils.rate_limit import configured_limiter
+from utils.admission import AdmissionRejected, DEADLINE_HEADER, deadline_exceeded, too_many_requests
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -9,10 +11,11 @@ load_dotenv()
 router = APIRouter(
     prefix="/llm",
     tags=["大语言模型"],
-    dependencies=[Depends(get_api_key)],
+    dependencies=[Depends(get_api_key), Depends(configured_limiter("llm", "30/60"))],
     responses={
         400: {"model": ErrorResponse, "description": "无效请求"},
         401: {"model": ErrorResponse, "description": "API Key 验证失败"},  
+        429: {"model": ErrorResponse, "description": "请求过于频繁"},
         500: {"model": ErrorResponse, "description": "服务器错误"}
     }
 )
@@ -23,19 +26,30 @@ router = APIRouter(
     summary="发送聊天消息",
     description="发送消息到大语言模型并获取回复，支持对话上下文",
 )
-async def request_qwen(request: QwenRequest):
+async def request_qwen(request: QwenRequest, deadline_ms: float | None = DEADLINE_HEADER):
     try:
+        # only the fields the client set override the service defaults (non-thinking mode)
+        config = request.config.model_dump(exclude_unset=True) if request.config else {}
+        # admission happens inside the service, after identical in-flight requests were coalesced
         result = await llm_chat(
+            user_id=request.user_id,
             prompt=request.prompt,
+            deadline_ms=deadline_ms,
+            **config,
         )
         
         return QwenResponse(
             user_id=result["user_id"],
             request_id=result["request_id"],
+            model=result["model"],
             thinking_content=None,
             content=result["content"],
             timestamp=result["timestamp"]
         )
+    except AdmissionRejected as e:
+        raise too_many_requests(e, request.user_id)
+    except TimeoutError:
+        raise deadline_exceeded(request.user_id)
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -51,4 +65,22 @@ async def request_qwen(request: QwenRequest):
                 "user_id": request.user_id,
                 "error_message": "服务器内部错误，请稍后再试。",
             }
-        )
\ No newline at end of file
+        )
+
+@router.get(
+    path="/cache",
+    response_model=CacheStatsResponse,
+    summary="查询回复缓存",
+    description="返回大语言模型回复缓存的命中率与容量统计",
+)
+async def request_cache_stats():
+    return CacheStatsResponse(**llm_cache_stats())
+
+@router.get(
+    path="/backends",
+    response_model=list[BackendInfo],
+    summary="查询模型后端",
+    description="返回常驻内存的大语言模型后端及其延迟与吞吐特性",
+)
+async def request_backends():
+    return [BackendInfo(**info) for info in llm_backends()]
@@ -0,0 +1,68 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from models.poster_models import PosterRequest, PosterResponse, PosterLayer, ErrorResponse
+from services.poster.poster_service import poster_generate
+from utils.security import get_api_key
+from utils.dependencies import get_account_id
+from utils.rate_limit import configured_limiter
+from utils.admission import AdmissionRejected, DEADLINE_HEADER, admit, too_many_requests
+from dotenv import load_dotenv
+
+load_dotenv()
+
+router = APIRouter(
+    prefix="/poster",
+    tags=["海报生成"],
+    dependencies=[Depends(get_api_key), Depends(configured_limiter("poster", "10/60"))],
+    responses={
+        400: {"model": ErrorResponse, "description": "无效请求"},
+        401: {"model": ErrorResponse, "description": "API Key 验证失败"},  
+        429: {"model": ErrorResponse, "description": "请求过于频繁"},
+        500: {"model": ErrorResponse, "description": "服务器错误"}
+    }
+)
+
+@router.post(
+    path="",
+    response_model=PosterResponse,
+    summary="一次生成整张海报",
+    description="由大语言模型规划图层，并发生成背景、透明图层与矢量文本，一次返回完整图层栈",
+)
+async def request_poster(request: PosterRequest, deadline_ms: float | None = DEADLINE_HEADER, account_id: str | None = Depends(get_account_id)):
+    try:
+        async with admit("poster", deadline_ms):
+            result = await poster_generate(
+                user_id=request.user_id,
+                brief=request.brief,
+                width=request.width,
+                height=request.height,
+                plan=request.plan,
+                config=request.config.model_dump(exclude_unset=True) if request.config else None,
+                deadline_ms=deadline_ms,
+                account_id=account_id,
+            )
+
+        return PosterResponse(
+            user_id=result["user_id"],
+            request_id=result["request_id"],
+            plan=result["plan"],
+            layers=[PosterLayer(**layer) for layer in result["layers"]],
+            timestamp=result["timestamp"]
+        )
+    except AdmissionRejected as e:
+        raise too_many_requests(e, request.user_id)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "user_id": request.user_id,
+                "error_message": str(e),
+                }
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail={
+                "user_id": request.user_id,
+                "error_message": "服务器内部错误，请稍后再试。",
+            }
+        )
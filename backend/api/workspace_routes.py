@@ -0,0 +1,85 @@
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, status
+from pydantic import TypeAdapter, ValidationError
+from models.workspace_models import RegenerateOp, InitOp, AddOp, WorkspaceOperation
+from services.workspace.workspace_service import WorkspaceSession
+from utils.admission import AdmissionRejected
+from utils.dependencies import get_websocket_claims
+from utils.security import get_api_key
+from utils.rate_limit import configured_limiter
+from utils.responses import json_dumps
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix="/workspace",
+    tags=["工作区"],
+)
+
+# connections, not edits: an open session is authenticated and rate limited once
+workspace_limiter = configured_limiter("workspace", "30/60")
+
+operation_adapter = TypeAdapter(WorkspaceOperation)
+
+# operations that may run an SDXL generation get an acknowledgement before the patch
+SLOW_OPS = (InitOp, AddOp, RegenerateOp)
+
+
+def _error(op_id: str | None, message: str, **extra) -> dict:
+    return {"type": "error", "op_id": op_id, "error_message": message, **extra}
+
+
+async def _send(websocket: WebSocket, message: dict):
+    # patches carry base64 tiles, serialized with orjson instead of send_json's stdlib json
+    await websocket.send_text(json_dumps(message).decode("utf-8"))
+
+
+@router.websocket("/ws")
+async def workspace_session(websocket: WebSocket):
+    """
+    工作区会话: 连接时验证一次 API Key (api-key 请求头或 ?api_key=) 与可选的登录令牌,
+    之后每条消息是一个编辑操作 (init / add / move / recolor / text / regenerate / remove),
+    服务端只返回受影响的图层或画布分块 (patch)
+    """
+    try:
+        await get_api_key(websocket.headers.get("api-key") or websocket.query_params.get("api_key"))
+        await workspace_limiter(websocket)
+        claims = get_websocket_claims(websocket)
+    except HTTPException as e:
+        code = status.WS_1013_TRY_AGAIN_LATER if e.status_code == status.HTTP_429_TOO_MANY_REQUESTS else status.WS_1008_POLICY_VIOLATION
+        await websocket.close(code=code, reason=str(e.detail))
+        return
+
+    user_id = claims.get("sub") if claims else websocket.query_params.get("user_id", "zx")
+    session = WorkspaceSession(user_id, claims.get("sub") if claims else None)
+    try:
+        deadline_ms = float(websocket.query_params["deadline_ms"])
+    except (KeyError, ValueError):
+        deadline_ms = None
+    await websocket.accept()
+
+    try:
+        while True:
+            text = await websocket.receive_text()
+            op_id = None
+            try:
+                message = json.loads(text)
+                op_id = message.get("op_id") if isinstance(message, dict) else None
+                op = operation_adapter.validate_python(message)
+                if isinstance(op, SLOW_OPS):
+                    await _send(websocket, {"type": "ack", "op_id": op_id, "version": session.version})
+                await _send(websocket, await session.apply(op, deadline_ms))
+            except AdmissionRejected as e:
+                await _send(websocket, _error(op_id, "服务繁忙, 请稍后重试", retry_after=e.retry_after_header))
+            except TimeoutError:
+                await _send(websocket, _error(op_id, "等待结果超出截止时间, 生成仍在后台进行"))
+            except ValidationError as e:
+                await _send(websocket, _error(op_id, "无效的操作: " + "; ".join(error["msg"] for error in e.errors())))
+            except ValueError as e:
+                await _send(websocket, _error(op_id, str(e)))
+            except Exception:
+                logger.exception("工作区操作失败 user_id=%s", user_id)
+                await _send(websocket, _error(op_id, "服务器内部错误，请稍后再试。"))
+    except WebSocketDisconnect:
+        pass
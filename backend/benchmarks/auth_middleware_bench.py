@@ -0,0 +1,131 @@
+"""
+Per-request overhead of the JWT auth middleware.
+
+Compares, on a minimal app that reads the token claims in the endpoint:
+    none    - no middleware, the endpoint decodes the token itself
+    before  - the previous BaseHTTPMiddleware version: decodes the token, throws the
+              result away, the endpoint decodes it again
+    after   - the pure ASGI JWTAuthMiddleware: decodes once (cached per token),
+              the endpoint reads the claims from the scope
+Requests are driven straight through the ASGI interface, so the numbers contain
+no network or server cost, only the middleware and the decode work.
+
+Usage (from the backend directory):
+    python -m benchmarks.auth_middleware_bench --requests 20000
+"""
+
+import argparse
+import asyncio
+import time
+
+import jwt
+from starlette.applications import Starlette
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+from config import ALGORITHM, SECRET_KEY
+from utils.middleware import CLAIMS_SCOPE_KEY, JWTAuthMiddleware
+
+decodes = 0
+
+
+def _decode(token: str) -> dict:
+    global decodes
+    decodes += 1
+    return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
+
+class LegacyJWTAuthMiddleware(BaseHTTPMiddleware):
+    # the previous implementation, reduced to its per-request work
+    async def dispatch(self, request, call_next):
+        authorization = request.headers.get("Authorization")
+        if authorization and authorization.lower().startswith("bearer "):
+            try:
+                _decode(authorization[7:])
+            except jwt.InvalidTokenError:
+                pass
+        return await call_next(request)
+
+
+def _claims(request) -> dict:
+    claims = request.scope.get(CLAIMS_SCOPE_KEY)
+    if claims is None:
+        claims = _decode(request.headers["Authorization"][7:])
+    return claims
+
+
+async def plain(request):
+    return PlainTextResponse(_claims(request)["sub"])
+
+
+async def stream(request):
+    sub = _claims(request)["sub"]
+
+    async def body():
+        for _ in range(8):
+            yield sub.encode() * 512
+
+    return StreamingResponse(body())
+
+
+def build(variant: str):
+    app = Starlette(routes=[Route("/plain", plain), Route("/stream", stream)])
+    if variant == "before":
+        app.add_middleware(LegacyJWTAuthMiddleware)
+    elif variant == "after":
+        app.add_middleware(JWTAuthMiddleware)
+    return app
+
+
+async def drive(app, path: str, token: str, requests: int) -> float:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "headers": [(b"host", b"bench"), (b"authorization", f"Bearer {token}".encode())],
+        "client": ("127.0.0.1", 1234), "server": ("bench", 80),
+    }
+
+    async def send(message):
+        pass
+
+    async def call():
+        body_read = False
+
+        async def receive():
+            nonlocal body_read
+            if not body_read:
+                body_read = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            # the client stays connected; StreamingResponse listens for a disconnect
+            # while streaming and cancels this wait once the body is sent
+            await asyncio.Event().wait()
+
+        await app(dict(scope), receive, send)
+
+    for _ in range(200):
+        await call()
+    start = time.perf_counter()
+    for _ in range(requests):
+        await call()
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+def main():
+    global decodes
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    token = jwt.encode({"sub": "bench-user", "exp": int(time.time()) + 3600}, SECRET_KEY, algorithm=ALGORITHM)
+    print(f"{'variant':<8} {'path':<8} {'us/request':>11} {'decodes/request':>16}")
+    for path in ("/plain", "/stream"):
+        for variant in ("none", "before", "after"):
+            app = build(variant)
+            decodes = 0
+            us = asyncio.run(drive(app, path, token, args.requests))
+            print(f"{variant:<8} {path:<8} {us:>11.1f} {decodes / (args.requests + 200):>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
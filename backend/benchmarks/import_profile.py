@@ -0,0 +1,56 @@
+"""
+Import cost of the API at startup.
+
+Runs `python -X importtime -c "import main"` in a fresh interpreter and sums the
+import time of every module per top-level package, so a heavy stack (torch, diffusers,
+transformers) pulled in at import time shows up at the top of the list. With the
+model code imported lazily none of them should appear.
+
+Usage (from the backend directory):
+    python -m benchmarks.import_profile --top 15
+"""
+
+import argparse
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+
+def profile(module: str) -> tuple[float, dict[str, int], str]:
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - start
+
+    # line format: "import time: self [us] | cumulative | imported package"
+    # summing self times per top-level package counts every module exactly once
+    packages: dict[str, int] = defaultdict(int)
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        packages[name.strip().split(".")[0]] += int(self_us)
+    return wall, packages, proc.stderr if proc.returncode else ""
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    wall, packages, error = profile(args.module)
+    if error:
+        print(error.splitlines()[-1], file=sys.stderr)
+    print(f"{'package':<24} {'ms':>14}")
+    for name, us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{name:<24} {us / 1000:>14.1f}")
+    print(f"{'total (import time)':<24} {sum(packages.values()) / 1000:>14.1f}")
+    print(f"{'wall (incl. interpreter)':<24} {wall * 1000:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Serialization and compression cost of the JSON responses.
+
+Payloads:
+    history   - a 200-item history page (HistoryResponse)
+    keypoints - a pose keypoint dict with NumPy `candidate` (N, 4) and `subset` (M, 20) arrays
+    patch     - a workspace patch with 16 base64 PNG tiles
+Serializers:
+    stdlib    - what an untyped route did: jsonable_encoder (arrays .tolist()-ed first) + JSONResponse
+    pydantic  - FastAPI's path for routes with a response_model (validate + dump_json), history only
+    orjson    - FastJSONResponse returned directly (arrays serialized natively)
+Compression: size and time of gzip and (when installed) brotli at the configured levels.
+
+Usage (from the backend directory):
+    python -m benchmarks.json_response_bench --repeats 200
+"""
+
+import argparse
+import base64
+import os
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse
+
+from models.history_models import HistoryResponse
+from utils.middleware import CompressionMiddleware, brotli
+from utils.responses import FastJSONResponse, orjson
+
+
+def history_payload(items: int = 200) -> dict:
+    created_at = datetime.now(timezone.utc)
+    return {
+        "user_id": "zx",
+        "next_cursor": "c" * 40,
+        "items": [
+            {
+                "request_id": f"{i:032x}",
+                "is_successful": True,
+                "created_at": created_at,
+                "layers": [
+                    {
+                        "positive_prompt": "Glass bottle, high quality, transparent background, studio lighting, soft shadows",
+                        "negative_prompt": "blurry, low quality",
+                        "image_path": f"static/objects/ab/cd/{i:064x}.png",
+                        "image_format": "png",
+                    }
+                    for _ in range(3)
+                ],
+            }
+            for i in range(items)
+        ],
+    }
+
+
+def keypoints_payload(people: int = 20) -> dict:
+    rng = np.random.default_rng(0)
+    return {
+        "candidate": rng.random((people * 18, 4)) * 1024,
+        "subset": rng.integers(-1, people * 18, (people, 20)).astype(np.float64),
+    }
+
+
+def patch_payload(tiles: int = 16) -> dict:
+    return {
+        "type": "patch",
+        "version": 1,
+        "tiles": [
+            {"x": i * 256, "y": 0, "width": 256, "height": 256, "data": base64.b64encode(os.urandom(48 * 1024)).decode("ascii")}
+            for i in range(tiles)
+        ],
+    }
+
+
+def _tolist(content):
+    if isinstance(content, dict):
+        return {key: _tolist(value) for key, value in content.items()}
+    return content.tolist() if isinstance(content, np.ndarray) else content
+
+
+def timed(fn, repeats: int) -> tuple[float, bytes]:
+    body = fn()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1000, body
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeats", type=int, default=200)
+    args = parser.parse_args()
+
+    if orjson is None:
+        print("orjson is not installed, FastJSONResponse falls back to stdlib json")
+    payloads = {
+        "history": history_payload(),
+        "keypoints": keypoints_payload(),
+        "patch": patch_payload(),
+    }
+    compression = CompressionMiddleware(None)
+    encodings = ["gzip"] + (["br"] if brotli is not None else [])
+
+    print(f"{'payload':<10} {'serializer':<9} {'ms':>8} {'bytes':>10}")
+    for name, payload in payloads.items():
+        runs = {
+            "stdlib": lambda: JSONResponse(jsonable_encoder(_tolist(payload))).body,
+            "orjson": lambda: FastJSONResponse(payload).body,
+        }
+        if name == "history":
+            runs["pydantic"] = lambda: HistoryResponse.model_validate(payload).model_dump_json().encode()
+        results = {serializer: timed(run, args.repeats) for serializer, run in runs.items()}
+        for serializer, (ms, body) in results.items():
+            print(f"{name:<10} {serializer:<9} {ms:>8.3f} {len(body):>10}")
+        saved = results["stdlib"][0] - results["orjson"][0]
+        print(f"{name:<10} saved     {saved:>8.3f} ms/response ({results['stdlib'][0] / results['orjson'][0]:.1f}x)")
+
+        body = results["orjson"][1]
+        for encoding in encodings:
+            ms, compressed = timed(lambda: compression.compress(body, encoding), max(1, args.repeats // 10))
+            print(f"{name:<10} {encoding:<9} {ms:>8.3f} {len(compressed):>10} ({len(compressed) / len(body):.0%})")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Benchmark of the int8 CPU runtimes against the fp32 reference.
+
+Every (model, quantization) pair runs in its own process so that the reported
+RSS only contains one model. For each run we report:
+    - prefill tokens/s: one forward pass over the prompt
+    - decode tokens/s: greedy generation of a fixed number of new tokens, prefill excluded
+    - rss_mb: resident memory after loading and running the model
+    - agreement: fraction of generated tokens identical to the fp32 run (position by position)
+
+Usage (from the backend directory):
+    python -m benchmarks.llm_quant_bench --models qwen gemma --new-tokens 64
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+PROMPTS = [
+    "Give me a short introduction to large language model.",
+    "Rewrite this design brief as an SDXL prompt: a marketing poster promoting Coca-Cola, "
+    "red background, glass bottle in the center, summer mood, high quality.",
+]
+MODES = ["fp32", "int8_dynamic", "int8_weight_only"]
+
+
+def _rss_mb() -> float:
+    # current RSS from /proc when available, peak RSS from getrusage otherwise
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _load(model: str, quantization: str | None):
+    from algorithms.LLM.pool import BACKENDS
+    backend = BACKENDS[model](torch_dtype="float32", device_map="cpu", quantization=quantization).load()
+    return backend.tokenizer, backend.model
+
+
+def run_worker(model: str, mode: str, new_tokens: int, repeats: int) -> dict:
+    import torch
+
+    quantization = None if mode == "fp32" else mode
+    start = time.perf_counter()
+    tokenizer, lm = _load(model, quantization)
+    load_s = time.perf_counter() - start
+
+    prefill_tokens, prefill_s, decode_tokens, decode_s = 0, 0.0, 0, 0.0
+    outputs = []
+    with torch.inference_mode():
+        for prompt in PROMPTS:
+            text = tokenizer.apply_chat_template(
+                [{"role": "user", "content": prompt}], tokenize=False, add_generation_prompt=True
+            )
+            inputs = tokenizer([text], return_tensors="pt")
+            n_prompt = inputs["input_ids"].shape[1]
+
+            # warmup
+            lm(**inputs)
+
+            for _ in range(repeats):
+                t0 = time.perf_counter()
+                lm(**inputs)
+                t_prefill = time.perf_counter() - t0
+                prefill_s += t_prefill
+                prefill_tokens += n_prompt
+
+                t0 = time.perf_counter()
+                generated = lm.generate(
+                    **inputs,
+                    max_new_tokens=new_tokens,
+                    min_new_tokens=new_tokens,
+                    do_sample=False,
+                )
+                elapsed = time.perf_counter() - t0
+                # generate() contains one prefill, subtract the one just measured
+                decode_s += max(elapsed - t_prefill, 1e-9)
+                decode_tokens += new_tokens
+            outputs.append(generated[0][n_prompt:].tolist())
+
+    return {
+        "model": model,
+        "mode": mode,
+        "load_s": round(load_s, 2),
+        "prefill_tok_s": round(prefill_tokens / prefill_s, 1),
+        "decode_tok_s": round(decode_tokens / decode_s, 1),
+        "rss_mb": round(_rss_mb(), 1),
+        "output_ids": outputs,
+    }
+
+
+def agreement(reference: list[list[int]], candidate: list[list[int]]) -> float:
+    same, total = 0, 0
+    for ref, out in zip(reference, candidate):
+        total += len(ref)
+        same += sum(1 for a, b in zip(ref, out) if a == b)
+    return same / total if total else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="int8 CPU runtime benchmark")
+    parser.add_argument("--models", nargs="+", default=["qwen", "gemma"], choices=["qwen", "gemma"])
+    parser.add_argument("--modes", nargs="+", default=MODES, choices=MODES)
+    parser.add_argument("--new-tokens", type=int, default=64)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads per process")
+    parser.add_argument("--worker", nargs=2, metavar=("MODEL", "MODE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.repeats < 1:
+        parser.error("--repeats must be at least 1")
+    if args.new_tokens < 1:
+        parser.error("--new-tokens must be at least 1")
+
+    if args.worker:
+        if args.threads:
+            import torch
+            torch.set_num_threads(args.threads)
+        print(json.dumps(run_worker(args.worker[0], args.worker[1], args.new_tokens, args.repeats)))
+        return
+
+    modes = ["fp32"] + [m for m in args.modes if m != "fp32"]
+    header = f"{'model':<6} {'mode':<17} {'load s':>7} {'prefill tok/s':>14} {'decode tok/s':>13} {'RSS MB':>8} {'agreement':>10}"
+    print(header)
+    print("-" * len(header))
+    for model in args.models:
+        reference = None
+        for mode in modes:
+            cmd = [sys.executable, "-m", "benchmarks.llm_quant_bench",
+                   "--worker", model, mode,
+                   "--new-tokens", str(args.new_tokens),
+                   "--repeats", str(args.repeats)]
+            if args.threads:
+                cmd += ["--threads", str(args.threads)]
+            # hide the GPU so that the fp32 reference also runs on CPU
+            env = dict(os.environ, CUDA_VISIBLE_DEVICES="")
+            out = subprocess.run(cmd, check=True, capture_output=True, text=True, env=env,
+                                 cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            result = json.loads(out.stdout.strip().splitlines()[-1])
+            if reference is None:
+                reference = result["output_ids"]
+            score = agreement(reference, result["output_ids"])
+            print(f"{model:<6} {mode:<17} {result['load_s']:>7} {result['prefill_tok_s']:>14} "
+                  f"{result['decode_tok_s']:>13} {result['rss_mb']:>8} {score:>10.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""
+Load test of the HTTP API on one CPU-only machine.
+
+Start the server with the stub inference engine (deterministic synthetic outputs
+after a simulated latency, see algorithms/stub.py) and limits high enough that
+the rate limiter does not dominate the results:
+    STUB_ENGINE=true STUB_LATENCY="trans=2.0,llm=0.5,rgb=0,svg=0" \\
+    RATE_LIMITS="img=100000/60,llm=100000/60,auth=100000/60,history=100000/60" \\
+    uvicorn main:app --port 8000
+
+Every worker loops over requests drawn from the traffic mix (closed loop, one
+request in flight per worker):
+    auth     - login (bcrypt) followed by /auth/me with the returned token
+    rgb      - a background from a small palette, so repeated ones hit the caches
+    layer    - an SDXL layer, prompts and seeds from small sets (single-flight, caches)
+    svg      - a text layer
+    chat     - an LLM chat message
+    poster   - a poster with an explicit plan (no LLM planning step)
+    static   - a previously generated file, sometimes as a resized derivative
+    history  - the first history page of a user
+The report gives throughput, p50/p95/p99 latency, error and rejection
+(429/503/504) rates per scenario; requests of the warmup period are not counted.
+
+Usage (from the backend directory):
+    python -m benchmarks.load_test --url http://127.0.0.1:8000 --api-key $API_KEY \\
+        --concurrency 32 --duration 60 --mix auth=1,rgb=4,layer=2,svg=2,chat=2,static=6,history=2
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import defaultdict
+
+import httpx
+
+from config import API_KEY
+
+DEFAULT_MIX = "auth=1,rgb=4,layer=2,svg=2,chat=2,static=6,history=2"
+PALETTE = ["#ffffff", "#000000", "#e63946", "#457b9d", "#f1c453"]
+PROMPTS = ["glass bottle, high quality", "red sports car, studio lighting", "potted plant, soft shadows", "vintage camera"]
+TEXTS = ["SUMMER SALE", "Grand Opening", "歌剧之夜", "Limited Edition"]
+PASSWORD = "loadtest-password"
+REJECTED = (429, 503, 504)
+
+
+class Context:
+    def __init__(self, users: list[dict], static_limit: int = 500):
+        self.users = users
+        self.static_paths: list[str] = []
+        self.static_limit = static_limit
+
+    def user(self) -> dict:
+        return random.choice(self.users)
+
+    def remember(self, response: httpx.Response):
+        # generated files feed the static scenario
+        if response.status_code != 200:
+            return
+        local_path = response.json().get("local_path")
+        if local_path:
+            if len(self.static_paths) >= self.static_limit:
+                self.static_paths[random.randrange(self.static_limit)] = local_path
+            else:
+                self.static_paths.append(local_path)
+
+
+async def auth(client: httpx.AsyncClient, ctx: Context) -> httpx.Response:
+    user = ctx.user()
+    response = await client.post("/api/auth/login", json={"username": user["username"], "password": PASSWORD})
+    if response.status_code != 200:
+        return response
+    token = response.json()["access_token"]
+    return await client.get("/api/auth/me", headers={"Authorization": f"Bearer {token}"})
+
+
+async def rgb(client: httpx.AsyncClient, ctx: Context) -> httpx.Response:
+    body = {"user_id": ctx.user()["user_id"], "width": 1024, "height": 1024, "color": random.choice(PALETTE)}
+    if random.random() < 0.5:
+        body.update(kind=random.choice(["linear", "radial", "noise"]), colors=random.sample(PALETTE, 2))
+    response = await client.post("/api/img/rgb", json=body)
+    ctx.remember(response)
+    return response
+
+
+async def layer(client: httpx.AsyncClient, ctx: Context) -> httpx.Response:
+    body = {
+        "user_id": ctx.user()["user_id"],
+        "width": 512,
+        "height": 512,
+        "prompt_pos": random.choice(PROMPTS),
+        "seed": random.randrange(20),
+    }
+    response = await client.post("/api/img/layer", json=body)
+    ctx.remember(response)
+    return response
+
+
+async def svg(client: httpx.AsyncClient, ctx: Context) -> httpx.Response:
+    body = {"user_id": ctx.user()["user_id"], "text": random.choice(TEXTS), "font_size": random.choice([40, 64, 96])}
+    response = await client.post("/api/img/svg", json=body)
+    ctx.remember(response)
+    return response
+
+
+async def chat(client: httpx.AsyncClient, ctx: Context) -> httpx.Response:
+    body = {"user_id": ctx.user()["user_id"], "prompt": f"Write an SDXL prompt for: {random.choice(PROMPTS)}"}
+    return await client.post("/api/llm/chat", json=body)
+
+
+async def poster(client: httpx.AsyncClient, ctx: Context) -> httpx.Response:
+    plan = {
+        "background_color": random.choice(PALETTE),
+        "objects": [{"prompt_pos": random.choice(PROMPTS), "box": {"x": 64, "y": 64, "width": 512, "height": 512}}],
+        "texts": [{"text": random.choice(TEXTS), "box": {"x": 64, "y": 640, "width": 800, "height": 120}, "font_size": 96}],
+    }
+    body = {"user_id": ctx.user()["user_id"], "width": 1024, "height": 1024, "plan": plan}
+    return await client.post("/api/poster", json=body)
+
+
+async def static(client: httpx.AsyncClient, ctx: Context) -> httpx.Response:
+    if not ctx.static_paths:
+        return await rgb(client, ctx)
+    path = "/" + random.choice(ctx.static_paths).lstrip("./")
+    params = {"w": random.choice([128, 256, 512]), "format": "webp"} if random.random() < 0.3 else None
+    return await client.get(path, params=params)
+
+
+async def history(client: httpx.AsyncClient, ctx: Context) -> httpx.Response:
+    return await client.get("/api/history", params={"user_id": ctx.user()["user_id"], "limit": 20})
+
+
+SCENARIOS = {
+    "auth": auth,
+    "rgb": rgb,
+    "layer": layer,
+    "svg": svg,
+    "chat": chat,
+    "poster": poster,
+    "static": static,
+    "history": history,
+}
+
+
+def parse_mix(value: str) -> dict[str, float]:
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.strip().partition("=")
+        if name not in SCENARIOS:
+            raise SystemExit(f"unknown scenario {name!r}, choose from {', '.join(SCENARIOS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+async def setup_users(client: httpx.AsyncClient, count: int) -> list[dict]:
+    """Register (or reuse) the load test users, returns their ids and names"""
+    users = []
+    for i in range(count):
+        username = f"loadtest_{i}"
+        await client.post("/api/auth/register", json={"username": username, "email": f"{username}@example.com", "password": PASSWORD})
+        response = await client.post("/api/auth/login", json={"username": username, "password": PASSWORD})
+        response.raise_for_status()
+        users.append({"username": username, "user_id": response.json()["user"]["user_id"]})
+    return users
+
+
+async def worker(client: httpx.AsyncClient, ctx: Context, mix: dict[str, float], samples: list, measure_from: float, stop_at: float):
+    names, weights = list(mix), list(mix.values())
+    while time.monotonic() < stop_at:
+        name = random.choices(names, weights)[0]
+        start = time.monotonic()
+        try:
+            outcome = (await SCENARIOS[name](client, ctx)).status_code
+        except httpx.HTTPError as e:
+            outcome = type(e).__name__
+        if start >= measure_from:
+            samples.append((name, time.monotonic() - start, outcome))
+
+
+def percentile(values: list[float], q: float) -> float:
+    # nearest rank
+    index = max(0, min(len(values) - 1, int(round(q / 100 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def summarize(samples: list, seconds: float) -> dict:
+    groups = defaultdict(list)
+    for name, latency, outcome in samples:
+        groups[name].append((latency, outcome))
+        groups["all"].append((latency, outcome))
+    report = {}
+    for name, results in groups.items():
+        latencies = sorted(latency for latency, _ in results)
+        outcomes = defaultdict(int)
+        for _, outcome in results:
+            outcomes[str(outcome)] += 1
+        rejected = sum(1 for _, outcome in results if outcome in REJECTED)
+        errors = sum(1 for _, outcome in results if not (isinstance(outcome, int) and outcome < 400)) - rejected
+        report[name] = {
+            "requests": len(results),
+            "throughput_rps": round(len(results) / seconds, 2),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+            "max_ms": round(latencies[-1] * 1000, 1),
+            "error_rate": round(errors / len(results), 4),
+            "rejected_rate": round(rejected / len(results), 4),
+            "outcomes": dict(outcomes),
+        }
+    return report
+
+
+def print_report(report: dict):
+    print(f"{'scenario':<9} {'requests':>8} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7} {'rejected':>8}  outcomes")
+    for name in sorted(report, key=lambda name: (name == "all", name)):
+        row = report[name]
+        print(
+            f"{name:<9} {row['requests']:>8} {row['throughput_rps']:>8.2f} {row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f}"
+            f" {row['p99_ms']:>9.1f} {row['error_rate']:>7.2%} {row['rejected_rate']:>8.2%}  {row['outcomes']}"
+        )
+
+
+async def run(args):
+    mix = parse_mix(args.mix)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, headers={"api-key": args.api_key}, limits=limits, timeout=args.timeout) as client:
+        ctx = Context(await setup_users(client, args.users))
+        samples: list = []
+        start = time.monotonic()
+        measure_from, stop_at = start + args.warmup, start + args.warmup + args.duration
+        await asyncio.gather(*(worker(client, ctx, mix, samples, measure_from, stop_at) for _ in range(args.concurrency)))
+        seconds = max(time.monotonic(), stop_at) - measure_from
+
+    if not samples:
+        raise SystemExit("no request completed in the measurement window")
+    report = summarize(samples, seconds)
+    print(f"{args.concurrency} workers, {seconds:.1f}s measured after {args.warmup:.0f}s warmup, mix {args.mix}")
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": vars(args), "report": report}, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--api-key", default=API_KEY)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30, help="seconds measured")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds run before measuring")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"scenario=weight,... from {', '.join(SCENARIOS)}")
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--json", help="also write the report to this file")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
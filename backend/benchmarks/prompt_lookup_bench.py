@@ -0,0 +1,79 @@
+"""
+Benchmark of prompt-lookup (n-gram) assisted decoding on the prompt-rewriting workload.
+
+The workload turns design briefs (see log.md) into SDXL prompts, the output copies
+long spans of the brief, which is where drafting from the prompt pays off.
+Both runs use greedy decoding, so the outputs must be identical; the response
+cache is bypassed by calling generate() directly.
+
+Usage (from the backend directory):
+    python -m benchmarks.prompt_lookup_bench --model qwen --num-tokens 10
+"""
+
+import argparse
+import time
+
+BRIEFS = [
+    "A marketing poster promoting Coca-Cola: a cold glass bottle of Coca-Cola with condensation drops in the center, "
+    "red background with white ribbon waves, summer mood, bright light, high quality, commercial photography.",
+    "歌剧海报，包含摩登女郎，歌剧舞台等。舞台上方是红色丝绒幕布，摩登女郎身穿黑色晚礼服站在聚光灯下，背景为金色装饰艺术风格花纹。",
+    "Glass bottle, high quality, transparent background, studio lighting, soft shadows, product shot for a perfume brand, "
+    "elegant minimal composition with pastel colors.",
+    "A handsome man with curly hair, high quality, portrait for a jazz concert poster, warm stage lights, saxophone in hand, "
+    "vintage film grain, deep blue and orange palette.",
+]
+
+INSTRUCTION = (
+    "Rewrite the following design brief as a single comma-separated SDXL prompt. "
+    "Keep the original wording of every visual element, only reorder and add quality tags.\n\nBrief: "
+)
+
+
+def run(backend, prompt_lookup_num_tokens: int | None, max_new_tokens: int, repeats: int):
+    import torch
+
+    texts, elapsed, new_tokens = [], 0.0, 0
+    for brief in BRIEFS:
+        text = backend.apply_template(backend.build_messages(INSTRUCTION + brief), enable_thinking=False)
+        inputs = backend.tokenizer([text], return_tensors="pt")
+        inputs = {k: v.to(backend.model.device) for k, v in inputs.items()}
+        kwargs = {"max_new_tokens": max_new_tokens, "do_sample": False}
+        if prompt_lookup_num_tokens:
+            kwargs["prompt_lookup_num_tokens"] = prompt_lookup_num_tokens
+        with torch.inference_mode():
+            # warmup
+            backend.model.generate(**inputs, **kwargs)
+            for _ in range(repeats):
+                t0 = time.perf_counter()
+                generated = backend.model.generate(**inputs, **kwargs)
+                elapsed += time.perf_counter() - t0
+        output_ids = generated[0][inputs["input_ids"].shape[1]:].tolist()
+        new_tokens += len(output_ids) * repeats
+        texts.append(output_ids)
+    return texts, elapsed, new_tokens
+
+
+def main():
+    parser = argparse.ArgumentParser(description="prompt-lookup decoding benchmark")
+    parser.add_argument("--model", default="qwen", choices=["qwen", "gemma"])
+    parser.add_argument("--num-tokens", type=int, default=10, help="prompt_lookup_num_tokens")
+    parser.add_argument("--max-new-tokens", type=int, default=256)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    from algorithms.LLM.pool import llm_pool
+    backend = llm_pool.get(args.model)
+
+    base_ids, base_s, base_tokens = run(backend, None, args.max_new_tokens, args.repeats)
+    pld_ids, pld_s, pld_tokens = run(backend, args.num_tokens, args.max_new_tokens, args.repeats)
+
+    identical = sum(1 for a, b in zip(base_ids, pld_ids) if a == b)
+    print(f"model:            {backend.model_id}")
+    print(f"greedy:           {base_tokens / base_s:8.1f} tok/s  ({base_s:.2f}s)")
+    print(f"prompt lookup:    {pld_tokens / pld_s:8.1f} tok/s  ({pld_s:.2f}s, prompt_lookup_num_tokens={args.num_tokens})")
+    print(f"speedup:          {base_s / pld_s:8.2f}x")
+    print(f"identical output: {identical}/{len(BRIEFS)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -14,3 +14,131 @@ API_KEY = os.getenv("API_KEY", "u#Tqw(]%CTO+u&[FQ&G6apADEmKzOqc[Aqk-6W~Z")
 # JWT Configuration
 ACCESS_TOKEN_EXPIRE_MINUTES = 30 * 24 * 60  # 30 days
 ALGORITHM = "HS256"
+
+# LLM response cache (greedy generations only)
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", 3600))  # seconds
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 1024))
+
+# LLM backends kept resident in the warm pool (comma separated: qwen, gemma)
+LLM_BACKENDS = [name.strip() for name in os.getenv("LLM_BACKENDS", "qwen,gemma").split(",") if name.strip()]
+LLM_WARMUP = os.getenv("LLM_WARMUP", "false").lower() == "true"  # load LLM_BACKENDS at startup
+# variants "torch_dtype:device_map:quantization" a request may select (empty quantization: none), the first one
+# serves requests that do not ask for one; every other variant is rejected instead of loaded
+LLM_VARIANTS = [v.strip() for v in os.getenv("LLM_VARIANTS", "auto:auto:").split(",") if v.strip()]
+# at most this many (backend, variant) pairs stay loaded, least recently used ones are unloaded
+LLM_POOL_MAX_MODELS = int(os.getenv("LLM_POOL_MAX_MODELS", len(LLM_BACKENDS) * len(LLM_VARIANTS)))
+TRANS_WARMUP = os.getenv("TRANS_WARMUP", "false").lower() == "true"  # load the SDXL layer pipeline at startup
+
+# Posters: longest side of the canvas (and of any box on it), object (SDXL) and text layers per plan;
+# object layers are sampled like /img/layer/batch (TRANS_MAX_BATCH per run, admitted per run), with
+# each side at least POSTER_MIN_OBJECT_SIDE and at most TRANS_MAX_SIDE
+POSTER_MIN_OBJECT_SIDE = int(os.getenv("POSTER_MIN_OBJECT_SIDE", 256))
+POSTER_MAX_SIDE = int(os.getenv("POSTER_MAX_SIDE", 4096))
+POSTER_MAX_OBJECTS = int(os.getenv("POSTER_MAX_OBJECTS", 8))
+POSTER_MAX_TEXTS = int(os.getenv("POSTER_MAX_TEXTS", 16))
+
+# Layer variations and /img/layer/batch: maximum number of images of the same size sampled together
+TRANS_MAX_BATCH = int(os.getenv("TRANS_MAX_BATCH", 4))
+# longest side of a layer and total images (sum of num_images) of one /img/layer/batch request
+TRANS_MAX_SIDE = int(os.getenv("TRANS_MAX_SIDE", 2048))
+LAYER_BATCH_MAX_IMAGES = int(os.getenv("LAYER_BATCH_MAX_IMAGES", TRANS_MAX_BATCH * 4))
+
+# Longest side of generated images, composites and workspace canvases (compositing allocates a float32 RGBA canvas),
+# largest scale factor of a composited layer
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", 4096))
+LAYER_MAX_SCALE = float(os.getenv("LAYER_MAX_SCALE", 8))
+
+# Layer compositing: memory budget for decoded layers and flattened prefixes, a prefix is kept
+# every COMPOSITE_PREFIX_INTERVAL layers (plus below the topmost and the edited layer)
+COMPOSITE_CACHE_MB = int(os.getenv("COMPOSITE_CACHE_MB", 1024))
+COMPOSITE_PREFIX_INTERVAL = int(os.getenv("COMPOSITE_PREFIX_INTERVAL", 4))
+
+# Workspace WebSocket sessions: size of the canvas tiles pushed after an edit, layers per document
+WORKSPACE_TILE_SIZE = int(os.getenv("WORKSPACE_TILE_SIZE", 256))
+WORKSPACE_MAX_LAYERS = int(os.getenv("WORKSPACE_MAX_LAYERS", 64))
+
+# Content-addressed storage index (user -> object, legacy path -> object)
+STORAGE_INDEX_PATH = os.getenv("STORAGE_INDEX_PATH", "storage_index.sqlite3")
+
+# On-demand derivative images served from /static (?w=&format=&q=)
+# requested widths and qualities snap to these steps, static/derived/ is capped at DERIVED_MAX_MB (oldest files go first)
+DERIVED_WIDTHS = sorted(int(w) for w in os.getenv("DERIVED_WIDTHS", "64,128,256,512,768,1024,1536,2048,4096").split(","))
+DERIVED_QUALITIES = sorted(int(q) for q in os.getenv("DERIVED_QUALITIES", "50,65,75,85,95").split(","))
+DERIVED_MAX_MB = int(os.getenv("DERIVED_MAX_MB", 2048))
+
+# Procedural backgrounds: memory budget for rendered pixels and encoded files
+BACKGROUND_CACHE_MB = int(os.getenv("BACKGROUND_CACHE_MB", 256))
+
+# Rate limiting (token bucket): "memory" is per process, "sqlite" is shared by all workers
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_DB_PATH = os.getenv("RATE_LIMIT_DB_PATH", "rate_limit.sqlite3")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100_000))
+# per router limits "name=calls/period,..." (img, llm, poster, auth) and per user overrides "user_id=calls/period,..."
+RATE_LIMITS = os.getenv("RATE_LIMITS", "")
+RATE_LIMIT_USERS = os.getenv("RATE_LIMIT_USERS", "")
+# reverse proxies (IPs or CIDRs, comma separated) whose X-Forwarded-For / X-Real-IP headers are trusted;
+# empty: the headers are ignored and the client is the TCP peer
+TRUSTED_PROXIES = [p.strip() for p in os.getenv("TRUSTED_PROXIES", "").split(",") if p.strip()]
+
+# Admission control per model pool "name=concurrency:max_queue:prior_service_s,...", merged over the
+# built-in pools trans=1:16:20,llm=1:8:10,poster=1:4:60 (only the pools to change need to be listed)
+ADMISSION_POOLS = os.getenv("ADMISSION_POOLS", "")
+
+# Async database engine (defaults to DATABASE_URL with its async driver: aiosqlite / asyncpg / aiomysql)
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL")
+# connection pool sizing, SQLite allows a single writer so it gets a smaller pool
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", 5))
+
+# Password hashing: bcrypt cost factor and the size of the thread pool it runs in
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 4))
+
+# Authenticated requests: cache of token -> claims and user id -> user, per process; with several
+# workers a deactivation or password change reaches the other workers after at most AUTH_CACHE_TTL
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", 60))  # seconds
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", 10_000))
+
+# Generation history write-behind queue
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", 100))
+HISTORY_FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", 1.0))  # seconds
+HISTORY_QUEUE_SIZE = int(os.getenv("HISTORY_QUEUE_SIZE", 10_000))
+
+# Storage retention: a background pass drops expired / over-quota references and deletes unreferenced objects
+RETENTION_INTERVAL_S = float(os.getenv("RETENTION_INTERVAL_S", 3600))
+RETENTION_MAX_AGE_DAYS = float(os.getenv("RETENTION_MAX_AGE_DAYS", 30))  # since last use, 0 disables
+RETENTION_USER_QUOTA_MB = float(os.getenv("RETENTION_USER_QUOTA_MB", 1024))  # 0 disables
+# assets referenced by generation history newer than this are never evicted, 0 pins all history
+RETENTION_PIN_DAYS = float(os.getenv("RETENTION_PIN_DAYS", 0))
+# grace period for fresh objects whose history record may still be queued
+RETENTION_MIN_AGE_S = float(os.getenv("RETENTION_MIN_AGE_S", 3600))
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", 200))
+RETENTION_MAX_DELETES_PER_S = float(os.getenv("RETENTION_MAX_DELETES_PER_S", 200))
+RETENTION_DERIVED_MAX_AGE_DAYS = float(os.getenv("RETENTION_DERIVED_MAX_AGE_DAYS", 7))
+# run a pass early when free disk space drops below this
+RETENTION_MIN_FREE_GB = float(os.getenv("RETENTION_MIN_FREE_GB", 5))
+
+# Response compression, negotiated per request (br when brotli is installed, else gzip)
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", 1024))  # bytes
+COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", 6))
+COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", 4))
+
+# Stub inference engine for load tests on CPU-only machines: SDXL and the LLM backends return
+# deterministic synthetic outputs after a simulated latency (seconds per call, "engine=seconds,...")
+STUB_ENGINE = os.getenv("STUB_ENGINE", "false").lower() == "true"
+STUB_LATENCY = os.getenv("STUB_LATENCY", "trans=2.0,llm=0.5,rgb=0,svg=0")
+STUB_LATENCY_JITTER = float(os.getenv("STUB_LATENCY_JITTER", 0.1))  # +- fraction of the latency
+
+# SVG text: "path" writes glyph outlines from a local font (needs fontTools), "text" a <text> element,
+# "auto" outlines when fontTools and a font are available
+SVG_TEXT_MODE = os.getenv("SVG_TEXT_MODE", "auto")
+SVG_FONT_DIRS = [d for d in os.getenv("SVG_FONT_DIRS", os.pathsep.join([
+    "fonts", "/usr/share/fonts", "/usr/local/share/fonts", "/Library/Fonts", "C:/Windows/Fonts",
+])).split(os.pathsep) if d]
+# families tried for characters the requested font does not cover (CJK text in a Latin font)
+SVG_FALLBACK_FONTS = [name.strip() for name in os.getenv(
+    "SVG_FALLBACK_FONTS", "Noto Sans CJK SC,Source Han Sans SC,Microsoft YaHei,PingFang SC,DejaVu Sans"
+).split(",") if name.strip()]
+SVG_GLYPH_CACHE_MB = int(os.getenv("SVG_GLYPH_CACHE_MB", 32))
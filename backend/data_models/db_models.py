@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, String, Text, DateTime, ForeignKey, Boolean, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
@@ -31,6 +31,11 @@ class AIResult(Base):
     
     # 与用户建立多对一关系
     user = relationship("User", back_populates="ai_results")
+
+    # 历史记录按 (user_id, created_at, id) 键集分页
+    __table_args__ = (
+        Index("ix_ai_results_user_created", "user_id", "created_at", "id"),
+    )
     
     # 与图层建立一对多关系
     layers = relationship("Layer", back_populates="ai_result", cascade="all, delete-orphan")
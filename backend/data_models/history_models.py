@@ -0,0 +1,26 @@
+from pydantic import BaseModel, Field
+from datetime import datetime
+
+# response models
+class HistoryLayer(BaseModel):
+    positive_prompt: str = Field(..., description="用户输入的正向提示词")
+    negative_prompt: str | None = Field(None, description="用户输入的负向提示词")
+    image_path: str = Field(..., description="生成图像的本地存储路径")
+    image_format: str | None = Field(None, description="图像格式")
+
+    class Config:
+        from_attributes = True
+
+class HistoryItem(BaseModel):
+    request_id: str = Field(..., description="请求唯一标识ID")
+    is_successful: bool = Field(True, description="是否成功生成")
+    created_at: datetime = Field(..., description="生成时间(UTC)")
+    layers: list[HistoryLayer] = Field(default_factory=list, description="生成的图层")
+
+    class Config:
+        from_attributes = True
+
+class HistoryResponse(BaseModel):
+    user_id: str = Field("zx", description="用户ID")
+    items: list[HistoryItem] = Field(..., description="生成历史, 新的在前")
+    next_cursor: str | None = Field(None, description="下一页游标, 为空表示没有更多记录")
@@ -1,18 +1,48 @@
 from pydantic import BaseModel, Field
+from typing import Literal
 from datetime import datetime
 
+from config import IMAGE_MAX_SIDE, LAYER_BATCH_MAX_IMAGES, LAYER_MAX_SCALE, TRANS_MAX_SIDE
+
 # request models
 class BaseRequest(BaseModel):
     user_id: str = Field("zx", description="User ID for image generation")
-    width: int = Field(1400, gt=0, description="Image width in pixels")
-    height: int = Field(2993, gt=0, description="Image height in pixels")
+    width: int = Field(1400, gt=0, le=IMAGE_MAX_SIDE, description="Image width in pixels")
+    height: int = Field(2993, gt=0, le=IMAGE_MAX_SIDE, description="Image height in pixels")
     
 class RgbRequest(BaseRequest):
     color: str = Field("#000000", description="Background color in hex format")
+    kind: Literal["solid", "linear", "radial", "noise", "pattern"] = Field("solid", description="Background type")
+    colors: list[str] | None = Field(None, min_length=2, description="Colour stops in hex format for gradients, noise and patterns; defaults to [color, #ffffff]")
+    angle: float = Field(90.0, description="Direction of linear gradients in degrees, 0 is left to right, 90 top to bottom")
+    center_x: float = Field(0.5, description="Horizontal centre of radial gradients as a fraction of the width")
+    center_y: float = Field(0.5, description="Vertical centre of radial gradients as a fraction of the height")
+    radius: float | None = Field(None, gt=0, description="Radius of radial gradients as a fraction of the longer side; defaults to the farthest corner")
+    scale: int = Field(64, gt=0, description="Size in pixels of the coarsest noise cell")
+    octaves: int = Field(4, ge=1, le=8, description="Number of noise octaves")
+    seed: int = Field(0, description="Noise seed")
+    pattern: Literal["checker", "stripes", "dots"] = Field("checker", description="Tiled pattern type")
+    tile: int = Field(64, gt=0, description="Pattern tile size in pixels")
 
 class LayerRequest(BaseRequest):
+    width: int = Field(1024, gt=0, le=TRANS_MAX_SIDE, description="Image width in pixels")
+    height: int = Field(1024, gt=0, le=TRANS_MAX_SIDE, description="Image height in pixels")
     prompt_pos: str = Field("glass bottle, high quality", min_length=1, description="User input prompt")
     prompt_neg: str = Field("face asymmetry, eyes asymmetry, deformed eyes, open mouth", min_length=1, description="User input prompt")
+    num_images: int = Field(1, ge=1, le=8, description="Number of variations, sampled together in one batch")
+    seed: int | None = Field(None, ge=0, description="Seed of the first variation, variation i uses seed + i; random when omitted")
+
+class LayerBatchItem(BaseModel):
+    width: int = Field(1024, gt=0, le=TRANS_MAX_SIDE, description="Image width in pixels")
+    height: int = Field(1024, gt=0, le=TRANS_MAX_SIDE, description="Image height in pixels")
+    prompt_pos: str = Field(..., min_length=1, description="User input prompt")
+    prompt_neg: str = Field("face asymmetry, eyes asymmetry, deformed eyes, open mouth", min_length=1, description="User input prompt")
+    num_images: int = Field(1, ge=1, le=8, description="Number of variations of this item")
+    seed: int | None = Field(None, ge=0, description="Seed of the first variation, variation i uses seed + i; random when omitted")
+
+class LayerBatchRequest(BaseModel):
+    user_id: str = Field("zx", description="User ID for image generation")
+    items: list[LayerBatchItem] = Field(..., min_length=1, max_length=16, description=f"Layer specs, items of the same size are sampled together; at most {LAYER_BATCH_MAX_IMAGES} images in total")
 
 class SvgRequest(BaseModel):
     user_id: str = Field("zx", description="User ID for image generation")
@@ -26,6 +56,17 @@ class SvgRequest(BaseModel):
     stroke: str | None = Field(None, description="Stroke color of the text")
     stroke_width: int = Field(1, ge=0, description="Stroke width of the text")
     style: dict[str, str] | None = Field(None, description="Additional CSS styles for the text")
+    text_mode: Literal["auto", "path", "text"] | None = Field(None, description="path: glyph outlines from a server font, independent of the client's fonts; text: <text> element; auto: outlines when the font is available; server default (SVG_TEXT_MODE) when omitted")
+
+class CompositeLayerSpec(BaseModel):
+    local_path: str = Field(..., description="local_path returned by /rgb, /layer or /svg")
+    x: int = Field(0, description="Horizontal offset of the layer on the canvas")
+    y: int = Field(0, description="Vertical offset of the layer on the canvas")
+    scale: float = Field(1.0, gt=0, le=LAYER_MAX_SCALE, description="Scale factor applied to the layer")
+    opacity: float = Field(1.0, ge=0, le=1, description="Layer opacity")
+
+class CompositeRequest(BaseRequest):
+    layers: list[CompositeLayerSpec] = Field(..., min_length=1, description="Layer stack, bottom to top")
 
 # response models
 class BaseResponse(BaseModel):
@@ -39,15 +80,37 @@ class BaseResponse(BaseModel):
 class RgbResponse(BaseResponse):
     color: tuple = Field((255, 255, 255), description="生成图像的颜色")
     
+class LayerImage(BaseModel):
+    local_path: str = Field(..., description="生成图像的本地存储路径")
+    seed: int = Field(..., description="生成该图像使用的随机种子")
+
 class LayerResponse(BaseResponse):
     prompt_pos: str = Field("glass bottle, high quality", description="用户输入的正面提示词")
     prompt_neg: str = Field("face asymmetry, eyes asymmetry, deformed eyes, open mouth", description="用户输入的负面提示词")
+    images: list[LayerImage] = Field(default_factory=list, description="全部生成图像, 第一张与local_path相同")
     class Config:
         from_attributes = True
+
+class LayerBatchResult(BaseModel):
+    index: int = Field(..., description="该项在请求items中的位置")
+    success: bool = Field(True, description="该项是否成功")
+    prompt_pos: str = Field(..., description="用户输入的正面提示词")
+    images: list[LayerImage] = Field(default_factory=list, description="该项生成的图像, 按变体顺序排列; 部分变体失败时只包含成功的变体")
+    error_message: str | None = Field(None, description="该项失败时的错误信息")
+
+class LayerBatchResponse(BaseModel):
+    user_id: str = Field("zx", description="用户ID")
+    request_id: str = Field(..., description="请求唯一标识ID")
+    timestamp: datetime = Field(default_factory=datetime.now, description="请求处理时间(UTC)")
+    success: bool = Field(True, description="是否全部成功")
+    results: list[LayerBatchResult] = Field(..., description="每项的结果, 与请求items顺序一致")
         
 class SvgResponse(BaseResponse):
     text: str = Field(..., description="生成的SVG文本内容")
     
+class CompositeResponse(BaseResponse):
+    reblended_from: int = Field(0, description="Index of the first layer that had to be re-blended, lower layers came from the cache")
+
 
 class ErrorResponse(BaseModel):
     user_id: str = Field("zx", description="用户ID")
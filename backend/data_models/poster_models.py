@@ -0,0 +1,64 @@
+from pydantic import BaseModel, Field
+from typing import Literal
+from datetime import datetime
+
+from models.qwen_models import QwenConfig
+from config import POSTER_MAX_OBJECTS, POSTER_MAX_SIDE, POSTER_MAX_TEXTS
+
+# plan models (emitted by the LLM)
+class Box(BaseModel):
+    x: int = Field(0, ge=0, le=POSTER_MAX_SIDE, description="Left offset on the poster in pixels")
+    y: int = Field(0, ge=0, le=POSTER_MAX_SIDE, description="Top offset on the poster in pixels")
+    width: int = Field(..., gt=0, le=POSTER_MAX_SIDE, description="Box width in pixels, clipped to the poster")
+    height: int = Field(..., gt=0, le=POSTER_MAX_SIDE, description="Box height in pixels, clipped to the poster")
+
+class ObjectLayerPlan(BaseModel):
+    prompt_pos: str = Field(..., min_length=1, description="SDXL prompt of the transparent object layer")
+    prompt_neg: str = Field("face asymmetry, eyes asymmetry, deformed eyes, open mouth", description="Negative prompt of the object layer")
+    box: Box = Field(..., description="Where the object is placed on the poster")
+
+class TextLayerPlan(BaseModel):
+    text: str = Field(..., min_length=1, description="Text content")
+    box: Box = Field(..., description="Where the text is placed on the poster")
+    font_size: int = Field(40, gt=0, le=POSTER_MAX_SIDE, description="Font size of the text")
+    font_family: str = Field("Arial", description="Font family of the text")
+    font_weight: str = Field("normal", description="Font weight of the text (e.g., normal, bold)")
+    fill: str = Field("#000000", description="Fill color of the text in hex format")
+
+class PosterPlan(BaseModel):
+    background_color: str = Field("#ffffff", description="Background color in hex format")
+    objects: list[ObjectLayerPlan] = Field(default_factory=list, max_length=POSTER_MAX_OBJECTS, description="Transparent object layers, bottom to top")
+    texts: list[TextLayerPlan] = Field(default_factory=list, max_length=POSTER_MAX_TEXTS, description="Text layers, bottom to top")
+
+# request models
+class PosterRequest(BaseModel):
+    user_id: str = Field("zx", description="User ID for image generation")
+    brief: str = Field("A marketing poster promoting Coca-Cola", min_length=1, description="Design brief of the poster")
+    width: int = Field(1400, gt=0, le=POSTER_MAX_SIDE, description="Poster width in pixels")
+    height: int = Field(2993, gt=0, le=POSTER_MAX_SIDE, description="Poster height in pixels")
+    plan: PosterPlan | None = Field(None, description="Optional layer plan; when given the LLM planning step is skipped")
+    config: QwenConfig | None = Field(None, description="Optional LLM config override for the planning step")
+
+# response models
+class PosterLayer(BaseModel):
+    kind: Literal["rgb", "layer", "svg"] = Field(..., description="Layer type, same as the /api/img endpoint that would produce it")
+    z_index: int = Field(..., description="Stacking order, 0 is the background")
+    local_path: str = Field(..., description="生成图像的本地存储路径")
+    box: Box = Field(..., description="Placement of the layer on the poster")
+    prompt_pos: str | None = Field(None, description="Prompt of object layers")
+    text: str | None = Field(None, description="Content of text layers")
+
+class PosterResponse(BaseModel):
+    user_id: str = Field("zx", description="用户ID")
+    request_id: str = Field(..., description="请求唯一标识ID")
+    plan: PosterPlan = Field(..., description="Layer plan that was rendered")
+    layers: list[PosterLayer] = Field(..., description="Rendered layer stack, bottom to top")
+    timestamp: datetime = Field(default_factory=datetime.now, description="请求处理时间(UTC)")
+    success: bool = Field(True, description="请求是否成功")
+    message: str = Field("操作成功", description="状态消息")
+
+class ErrorResponse(BaseModel):
+    user_id: str = Field("zx", description="用户ID")
+    success: bool = Field(False, description="请求失败")
+    error_message: str = Field(..., description="错误详细信息")
+    timestamp: datetime = Field(default_factory=datetime.now, description="错误发生时间")
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Any
+from typing import Literal
 from datetime import datetime
 
 
@@ -10,9 +10,15 @@ class QwenConfig(BaseModel):
     centralizes default values so other code can validate/configure runs.
     """
 
-    device_map: str | dict[str, Any] = Field("auto", description="Device mapping for model loading (e.g. 'auto' or explicit mapping dict)")
-    torch_dtype: str | None = Field("auto", description="Torch dtype to pass to from_pretrained (e.g. 'auto', 'float16')")
+    model: str | None = Field(None, description="LLM backend: 'qwen', 'gemma' or None to let the router pick the fastest one")
+    max_latency_ms: float | None = Field(None, gt=0, description="Latency budget used by the router when no model is given")
+    device_map: Literal["auto", "cpu", "cuda"] = Field("auto", description="Device mapping for model loading")
+    torch_dtype: Literal["auto", "float16", "bfloat16", "float32"] | None = Field("auto", description="Torch dtype to pass to from_pretrained; dtype, device_map and quantization must form one of the server's LLM_VARIANTS")
     enable_thinking: bool = Field(True, description="Whether to enable model \"thinking\"inner monologue parsing")
+    quantization: Literal["int8_dynamic", "int8_weight_only"] | None = Field(None, description="Optional int8 CPU runtime: 'int8_dynamic' or 'int8_weight_only' (forces CPU/fp32 loading before quantizing)")
+    do_sample: bool | None = Field(None, description="Sampling switch; None keeps the model's generation_config default. Only greedy runs are served from the response cache")
+    max_new_tokens: int = Field(32768, gt=0, description="Maximum number of generated tokens")
+    prompt_lookup_num_tokens: int | None = Field(None, gt=0, description="Enable prompt-lookup (n-gram) assisted decoding with this many drafted tokens per step; useful when the output copies spans of the prompt")
 
 
 class QwenMessage(BaseModel):
@@ -44,11 +50,36 @@ class QwenResponse(BaseModel):
     """
     user_id: str = Field(default="zx", description="用户ID")
     request_id: str = Field(..., description="请求唯一标识ID")
+    model: str | None = Field(None, description="Backend that served the request")
     thinking_content: str | None = Field(None, description="Parsed 'thinking' content (if present)")
     content: str = Field(..., description="Final generated content")
     timestamp: datetime = Field(default_factory=datetime.now, description="请求处理时间(UTC)")
 
 
+class CacheStatsResponse(BaseModel):
+    """Counters of the LLM response cache."""
+    size: int = Field(..., description="Number of cached responses")
+    max_entries: int = Field(..., description="Maximum number of cached responses")
+    ttl: float = Field(..., description="Entry lifetime in seconds")
+    hits: int = Field(..., description="Number of lookups served from the cache")
+    misses: int = Field(..., description="Number of lookups that ran the model")
+    evictions: int = Field(..., description="Number of entries dropped by TTL or size bound")
+    bypasses: int = Field(..., description="Number of stochastic requests that skipped the cache")
+    hit_ratio: float = Field(..., description="hits / (hits + misses)")
+
+
+class BackendInfo(BaseModel):
+    """Published latency/throughput characteristics of a resident LLM backend."""
+    name: str = Field(..., description="Backend name")
+    model_id: str = Field(..., description="Model id and runtime (dtype or quantization)")
+    loaded: bool = Field(..., description="Whether the weights are resident")
+    supports_thinking: bool = Field(..., description="Whether the backend has a thinking mode")
+    prefill_tok_s: float = Field(..., description="Prefill throughput (prior, then EWMA of measured runs)")
+    decode_tok_s: float = Field(..., description="Decode throughput (prior, then EWMA of measured runs)")
+    avg_new_tokens: float = Field(..., description="EWMA of generated tokens per request")
+    samples: int = Field(..., description="Number of measured runs")
+
+
 class ErrorResponse(BaseModel):
     user_id: str = Field("zx", description="用户ID")
     success: bool = Field(False, description="请求失败")
@@ -60,5 +91,7 @@ __all__ = [
     "QwenMessage",
     "QwenRequest",
     "QwenResponse",
+    "CacheStatsResponse",
+    "BackendInfo",
     "ErrorResponse",
 ]
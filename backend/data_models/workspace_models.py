@@ -0,0 +1,67 @@
+from pydantic import BaseModel, Field
+from typing import Annotated, Any, Literal, Union
+
+from config import IMAGE_MAX_SIDE, LAYER_MAX_SCALE
+
+# workspace document
+class WorkspaceLayer(BaseModel):
+    id: str = Field(..., min_length=1, description="Layer id, unique within the workspace")
+    kind: Literal["rgb", "layer", "svg", "image"] = Field(..., description="rgb: background, layer: SDXL transparent layer, svg: text, image: existing file")
+    x: int = Field(0, description="Horizontal offset of the layer on the canvas")
+    y: int = Field(0, description="Vertical offset of the layer on the canvas")
+    scale: float = Field(1.0, gt=0, le=LAYER_MAX_SCALE, description="Scale factor applied to the layer")
+    opacity: float = Field(1.0, ge=0, le=1, description="Layer opacity")
+    local_path: str | None = Field(None, description="Rendered file under the static directory; rendered from params when omitted (required for image layers)")
+    params: dict[str, Any] = Field(default_factory=dict, description="Generation parameters: rgb as /img/rgb, layer as /img/layer, svg as /img/svg")
+
+# client -> server operations, every operation may carry an op_id echoed in the reply
+class WorkspaceOp(BaseModel):
+    op_id: str | None = Field(None, description="Client reference echoed in the reply")
+
+class InitOp(WorkspaceOp):
+    op: Literal["init"]
+    width: int = Field(1400, gt=0, le=IMAGE_MAX_SIDE, description="Canvas width in pixels")
+    height: int = Field(2993, gt=0, le=IMAGE_MAX_SIDE, description="Canvas height in pixels")
+    render: Literal["tiles", "layers"] = Field("tiles", description="tiles: push re-rendered canvas tiles, layers: push changed layers only")
+    layers: list[WorkspaceLayer] = Field(default_factory=list, description="Layer stack, bottom to top")
+
+class AddOp(WorkspaceOp):
+    op: Literal["add"]
+    layer: WorkspaceLayer = Field(..., description="New layer")
+    index: int | None = Field(None, ge=0, description="Position in the stack, on top when omitted")
+
+class MoveOp(WorkspaceOp):
+    op: Literal["move"]
+    layer_id: str = Field(..., description="Layer to move")
+    x: int = Field(..., description="New horizontal offset")
+    y: int = Field(..., description="New vertical offset")
+    scale: float | None = Field(None, gt=0, le=LAYER_MAX_SCALE, description="New scale factor")
+    opacity: float | None = Field(None, ge=0, le=1, description="New opacity")
+
+class RecolorOp(WorkspaceOp):
+    op: Literal["recolor"]
+    layer_id: str = Field(..., description="rgb or svg layer")
+    color: str = Field(..., description="New colour in hex format (background colour / text fill)")
+    colors: list[str] | None = Field(None, min_length=2, description="New colour stops of gradient, noise and pattern backgrounds")
+
+class TextOp(WorkspaceOp):
+    op: Literal["text"]
+    layer_id: str = Field(..., description="svg layer")
+    text: str = Field(..., min_length=1, description="New text")
+    params: dict[str, Any] = Field(default_factory=dict, description="Other /img/svg parameters to change (font_size, font_family, ...)")
+
+class RegenerateOp(WorkspaceOp):
+    op: Literal["regenerate"]
+    layer_id: str = Field(..., description="SDXL layer")
+    prompt_pos: str | None = Field(None, min_length=1, description="New prompt, unchanged when omitted")
+    prompt_neg: str | None = Field(None, min_length=1, description="New negative prompt, unchanged when omitted")
+    seed: int | None = Field(None, ge=0, description="Seed, random when omitted")
+
+class RemoveOp(WorkspaceOp):
+    op: Literal["remove"]
+    layer_id: str = Field(..., description="Layer to remove")
+
+WorkspaceOperation = Annotated[
+    Union[InitOp, AddOp, MoveOp, RecolorOp, TextOp, RegenerateOp, RemoveOp],
+    Field(discriminator="op"),
+]
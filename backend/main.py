@@ -1,11 +1,23 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from api.img_routes import router as img_router
 from api.llm_routes import router as llm_router
 from api.auth_routes import router as auth_router
+from api.poster_routes import router as poster_router
+from api.history_routes import router as history_router
+from api.workspace_routes import router as workspace_router
 from config import FRONT_URL
 from utils.dependencies import create_tables
+from utils.security import get_api_key
+from utils.health import start_warmup, readiness
+from utils.static import ObjectStaticFiles
+from utils.responses import FastJSONResponse
+from utils.middleware import CompressionMiddleware, JWTAuthMiddleware, MetricsMiddleware
+from utils.metrics import CONTENT_TYPE, registry
+from utils.admission import admission_stats
+from services.db.db_service import history_writer
+from services.storage.retention_service import retention_service
 import os
 
 app = FastAPI(
@@ -18,11 +30,25 @@ app = FastAPI(
 @app.on_event("startup")
 async def startup_event():
     create_tables()
+    history_writer.start()
+    # Expired and over-quota assets are deleted in the background
+    retention_service.start()
+    # Load the configured models in the background, the API serves requests meanwhile
+    start_warmup()
+
+# Flush the generation history still queued
+@app.on_event("shutdown")
+async def shutdown_event():
+    await history_writer.stop()
+    await retention_service.stop()
 
 # Ensure static directory exists
 if not os.path.exists("static"):
     os.makedirs("static", exist_ok=True)
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount("/static", ObjectStaticFiles(directory="static"), name="static")
+
+# Decode the bearer token once per request, dependencies read the claims from the scope
+app.add_middleware(JWTAuthMiddleware)
 
 # CORS middleware
 app.add_middleware(
@@ -33,10 +59,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip / brotli for JSON, text and SVG bodies above COMPRESS_MIN_SIZE
+app.add_middleware(CompressionMiddleware)
+
+# Request counts and latency per route, outermost so it covers the whole stack
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(auth_router, prefix="/api")
 app.include_router(img_router, prefix="/api")
 app.include_router(llm_router, prefix="/api")
+app.include_router(poster_router, prefix="/api")
+app.include_router(history_router, prefix="/api")
+app.include_router(workspace_router, prefix="/api")
 
 @app.get("/")
 async def root():
@@ -46,4 +81,28 @@ async def root():
 async def health_check():
     return {"status": "healthy", "message": "API is running"}
 
+@app.get("/health/live")
+async def liveness():
+    # the process is up and the event loop responds
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness_check():
+    # database reachable and every configured model warmup finished
+    ready, report = await readiness()
+    return FastJSONResponse(report, status_code=200 if ready else 503)
+
+@app.get("/admission", response_class=FastJSONResponse, dependencies=[Depends(get_api_key)])
+async def admission():
+    # queue depth, estimated wait, throughput and rejections per model pool
+    return admission_stats()
+
+@app.get("/storage/retention", response_class=FastJSONResponse, dependencies=[Depends(get_api_key)])
+async def storage_retention():
+    # passes, deleted objects and reclaimed bytes, with the report of the last pass
+    return retention_service.stats()
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    # Prometheus text format
+    return PlainTextResponse(registry.expose(), media_type=CONTENT_TYPE)
@@ -2,16 +2,66 @@ from datetime import datetime, timedelta, timezone
 from typing import cast
 import jwt
 from passlib.context import CryptContext
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException, status
 from models.db_models import User
 from models.auth_models import UserRegister, TokenResponse, UserResponse
-import os
+from utils.cache import TTLCache
+from config import (
+    SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES,
+    BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS, AUTH_CACHE_TTL, AUTH_CACHE_MAX_ENTRIES,
+)
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import time
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this")
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30 * 24 * 60  # 30 days
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+# bcrypt is deliberately slow, it runs in its own bounded pool instead of on the event loop
+# (or in the shared default executor, where a burst of logins would starve other work)
+_hash_pool = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+
+
+class AuthCache:
+    """
+    Short-lived caches for authenticated requests
+    - token -> decoded claims, so the JWT signature is checked once per TTL
+    - user id -> user, so the users table is queried once per TTL
+    Users are invalidated when their password or active flag changes. The caches belong to
+    one process: with several workers the others keep a stale user for up to AUTH_CACHE_TTL,
+    routes that must not (password change) read the user through get_fresh_user
+    """
+    def __init__(self, max_entries: int = AUTH_CACHE_MAX_ENTRIES, ttl: float = AUTH_CACHE_TTL):
+        self.claims = TTLCache(max_entries, ttl)
+        self.users = TTLCache(max_entries, ttl)
+
+    def get_claims(self, token: str) -> dict | None:
+        payload = self.claims.get(token)
+        # a cached token must still be rejected once it expires
+        if payload is not None and payload.get("exp", float("inf")) <= time.time():
+            self.claims.pop(token)
+            return None
+        return payload
+
+    def set_claims(self, token: str, payload: dict):
+        self.claims.set(token, payload)
+
+    def get_user(self, user_id: str) -> User | None:
+        return self.users.get(user_id)
+
+    def set_user(self, user: User):
+        self.users.set(user.user_id, user)
+
+    def invalidate_user(self, user_id: str):
+        self.users.pop(user_id)
+
+    def stats(self) -> dict:
+        return {"claims": self.claims.stats(), "users": self.users.stats()}
+
+
+auth_cache = AuthCache()
 
 class AuthService:
     @staticmethod
@@ -24,6 +74,18 @@ class AuthService:
         """Hash a password"""
         return pwd_context.hash(password)
     
+    @staticmethod
+    async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+        """Verify a password in the bcrypt pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_hash_pool, pwd_context.verify, plain_password, hashed_password)
+
+    @staticmethod
+    async def get_password_hash_async(password: str) -> str:
+        """Hash a password in the bcrypt pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_hash_pool, pwd_context.hash, password)
+
     @staticmethod
     def create_access_token(data: dict, expires_delta: timedelta | None = None) -> str:
         """Create JWT access token"""
@@ -144,4 +206,116 @@ class AuthService:
             access_token=access_token,
             token_type="bearer",
             user=user_response
-        )
\ No newline at end of file
+        )
+
+
+class AsyncAuthService:
+    """
+    AuthService queries on an AsyncSession, used by the request handlers
+    Password hashing and tokens are shared with AuthService
+    """
+    @staticmethod
+    async def get_user_by_username(db: AsyncSession, username: str) -> User | None:
+        """Get user by username"""
+        return await db.scalar(select(User).where(User.username == username).limit(1))
+
+    @staticmethod
+    async def get_user_by_email(db: AsyncSession, email: str) -> User | None:
+        """Get user by email"""
+        return await db.scalar(select(User).where(User.email == email).limit(1))
+
+    @staticmethod
+    async def get_user_by_id(db: AsyncSession, user_id: str) -> User | None:
+        """Get user by ID"""
+        return await db.get(User, user_id)
+
+    @staticmethod
+    async def authenticate_user(db: AsyncSession, username: str, password: str) -> User | None:
+        """Authenticate user with username and password"""
+        user = await AsyncAuthService.get_user_by_username(db, username)
+        if not user:
+            return None
+        if user.is_active is not True:
+            return None
+        if not await AuthService.verify_password_async(password, cast(str, user.password)):
+            return None
+        return user
+
+    @staticmethod
+    async def create_user(db: AsyncSession, user_data: UserRegister) -> User:
+        """Create a new user"""
+        # Check if username already exists
+        if await AsyncAuthService.get_user_by_username(db, user_data.username):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Username already registered"
+            )
+
+        # Check if email already exists
+        if await AsyncAuthService.get_user_by_email(db, user_data.email):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Email already registered"
+            )
+
+        # Create new user
+        db_user = User(
+            username=user_data.username,
+            email=user_data.email,
+            password=await AuthService.get_password_hash_async(user_data.password),
+            is_active=True
+        )
+
+        db.add(db_user)
+        await db.commit()
+        await db.refresh(db_user)
+        return db_user
+
+    @staticmethod
+    async def login_user(db: AsyncSession, username: str, password: str) -> TokenResponse:
+        """Login user and return token with user info"""
+        user = await AsyncAuthService.authenticate_user(db, username, password)
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Incorrect username or password",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+
+        access_token = AuthService.create_access_token(
+            data={"sub": cast(str, user.user_id)},
+            expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        )
+        return TokenResponse(
+            access_token=access_token,
+            token_type="bearer",
+            user=UserResponse.model_validate(user)
+        )
+
+    @staticmethod
+    async def change_password(db: AsyncSession, user_id: str, new_password: str) -> User:
+        """Store a new password hash for the user"""
+        user = await AsyncAuthService.get_user_by_id(db, user_id)
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found"
+            )
+        user.password = await AuthService.get_password_hash_async(new_password)
+        await db.commit()
+        auth_cache.invalidate_user(user_id)
+        return user
+
+    @staticmethod
+    async def set_active(db: AsyncSession, user_id: str, is_active: bool) -> User:
+        """Activate or deactivate a user"""
+        user = await AsyncAuthService.get_user_by_id(db, user_id)
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found"
+            )
+        user.is_active = is_active
+        await db.commit()
+        auth_cache.invalidate_user(user_id)
+        return user
@@ -0,0 +1,206 @@
+from sqlalchemy import and_, or_, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+from datetime import datetime, timezone
+import asyncio
+import logging
+import uuid
+from models.db_models import AIResult, Layer  # 导入模型类
+from utils.dependencies import AsyncSessionLocal
+from config import HISTORY_BATCH_SIZE, HISTORY_FLUSH_INTERVAL, HISTORY_QUEUE_SIZE
+
+logger = logging.getLogger(__name__)
+
+def build_ai_result(user_id: str,
+                    request_id: str,
+                    layers: list[dict],
+                    is_successful: bool = True,
+                    created_at: datetime | None = None) -> AIResult:
+    """
+    构建AI生成结果及其图层对象(未写入数据库)
+
+    参数:
+        user_id: 用户ID
+        request_id: 请求唯一标识ID
+        layers: 图层列表, 每项包含 positive_prompt, negative_prompt, image_path, image_format
+        is_successful: 是否成功生成
+        created_at: 生成时间, 默认为当前时间(UTC)
+    """
+    created_at = created_at or datetime.now(timezone.utc)
+    return AIResult(
+        id=str(uuid.uuid4()),
+        user_id=user_id,
+        request_id=request_id,
+        is_successful=is_successful,
+        created_at=created_at,
+        layers=[
+            Layer(
+                positive_prompt=layer["positive_prompt"],
+                negative_prompt=layer.get("negative_prompt"),
+                image_path=layer["image_path"],
+                image_format=layer.get("image_format"),
+                created_at=created_at,
+            )
+            for layer in layers
+        ],
+    )
+
+def create_ai_result(db: Session,
+                     user_id: str,
+                     request_id: str,
+                     layers: list[dict],
+                     is_successful: bool = True):
+    """
+    创建AI生成结果记录并保存到数据库(同步版本, 供脚本使用)
+
+    返回:
+        新建的AIResult记录
+    """
+    db_result = build_ai_result(user_id, request_id, layers, is_successful)
+    db.add(db_result)
+    db.commit()
+    db.refresh(db_result)
+    return db_result
+
+
+class HistoryWriter:
+    """
+    生成历史的异步批量写入队列(write-behind)
+
+    record() 只把记录放入有界队列, 不等待数据库; 后台任务每攒够 batch_size 条
+    或每隔 flush_interval 秒在一个事务中批量写入. 队列满时丢弃记录并计数,
+    绝不让生成请求因写历史而变慢.
+    user_id 必须是已登录用户的ID(users表外键), 未登录的请求没有生成历史, 传入 None 即不记录.
+    """
+    def __init__(self,
+                 batch_size: int = HISTORY_BATCH_SIZE,
+                 flush_interval: float = HISTORY_FLUSH_INTERVAL,
+                 max_queue: int = HISTORY_QUEUE_SIZE):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: asyncio.Queue[dict] = asyncio.Queue(maxsize=max_queue)
+        self._task: asyncio.Task | None = None
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def record(self,
+               user_id: str | None,
+               request_id: str,
+               layers: list[dict],
+               is_successful: bool = True):
+        if user_id is None:
+            return
+        item = {
+            "user_id": user_id,
+            "request_id": request_id,
+            "layers": layers,
+            "is_successful": is_successful,
+            "created_at": datetime.now(timezone.utc),
+        }
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def _next_batch(self) -> list[dict]:
+        batch = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _write(self, batch: list[dict]):
+        async with AsyncSessionLocal() as db:
+            try:
+                db.add_all([build_ai_result(**item) for item in batch])
+                await db.commit()
+                self.written += len(batch)
+                return
+            except SQLAlchemyError:
+                await db.rollback()
+        # one bad record (e.g. unknown user) must not lose the whole batch
+        for item in batch:
+            async with AsyncSessionLocal() as db:
+                try:
+                    db.add(build_ai_result(**item))
+                    await db.commit()
+                    self.written += 1
+                except SQLAlchemyError as e:
+                    await db.rollback()
+                    self.failed += 1
+                    logger.warning("生成历史写入失败 request_id=%s: %s", item["request_id"], e)
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._write(batch)
+            except Exception:
+                self.failed += len(batch)
+                logger.exception("生成历史批量写入失败")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """写完队列中剩余的记录后停止"""
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+
+history_writer = HistoryWriter()
+
+
+async def list_history(db: AsyncSession,
+                       user_id: str,
+                       limit: int = 20,
+                       before: tuple[datetime, str] | None = None) -> tuple[list[AIResult], tuple[datetime, str] | None]:
+    """
+    按 (user_id, created_at, id) 键集分页查询生成历史, 新的在前
+
+    参数:
+        before: 上一页最后一条记录的 (created_at, id), 为空时返回第一页
+    返回:
+        (本页记录, 下一页游标), 没有更多记录时游标为 None
+    """
+    query = select(AIResult).where(AIResult.user_id == user_id)
+    if before is not None:
+        created_at, result_id = before
+        # served by the (user_id, created_at, id) index, no OFFSET scan
+        query = query.where(or_(
+            AIResult.created_at < created_at,
+            and_(AIResult.created_at == created_at, AIResult.id < result_id),
+        ))
+    query = (
+        query.order_by(AIResult.created_at.desc(), AIResult.id.desc())
+        .limit(limit + 1)
+        .options(selectinload(AIResult.layers))
+    )
+    results = list((await db.scalars(query)).all())
+    if len(results) <= limit:
+        return results, None
+    results = results[:limit]
+    return results, (results[-1].created_at, results[-1].id)
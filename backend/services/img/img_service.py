@@ -1,10 +1,50 @@
-from algorithms.Img_gen.Rgb.rgb import gen_rgb
-from algorithms.Img_gen.Trans.trans import gen_trans
-from algorithms.Img_gen.Svg.svg import gen_svg
-from utils.image import gen_img_path
+from algorithms.Img_gen.Rgb.rgb import background_params
+from algorithms.stub import background_engine, svg_engine
+from algorithms.Img_comp.composite import Compositor, CompositeLayer, to_image
+from utils.storage import object_store, encode_image
+from utils.metrics import stage
+from utils.admission import AdmissionRejected, admit
+from utils.singleflight import SingleFlight, canonical_key, deadline_timeout
+from services.db.db_service import history_writer
+from config import AI_IMAGE_ROOT, COMPOSITE_CACHE_MB, COMPOSITE_PREFIX_INTERVAL, LAYER_BATCH_MAX_IMAGES, TRANS_MAX_BATCH, TRANS_MAX_SIDE
+import asyncio
+import functools
+import logging
+import os
+import random
+import time
 from datetime import datetime
 import uuid
 
+logger = logging.getLogger(__name__)
+
+rgb_flight = SingleFlight("rgb")
+trans_flight = SingleFlight("trans")
+
+def _store(user_id: str, data: bytes, file_format: str, is_output: bool, defer_write: bool) -> dict:
+    """
+    Store the encoded output, or with defer_write only compute its content-addressed
+    path and hand back the bytes plus a `persist` callable for the caller to run later
+    """
+    if not defer_write:
+        return {"local_path": object_store.put(user_id, data, file_format, is_output)}
+    digest = object_store.digest(data)
+    return {
+        "local_path": str(object_store.object_path(digest, file_format)),
+        "data": data,
+        "persist": functools.partial(object_store.put, user_id, data, file_format, is_output, digest),
+    }
+
+def _record(account_id: str | None, request_id: str, stored: dict, file_format: str, positive_prompt: str, negative_prompt: str | None = None):
+    # write-behind: only enqueues, the history rows are written in batches later;
+    # history belongs to the authenticated account, anonymous requests are not recorded
+    history_writer.record(account_id, request_id, [{
+        "positive_prompt": positive_prompt,
+        "negative_prompt": negative_prompt,
+        "image_path": stored["local_path"],
+        "image_format": file_format,
+    }])
+
 async def layer_rgb(
     user_id: str = "zx",
     width: int = 1024,
@@ -12,18 +52,150 @@ async def layer_rgb(
     is_output: bool = True,
     file_format: str = "png",
     color: str = "#000000",
+    kind: str = "solid",
+    colors: list[str] | None = None,
+    angle: float = 90.0,
+    center: tuple[float, float] = (0.5, 0.5),
+    radius: float | None = None,
+    scale: int = 64,
+    octaves: int = 4,
+    seed: int = 0,
+    pattern: str = "checker",
+    tile: int = 64,
+    defer_write: bool = False,
+    deadline_ms: float | None = None,
+    account_id: str | None = None,
 ):
     
-    img = gen_rgb(width, height, color)
-    local_path = gen_img_path(user_id, is_output=is_output, file_format=file_format)
-    img.save(local_path, format=file_format)
+    # identical requests in flight (double clicks, retries) share one rendering
+    key = canonical_key(
+        "rgb", user_id, width, height, is_output, file_format, color, kind, colors, angle,
+        center, radius, scale, octaves, seed, pattern, tile, defer_write, account_id,
+    )
+    return await rgb_flight.do(key, lambda: _layer_rgb(
+        user_id, width, height, is_output, file_format, color, kind, colors, angle,
+        center, radius, scale, octaves, seed, pattern, tile, defer_write, account_id,
+    ), deadline_timeout(deadline_ms))
+
+async def _layer_rgb(
+    user_id: str,
+    width: int,
+    height: int,
+    is_output: bool,
+    file_format: str,
+    color: str,
+    kind: str,
+    colors: list[str] | None,
+    angle: float,
+    center: tuple[float, float],
+    radius: float | None,
+    scale: int,
+    octaves: int,
+    seed: int,
+    pattern: str,
+    tile: int,
+    defer_write: bool,
+    account_id: str | None,
+):
+    params = background_params(
+        kind=kind,
+        colors=[color] if kind == "solid" else (colors or [color, "#ffffff"]),
+        angle=angle,
+        center=center,
+        radius=radius,
+        scale=scale,
+        octaves=octaves,
+        seed=seed,
+        pattern=pattern,
+        tile=tile,
+    )
+    # identical backgrounds are served from the encoded-bytes cache
+    data = await asyncio.to_thread(background_engine(), width, height, params, file_format)
+    stored = _store(user_id, data, file_format, is_output, defer_write)
+    request_id = str(uuid.uuid4())
+    _record(account_id, request_id, stored, file_format, f"{kind} background {color}")
 
     return {
-        "request_id": str(uuid.uuid4()),
-        "local_path": local_path,
+        "request_id": request_id,
+        **stored,
         "timestamp": datetime.now()
     }
 
+def _trans_seeds(seed: int | None, num_images: int) -> list[int]:
+    # variation i uses seed + i, so a variation can be reproduced on its own
+    base = random.randint(0, 1_000_000) if seed is None else seed
+    return [base + i for i in range(num_images)]
+
+def _check_trans_size(width: int, height: int):
+    if width % 8 != 0 or height % 8 != 0:
+        raise ValueError("图像宽度和高度必须是8的倍数")
+    if width > TRANS_MAX_SIDE or height > TRANS_MAX_SIDE:
+        raise ValueError(f"图像宽度和高度不能超过 {TRANS_MAX_SIDE}")
+
+def _sample_chunk(width: int, height: int, jobs: list[dict]) -> list:
+    """
+    Sample jobs of the same size in one batched run, returns one image or exception per job
+    A failed run is retried job by job, so one bad item does not fail the others
+    """
+    # the real pipeline imports torch/diffusers, the stub engine (STUB_ENGINE) does not
+    from algorithms.stub import trans_engine
+    gen_trans_batch = trans_engine()
+    try:
+        return gen_trans_batch(
+            width,
+            height,
+            [job["prompt_pos"] for job in jobs],
+            [job["prompt_neg"] for job in jobs],
+            [job["seed"] for job in jobs],
+        )
+    except Exception as e:
+        if len(jobs) == 1:
+            return [e]
+    results = []
+    for job in jobs:
+        try:
+            results.extend(gen_trans_batch(width, height, [job["prompt_pos"]], [job["prompt_neg"]], [job["seed"]]))
+        except Exception as e:
+            results.append(e)
+    return results
+
+async def sample_trans(jobs: list[dict], deadline_ms: float | None = None) -> list:
+    """
+    Sample every job (width, height, prompt_pos, prompt_neg, seed), returns one image
+    or exception per job in the order of `jobs`
+    Jobs of the same size are sampled together, at most TRANS_MAX_BATCH per run. Every run
+    is admitted into the trans pool on its own, so a slot (and the pool's service time
+    estimate) always covers one run and other requests are served between the runs of a
+    large one. Once a run is rejected the remaining jobs get the AdmissionRejected.
+    """
+    groups: dict[tuple[int, int], list[int]] = {}
+    for i, job in enumerate(jobs):
+        groups.setdefault((job["width"], job["height"]), []).append(i)
+
+    results: list = [None] * len(jobs)
+    start = time.monotonic()
+    rejected = None
+    for (width, height), indices in groups.items():
+        for offset in range(0, len(indices), TRANS_MAX_BATCH):
+            chunk = indices[offset:offset + TRANS_MAX_BATCH]
+            if rejected is None:
+                remaining_ms = None if deadline_ms is None else deadline_ms - (time.monotonic() - start) * 1000
+                try:
+                    async with admit("trans", remaining_ms):
+                        # sampling runs in a worker thread so the event loop keeps admitting/rejecting requests
+                        images = await asyncio.to_thread(_sample_chunk, width, height, [jobs[i] for i in chunk])
+                except AdmissionRejected as e:
+                    rejected = e
+            if rejected is not None:
+                images = [rejected] * len(chunk)
+            for i, image in zip(chunk, images):
+                results[i] = image
+    return results
+
+def _encode_trans(img, file_format: str) -> bytes:
+    with stage("sdxl", "encode"):
+        return encode_image(img, file_format)
+
 async def layer_trans(
     user_id: str = "zx",
     width: int = 1024,
@@ -31,16 +203,142 @@ async def layer_trans(
     is_output: bool = True,
     file_format: str = "png",
     prompt_pos: str = "glass bottle, high quality",
-    prompt_neg: str = "face asymmetry, eyes asymmetry, deformed eyes, open mouth"
+    prompt_neg: str = "face asymmetry, eyes asymmetry, deformed eyes, open mouth",
+    defer_write: bool = False,
+    num_images: int = 1,
+    seed: int | None = None,
+    deadline_ms: float | None = None,
+    account_id: str | None = None,
 ):
-    
-    img = gen_trans(width, height, prompt_pos, prompt_neg)[0]
-    local_path = gen_img_path(user_id, is_output=is_output, file_format=file_format)
-    img.save(local_path, format=file_format)
+    """
+    Generate num_images variations of a transparent layer
+    Runs in the trans admission pool; identical requests in flight share one generation
+    (also with a random seed: a double click must not start a second run)
+    """
+    _check_trans_size(width, height)
+    if defer_write and num_images > 1:
+        raise ValueError("直接返回图像字节时只能生成一张图像")
+    key = canonical_key(
+        "trans", user_id, width, height, is_output, file_format, prompt_pos, prompt_neg,
+        defer_write, num_images, seed, account_id,
+    )
+    return await trans_flight.do(key, lambda: _layer_trans(
+        user_id, width, height, is_output, file_format, prompt_pos, prompt_neg,
+        defer_write, num_images, seed, deadline_ms, account_id,
+    ), deadline_timeout(deadline_ms))
+
+async def _layer_trans(
+    user_id: str,
+    width: int,
+    height: int,
+    is_output: bool,
+    file_format: str,
+    prompt_pos: str,
+    prompt_neg: str,
+    defer_write: bool,
+    num_images: int,
+    seed: int | None,
+    deadline_ms: float | None,
+    account_id: str | None,
+):
+    seeds = _trans_seeds(seed, num_images)
+    jobs = [
+        {"width": width, "height": height, "prompt_pos": prompt_pos, "prompt_neg": prompt_neg, "seed": s}
+        for s in seeds
+    ]
+    # slots are only held while sampling, encoding and storing run outside of them
+    images = await sample_trans(jobs, deadline_ms)
+    for img in images:
+        if isinstance(img, Exception):
+            raise img
+
+    stored = []
+    for img in images:
+        data = await asyncio.to_thread(_encode_trans, img, file_format)
+        stored.append(_store(user_id, data, file_format, is_output, defer_write))
+    request_id = str(uuid.uuid4())
+    history_writer.record(account_id, request_id, [
+        {"positive_prompt": prompt_pos, "negative_prompt": prompt_neg, "image_path": item["local_path"], "image_format": file_format}
+        for item in stored
+    ])
 
     return {
-        "request_id": str(uuid.uuid4()),
-        "local_path": local_path,
+        "request_id": request_id,
+        **stored[0],
+        "images": [{"local_path": item["local_path"], "seed": s} for item, s in zip(stored, seeds)],
+        "prompt_pos": prompt_pos,
+        "prompt_neg": prompt_neg,
+        "timestamp": datetime.now()
+    }
+
+async def layer_trans_batch(
+    user_id: str = "zx",
+    items: list[dict] | None = None,
+    is_output: bool = True,
+    file_format: str = "png",
+    deadline_ms: float | None = None,
+    account_id: str | None = None,
+):
+    """
+    Generate several layer specs in one request
+    Compatible items (same size) are sampled together; a failing item is reported in
+    its own result and does not fail the others. An item succeeds only with all of its
+    variations, the variations that were sampled are still returned and recorded.
+    Results keep the order of `items`.
+    At most LAYER_BATCH_MAX_IMAGES images in total, every sampling run is admitted on its own.
+    """
+    items = items or []
+    total = sum(item.get("num_images", 1) for item in items)
+    if total > LAYER_BATCH_MAX_IMAGES:
+        raise ValueError(f"单次批量请求最多生成 {LAYER_BATCH_MAX_IMAGES} 张图像, 当前请求 {total} 张")
+    results: list[dict] = []
+    jobs: list[dict] = []
+    for index, item in enumerate(items):
+        result = {"index": index, "success": True, "prompt_pos": item["prompt_pos"], "images": [], "error_message": None}
+        results.append(result)
+        try:
+            _check_trans_size(item["width"], item["height"])
+        except ValueError as e:
+            result.update(success=False, error_message=str(e))
+            continue
+        for s in _trans_seeds(item.get("seed"), item.get("num_images", 1)):
+            jobs.append({**item, "index": index, "seed": s})
+
+    images = await sample_trans(jobs, deadline_ms)
+    if images and all(isinstance(img, AdmissionRejected) for img in images):
+        # nothing was sampled, the whole request is rejected
+        raise images[0]
+
+    layers = []
+    for job, img in zip(jobs, images):
+        result = results[job["index"]]
+        if isinstance(img, Exception):
+            logger.warning("批量生成图层失败 index=%s: %s", job["index"], img)
+            if isinstance(img, AdmissionRejected):
+                message = f"服务繁忙, 请在 {img.retry_after_header} 秒后重试"
+            else:
+                message = str(img) if isinstance(img, ValueError) else "服务器内部错误，请稍后再试。"
+            if result["success"]:
+                result.update(success=False, error_message=message)
+            continue
+        data = await asyncio.to_thread(_encode_trans, img, file_format)
+        local_path = object_store.put(user_id, data, file_format, is_output)
+        result["images"].append({"local_path": local_path, "seed": job["seed"]})
+        layers.append({
+            "positive_prompt": job["prompt_pos"],
+            "negative_prompt": job["prompt_neg"],
+            "image_path": local_path,
+            "image_format": file_format,
+        })
+
+    request_id = str(uuid.uuid4())
+    # every stored image is recorded, also those of partially failed items
+    if layers:
+        history_writer.record(account_id, request_id, layers)
+
+    return {
+        "request_id": request_id,
+        "results": results,
         "timestamp": datetime.now()
     }
 
@@ -57,10 +355,13 @@ async def layer_svg(
     fill: str = "#000000",
     stroke: str | None = None,
     stroke_width: int = 1,
-    style: dict[str, str] | None = None
+    style: dict[str, str] | None = None,
+    text_mode: str | None = None,
+    defer_write: bool = False,
+    account_id: str | None = None,
 ):
     
-    img = gen_svg(
+    img = svg_engine()(
         text=text,
         x=x,
         y=y,
@@ -70,13 +371,56 @@ async def layer_svg(
         fill=fill,
         stroke=stroke,
         stroke_width=stroke_width,
-        style=style
+        style=style,
+        text_mode=text_mode
     )
-    local_path = gen_img_path(user_id, is_output=is_output, file_format=file_format)
-    with open(local_path, 'w') as f:
-        f.write(img)    
+    stored = _store(user_id, img.encode("utf-8"), file_format, is_output, defer_write)
+    request_id = str(uuid.uuid4())
+    _record(account_id, request_id, stored, file_format, text)
+    return {
+        "request_id": request_id,
+        **stored,
+        "timestamp": datetime.now()
+    }
+
+compositor = Compositor(max_cache_bytes=COMPOSITE_CACHE_MB * 1024 * 1024, prefix_interval=COMPOSITE_PREFIX_INTERVAL)
+
+def check_static_path(local_path: str) -> str:
+    # only files produced by the generation endpoints may be composited
+    root = os.path.realpath(AI_IMAGE_ROOT)
+    path = os.path.realpath(local_path)
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError(f"图层路径必须位于 {AI_IMAGE_ROOT} 目录下: {local_path}")
+    return path
+
+async def layer_composite(
+    user_id: str = "zx",
+    width: int = 1024,
+    height: int = 1024,
+    is_output: bool = True,
+    file_format: str = "png",
+    layers: list[dict] | None = None
+):
+    stack = [
+        CompositeLayer(
+            local_path=check_static_path(layer["local_path"]),
+            x=layer.get("x", 0),
+            y=layer.get("y", 0),
+            scale=layer.get("scale", 1.0),
+            opacity=layer.get("opacity", 1.0),
+        )
+        for layer in layers or []
+    ]
+
+    def run():
+        canvas, start = compositor.composite(width, height, stack)
+        local_path = object_store.put_image(user_id, to_image(canvas), file_format=file_format, is_output=is_output)
+        return local_path, start
+
+    local_path, start = await asyncio.to_thread(run)
     return {
         "request_id": str(uuid.uuid4()),
         "local_path": local_path,
+        "reblended_from": start,
         "timestamp": datetime.now()
-    }
\ No newline at end of file
+    }
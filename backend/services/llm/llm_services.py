@@ -1,18 +1,95 @@
-from algorithms.LLM.qwen import llm_qwen
+from algorithms.LLM.cache import response_cache
+from utils.admission import admit
+from utils.singleflight import SingleFlight, canonical_key, deadline_timeout
+from config import STUB_ENGINE
 from datetime import datetime
+from typing import Any
+import asyncio
+import sys
 import uuid
 
+chat_flight = SingleFlight("llm")
+
 async def llm_chat(
     user_id: str = "zx",
     prompt: str = "Give me a short introduction to large language model.",
+    model: str | None = None,
+    max_latency_ms: float | None = None,
+    enable_thinking: bool = False,
+    torch_dtype: str | None = "auto",
+    device_map: str | dict[str, Any] = "auto",
+    quantization: str | None = None,
+    do_sample: bool | None = None,
+    max_new_tokens: int = 32768,
+    prompt_lookup_num_tokens: int | None = None,
+    deadline_ms: float | None = None,
+):
+    # identical requests in flight (double clicks, retries) share one generation
+    key = canonical_key(
+        user_id, prompt, model, max_latency_ms, enable_thinking, torch_dtype, device_map,
+        quantization, do_sample, max_new_tokens, prompt_lookup_num_tokens,
+    )
+    return await chat_flight.do(key, lambda: _llm_chat(
+        user_id, prompt, model, max_latency_ms, enable_thinking, torch_dtype, device_map,
+        quantization, do_sample, max_new_tokens, prompt_lookup_num_tokens, deadline_ms,
+    ), deadline_timeout(deadline_ms))
+
+async def _llm_chat(
+    user_id: str,
+    prompt: str,
+    model: str | None,
+    max_latency_ms: float | None,
+    enable_thinking: bool,
+    torch_dtype: str | None,
+    device_map: str | dict[str, Any],
+    quantization: str | None,
+    do_sample: bool | None,
+    max_new_tokens: int,
+    prompt_lookup_num_tokens: int | None,
+    deadline_ms: float | None,
 ):
-    result = llm_qwen(
+    # torch/transformers are only imported by the first chat request, not at startup
+    from algorithms.stub import llm_engine
+    llm_pool = llm_engine()
+    backend = await asyncio.to_thread(
+        llm_pool.route,
         prompt=prompt,
+        model=model,
+        enable_thinking=enable_thinking,
+        max_new_tokens=max_new_tokens,
+        max_latency_ms=max_latency_ms,
+        torch_dtype=torch_dtype,
+        device_map=device_map,
+        quantization=quantization,
     )
+    # generation runs in a worker thread so the event loop stays responsive
+    async with admit("llm", deadline_ms):
+        result = await asyncio.to_thread(
+            backend.chat,
+            prompt=prompt,
+            enable_thinking=enable_thinking,
+            do_sample=do_sample,
+            max_new_tokens=max_new_tokens,
+            prompt_lookup_num_tokens=prompt_lookup_num_tokens,
+        )
     
     return {
         "user_id": user_id,
         "request_id": str(uuid.uuid4()),
+        "model": backend.name,
         "content": result['content'],
         "timestamp": datetime.now()
     }
+
+
+def llm_cache_stats():
+    return response_cache.stats()
+
+
+def llm_backends():
+    if STUB_ENGINE:
+        from algorithms.stub import stub_pool
+        return stub_pool.describe()
+    # nothing can be resident before the pool module has been imported
+    pool = sys.modules.get("algorithms.LLM.pool")
+    return pool.llm_pool.describe() if pool else []
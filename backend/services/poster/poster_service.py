@@ -0,0 +1,191 @@
+from algorithms.Img_gen.Rgb.rgb import background_params
+from algorithms.stub import background_engine, svg_engine
+from models.poster_models import PosterPlan, TextLayerPlan, Box
+from utils.storage import object_store
+from services.db.db_service import history_writer
+from services.img.img_service import sample_trans
+from config import POSTER_MAX_OBJECTS, POSTER_MAX_TEXTS, POSTER_MIN_OBJECT_SIDE, TRANS_MAX_SIDE
+from datetime import datetime
+from typing import Any
+import asyncio
+import json
+import random
+import uuid
+
+PLAN_INSTRUCTION = """You are a poster layout designer. Turn the design brief into a layer plan for a {width}x{height} pixel poster.
+Answer with a single JSON object and nothing else, using this schema:
+{{
+  "background_color": "#RRGGBB",
+  "objects": [{{"prompt_pos": "SDXL prompt of one isolated object", "prompt_neg": "negative prompt", "box": {{"x": 0, "y": 0, "width": 512, "height": 512}}}}],
+  "texts": [{{"text": "headline", "box": {{"x": 0, "y": 0, "width": 800, "height": 120}}, "font_size": 96, "font_family": "Arial", "font_weight": "bold", "fill": "#RRGGBB"}}]
+}}
+Boxes must stay inside the poster. Use at most {max_objects} objects and {max_texts} texts. Objects are generated on a transparent background, so describe one object per layer.
+
+Brief: {brief}"""
+
+def _parse_plan(content: str) -> PosterPlan:
+    # the model may wrap the JSON in a code fence or add a sentence around it
+    start, end = content.find("{"), content.rfind("}")
+    if start == -1 or end <= start:
+        raise ValueError("大语言模型未返回有效的图层规划")
+    try:
+        data = json.loads(content[start:end + 1])
+    except json.JSONDecodeError as e:
+        raise ValueError(f"图层规划不是有效的JSON: {e}")
+    # extra layers of an over-eager plan are dropped instead of failing the request
+    if isinstance(data, dict):
+        for key, limit in (("objects", POSTER_MAX_OBJECTS), ("texts", POSTER_MAX_TEXTS)):
+            if isinstance(data.get(key), list):
+                data[key] = data[key][:limit]
+    return PosterPlan.model_validate(data)
+
+def plan_poster(brief: str, width: int, height: int, config: dict[str, Any] | None = None) -> PosterPlan:
+    # heavy ML imports are deferred to the first poster request
+    from algorithms.stub import llm_engine
+    llm_pool = llm_engine()
+    config = dict(config or {})
+    prompt = PLAN_INSTRUCTION.format(width=width, height=height, brief=brief, max_objects=POSTER_MAX_OBJECTS, max_texts=POSTER_MAX_TEXTS)
+    backend = llm_pool.route(
+        prompt=prompt,
+        model=config.pop("model", None),
+        max_latency_ms=config.pop("max_latency_ms", None),
+        enable_thinking=False,
+        torch_dtype=config.pop("torch_dtype", "auto"),
+        device_map=config.pop("device_map", "auto"),
+        quantization=config.pop("quantization", None),
+    )
+    # planning is deterministic by default so that identical briefs hit the response cache
+    result = backend.chat(
+        prompt=prompt,
+        enable_thinking=False,
+        do_sample=config.get("do_sample") or False,
+        max_new_tokens=config.get("max_new_tokens", 2048),
+        prompt_lookup_num_tokens=config.get("prompt_lookup_num_tokens"),
+    )
+    return _parse_plan(result["content"])
+
+def _round8(value: float) -> int:
+    return (int(value) + 7) // 8 * 8
+
+def _sample_size(box: Box) -> tuple[int, int]:
+    # small boxes are sampled at POSTER_MIN_OBJECT_SIDE (an 8px box would be a 1x1 latent) and
+    # large ones at TRANS_MAX_SIDE, keeping the aspect ratio where possible; the layer is placed in its box
+    factor = max(1.0, POSTER_MIN_OBJECT_SIDE / min(box.width, box.height))
+    factor = min(factor, TRANS_MAX_SIDE / max(box.width, box.height))
+    return tuple(min(TRANS_MAX_SIDE, max(POSTER_MIN_OBJECT_SIDE, _round8(side * factor))) for side in (box.width, box.height))
+
+def _clip_box(box: Box, width: int, height: int) -> Box:
+    # the part of the box on the canvas, a box outside of it shrinks to the nearest edge
+    x, y = min(box.x, width - 1), min(box.y, height - 1)
+    return Box(x=x, y=y, width=min(box.width, width - x), height=min(box.height, height - y))
+
+def _clip_plan(plan: PosterPlan, width: int, height: int) -> PosterPlan:
+    return plan.model_copy(update={
+        "objects": [obj.model_copy(update={"box": _clip_box(obj.box, width, height)}) for obj in plan.objects],
+        "texts": [text.model_copy(update={"box": _clip_box(text.box, width, height)}) for text in plan.texts],
+    })
+
+def _render_background(user_id: str, width: int, height: int, color: str) -> dict:
+    data = background_engine()(width, height, background_params("solid", [color]))
+    local_path = object_store.put(user_id, data, file_format="png")
+    return {
+        "kind": "rgb",
+        "z_index": 0,
+        "local_path": local_path,
+        "box": Box(x=0, y=0, width=width, height=height),
+    }
+
+async def _render_objects(user_id: str, plan: PosterPlan, deadline_ms: float | None) -> list[dict]:
+    # objects of the same sample size share runs, every run is admitted into the trans pool
+    jobs = []
+    for obj in plan.objects:
+        width, height = _sample_size(obj.box)
+        jobs.append({
+            "width": width,
+            "height": height,
+            "prompt_pos": obj.prompt_pos,
+            "prompt_neg": obj.prompt_neg,
+            "seed": random.randint(0, 1_000_000),
+        })
+    images = await sample_trans(jobs, deadline_ms)
+    for img in images:
+        if isinstance(img, Exception):
+            raise img
+
+    layers = []
+    for i, (obj, img) in enumerate(zip(plan.objects, images)):
+        local_path = await asyncio.to_thread(object_store.put_image, user_id, img, "png")
+        layers.append({
+            "kind": "layer",
+            "z_index": i + 1,
+            "local_path": local_path,
+            "box": obj.box,
+            "prompt_pos": obj.prompt_pos,
+        })
+    return layers
+
+def _render_text(user_id: str, z_index: int, text: TextLayerPlan) -> dict:
+    svg = svg_engine()(
+        text=text.text,
+        x=0,
+        y=text.font_size,
+        font_size=text.font_size,
+        font_family=text.font_family,
+        font_weight=text.font_weight,
+        fill=text.fill,
+    )
+    local_path = object_store.put_text(user_id, svg, file_format="svg")
+    return {
+        "kind": "svg",
+        "z_index": z_index,
+        "local_path": local_path,
+        "box": text.box,
+        "text": text.text,
+    }
+
+async def poster_generate(
+    user_id: str = "zx",
+    brief: str = "A marketing poster promoting Coca-Cola",
+    width: int = 1400,
+    height: int = 2993,
+    plan: PosterPlan | None = None,
+    config: dict[str, Any] | None = None,
+    deadline_ms: float | None = None,
+    account_id: str | None = None,
+):
+    if plan is None:
+        plan = await asyncio.to_thread(plan_poster, brief, width, height, config)
+    # boxes come from the LLM or the client, SDXL samples at the box size
+    plan = _clip_plan(plan, width, height)
+
+    # background, text layers and object batches are independent and run concurrently
+    jobs = [asyncio.to_thread(_render_background, user_id, width, height, plan.background_color)]
+
+    if plan.objects:
+        jobs.append(_render_objects(user_id, plan, deadline_ms))
+
+    for i, text in enumerate(plan.texts):
+        jobs.append(asyncio.to_thread(_render_text, user_id, len(plan.objects) + i + 1, text))
+
+    layers = []
+    for result in await asyncio.gather(*jobs):
+        layers.extend(result if isinstance(result, list) else [result])
+    layers.sort(key=lambda layer: layer["z_index"])
+
+    request_id = str(uuid.uuid4())
+    history_writer.record(account_id, request_id, [
+        {
+            "positive_prompt": layer.get("prompt_pos") or layer.get("text") or f"background {plan.background_color}",
+            "image_path": layer["local_path"],
+            "image_format": layer["local_path"].rsplit(".", 1)[-1],
+        }
+        for layer in layers
+    ])
+
+    return {
+        "user_id": user_id,
+        "request_id": request_id,
+        "plan": plan,
+        "layers": layers,
+        "timestamp": datetime.now()
+    }
@@ -0,0 +1,324 @@
+"""
+Retention of generated assets
+
+Each pass over the object store index:
+    - pins every object referenced by generation history (newer than
+      RETENTION_PIN_DAYS, or all history when 0), pinned references are never evicted
+    - drops unpinned references unused (created / last served) for RETENTION_MAX_AGE_DAYS
+    - evicts the least recently used unpinned references of every user above
+      RETENTION_USER_QUOTA_MB (an object shared by several users counts for each)
+    - deletes object files that no user references any more, plus orphaned files
+      and stale derivatives under static/derived/
+References younger than RETENTION_MIN_AGE_S are skipped, their history record may
+still be in the write-behind queue.
+Deletions run in batches paced to RETENTION_MAX_DELETES_PER_S and wait while the
+model pools are busy, so a pass never competes with generation for disk I/O.
+
+python -m services.storage.retention_service [--dry-run] runs one pass and prints the report.
+"""
+
+import asyncio
+import logging
+import shutil
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+
+from sqlalchemy import select
+
+from models.db_models import Layer
+from utils.dependencies import SessionLocal
+from utils.storage import OBJECTS_DIR, ObjectStore, object_store
+from config import (
+    RETENTION_BATCH_SIZE,
+    RETENTION_DERIVED_MAX_AGE_DAYS,
+    RETENTION_INTERVAL_S,
+    RETENTION_MAX_AGE_DAYS,
+    RETENTION_MAX_DELETES_PER_S,
+    RETENTION_MIN_AGE_S,
+    RETENTION_MIN_FREE_GB,
+    RETENTION_PIN_DAYS,
+    RETENTION_USER_QUOTA_MB,
+)
+
+logger = logging.getLogger(__name__)
+
+DAY = 86400
+# how often the loop checks free disk space between passes
+PRESSURE_CHECK_S = 60
+# longest a batch waits for the model pools to go idle
+MAX_DEFER_S = 300
+
+Object = tuple[str, str]
+
+
+class RetentionService:
+    """
+    生成资源的保留策略: 按年龄与每用户配额淘汰引用, 删除不再被引用的对象文件
+
+    被生成历史引用的资源固定保留; 删除按批进行并限速, 模型池繁忙时推迟.
+    """
+    def __init__(self,
+                 store: ObjectStore = object_store,
+                 interval_s: float = RETENTION_INTERVAL_S,
+                 max_age_days: float = RETENTION_MAX_AGE_DAYS,
+                 user_quota_mb: float = RETENTION_USER_QUOTA_MB,
+                 pin_days: float = RETENTION_PIN_DAYS,
+                 min_age_s: float = RETENTION_MIN_AGE_S,
+                 batch_size: int = RETENTION_BATCH_SIZE,
+                 max_deletes_per_s: float = RETENTION_MAX_DELETES_PER_S,
+                 derived_max_age_days: float = RETENTION_DERIVED_MAX_AGE_DAYS,
+                 min_free_gb: float = RETENTION_MIN_FREE_GB):
+        self.store = store
+        self.interval_s = interval_s
+        self.max_age_s = max_age_days * DAY
+        self.user_quota = int(user_quota_mb * 1024 * 1024)
+        self.pin_s = pin_days * DAY
+        self.min_age_s = min_age_s
+        self.batch_size = batch_size
+        self.max_deletes_per_s = max_deletes_per_s
+        self.derived_max_age_s = derived_max_age_days * DAY
+        self.min_free = int(min_free_gb * 1024 ** 3)
+        self._task: asyncio.Task | None = None
+        self._stop = threading.Event()
+        self._running = threading.Lock()
+        self.last_report: dict | None = None
+        self.passes = 0
+        self.reclaimed_bytes = 0
+        self.deleted_objects = 0
+
+    # pins
+
+    def _history_paths(self, now: float) -> list[str]:
+        query = select(Layer.image_path)
+        if self.pin_s:
+            query = query.where(Layer.created_at >= datetime.fromtimestamp(now - self.pin_s, timezone.utc))
+        with SessionLocal() as db:
+            return list(db.execute(query).scalars())
+
+    def _pinned(self, now: float) -> set[Object]:
+        """Objects referenced by generation history, legacy paths resolved through the index"""
+        legacy = self.store.legacy_targets()
+        pinned = set()
+        for image_path in self._history_paths(now):
+            path = Path(image_path)
+            try:
+                relative = path.relative_to(self.store.root).as_posix()
+            except ValueError:
+                relative = path.as_posix()
+            if relative.startswith(OBJECTS_DIR + "/"):
+                pinned.add((path.stem, path.suffix.lstrip(".")))
+            elif relative in legacy:
+                pinned.add(legacy[relative])
+        return pinned
+
+    # policies
+
+    def _select(self, now: float, pinned: set[Object], report: dict) -> list[tuple[str, str, str]]:
+        """References to drop: expired ones, then the least recently used of every user above quota"""
+        by_user: dict[str, list[tuple]] = defaultdict(list)
+        for reference in self.store.references():
+            by_user[reference[0]].append(reference)
+        report["references"] = sum(len(references) for references in by_user.values())
+
+        evict = []
+        pinned_bytes = 0
+        for user_id, references in by_user.items():
+            usage = sum(reference[3] for reference in references)
+            # least recently used first
+            references.sort(key=lambda reference: reference[5])
+            for _, digest, ext, size, created_at, last_used in references:
+                if (digest, ext) in pinned:
+                    pinned_bytes += size
+                    continue
+                if now - created_at < self.min_age_s:
+                    continue
+                if self.max_age_s and now - last_used > self.max_age_s:
+                    report["expired"] += 1
+                elif self.user_quota and usage > self.user_quota:
+                    report["over_quota"] += 1
+                else:
+                    continue
+                evict.append((user_id, digest, ext))
+                usage -= size
+            if self.user_quota and usage > self.user_quota:
+                # only pinned or fresh assets left
+                report["users_over_quota"].append(user_id)
+        report["pinned_objects"] = len(pinned)
+        report["pinned_bytes"] = pinned_bytes
+        return evict
+
+    # deletion
+
+    def _busy(self) -> bool:
+        admission = sys.modules.get("utils.admission")
+        if admission is None:
+            return False
+        return any(queue.running or queue.waiting for queue in admission.admission_pools.values())
+
+    def _pace(self, deleted: int, report: dict, pressure: bool):
+        """Sleep for the rate limit, then wait (bounded) while generation is running"""
+        if self.max_deletes_per_s and deleted:
+            self._stop.wait(deleted / self.max_deletes_per_s)
+        if pressure:
+            return
+        waited = 0.0
+        while self._busy() and waited < MAX_DEFER_S and not self._stop.is_set():
+            self._stop.wait(1.0)
+            waited += 1.0
+        report["deferred_s"] += waited
+
+    def _delete(self, evict: list[tuple[str, str, str]], report: dict, dry_run: bool, pressure: bool):
+        if dry_run:
+            # an object is reclaimed once all of its references are evicted
+            evicted = defaultdict(int)
+            for _, digest, ext in evict:
+                evicted[(digest, ext)] += 1
+            counts = defaultdict(int)
+            sizes = {}
+            for _, digest, ext, size, _, _ in self.store.references():
+                counts[(digest, ext)] += 1
+                sizes[(digest, ext)] = size
+            for key, evicted_count in evicted.items():
+                if counts[key] == evicted_count:
+                    report["deleted_objects"] += 1
+                    report["reclaimed_bytes"] += sizes[key]
+            return
+        for start in range(0, len(evict), self.batch_size):
+            if self._stop.is_set():
+                break
+            batch = evict[start:start + self.batch_size]
+            self.store.drop_references(batch)
+            deleted = 0
+            for digest, ext in dict.fromkeys((digest, ext) for _, digest, ext in batch):
+                reclaimed = self.store.delete_unreferenced(digest, ext)
+                if reclaimed:
+                    deleted += 1
+                    report["deleted_objects"] += 1
+                    report["reclaimed_bytes"] += reclaimed
+            self._pace(deleted, report, pressure)
+
+    def _sweep(self, now: float, report: dict, dry_run: bool):
+        """Object files without any reference (left by an interrupted pass), stale tmp files and derivatives"""
+        referenced = {(digest, ext) for _, digest, ext, _, _, _ in self.store.references()}
+        for file in self.store.objects.rglob("*"):
+            if not file.is_file():
+                continue
+            try:
+                stat = file.stat()
+            except FileNotFoundError:
+                continue
+            if now - stat.st_mtime < self.min_age_s:
+                continue
+            if file.name.startswith("."):
+                # temp file of an interrupted write
+                size = stat.st_size
+                if not dry_run:
+                    file.unlink(missing_ok=True)
+            elif (file.stem, file.suffix.lstrip(".")) not in referenced:
+                size = stat.st_size if dry_run else self.store.delete_unreferenced(file.stem, file.suffix.lstrip("."))
+            else:
+                continue
+            if size:
+                report["orphans"] += 1
+                report["reclaimed_bytes"] += size
+
+        if not self.derived_max_age_s:
+            return
+        for file in (self.store.root / "derived").rglob("*"):
+            try:
+                stat = file.stat()
+            except FileNotFoundError:
+                continue
+            # derivatives are re-created on demand
+            if file.is_file() and now - stat.st_mtime > self.derived_max_age_s:
+                if not dry_run:
+                    file.unlink(missing_ok=True)
+                report["derived"] += 1
+                report["reclaimed_bytes"] += stat.st_size
+
+    def free_bytes(self) -> int:
+        return shutil.disk_usage(self.store.root).free
+
+    def run_once(self, dry_run: bool = False) -> dict:
+        """One retention pass (blocking), returns the report"""
+        with self._running:
+            started = time.time()
+            pressure = self.min_free > 0 and self.free_bytes() < self.min_free
+            report = {
+                "started_at": started,
+                "dry_run": dry_run,
+                "disk_pressure": pressure,
+                "references": 0,
+                "expired": 0,
+                "over_quota": 0,
+                "users_over_quota": [],
+                "pinned_objects": 0,
+                "pinned_bytes": 0,
+                "deleted_objects": 0,
+                "orphans": 0,
+                "derived": 0,
+                "reclaimed_bytes": 0,
+                "deferred_s": 0.0,
+            }
+            self.store.flush_access()
+            evict = self._select(started, self._pinned(started), report)
+            self._delete(evict, report, dry_run, pressure)
+            self._sweep(started, report, dry_run)
+            report["duration_s"] = round(time.time() - started, 3)
+            report["free_bytes"] = self.free_bytes()
+            if not dry_run:
+                self.passes += 1
+                self.reclaimed_bytes += report["reclaimed_bytes"]
+                self.deleted_objects += report["deleted_objects"] + report["orphans"]
+            self.last_report = report
+            return report
+
+    async def _run(self):
+        next_pass = time.monotonic() + self.interval_s
+        while True:
+            await asyncio.sleep(min(PRESSURE_CHECK_S, max(0.0, next_pass - time.monotonic())))
+            try:
+                if time.monotonic() < next_pass and not (self.min_free and self.free_bytes() < self.min_free):
+                    # served objects are recorded in batches even between passes
+                    await asyncio.to_thread(self.store.flush_access)
+                    continue
+                # the next pass is only scheduled here, errors between passes (disk check, flush) do not postpone it
+                next_pass = time.monotonic() + self.interval_s
+                report = await asyncio.to_thread(self.run_once)
+                logger.info("存储清理完成: 删除 %d 个对象, 回收 %d 字节", report["deleted_objects"] + report["orphans"], report["reclaimed_bytes"])
+            except Exception:
+                logger.exception("存储清理失败")
+
+    def start(self):
+        if self._task is None and self.interval_s > 0:
+            self._stop.clear()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        # a pass in its pacing sleep stops after the current batch
+        self._stop.set()
+        self._task.cancel()
+        self._task = None
+        await asyncio.to_thread(self.store.flush_access)
+
+    def stats(self) -> dict:
+        return {
+            "passes": self.passes,
+            "deleted_objects": self.deleted_objects,
+            "reclaimed_bytes": self.reclaimed_bytes,
+            "last_report": self.last_report,
+        }
+
+
+retention_service = RetentionService()
+
+
+if __name__ == "__main__":
+    import json
+    print(json.dumps(retention_service.run_once(dry_run="--dry-run" in sys.argv), indent=2))
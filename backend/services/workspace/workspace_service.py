@@ -0,0 +1,281 @@
+"""
+Workspace sessions over WebSocket
+
+The server keeps the layer stack of one open workspace document. Each edit
+operation only re-renders the layer it touches (a background for a recolour, the
+SVG for a text change, an SDXL run for a regeneration (admitted to the trans pool by layer_trans), nothing for a move). The
+reply carries only what changed:
+    - render="layers": the changed layer states, the client composites itself
+    - render="tiles":  additionally the canvas tiles inside the region the edit
+      touched, re-blended by the shared compositor, which restarts from the
+      cached flattened prefix below the edited layer
+"""
+
+import asyncio
+import base64
+
+from algorithms.Img_comp.composite import CompositeLayer, to_image
+from models.img_models import LayerRequest, RgbRequest, SvgRequest
+from models.workspace_models import AddOp, InitOp, MoveOp, RecolorOp, RegenerateOp, RemoveOp, TextOp, WorkspaceLayer
+from services.img.img_service import check_static_path, compositor, layer_rgb, layer_svg, layer_trans
+from utils.storage import encode_image
+from config import WORKSPACE_MAX_LAYERS, WORKSPACE_TILE_SIZE
+
+Region = tuple[int, int, int, int]
+
+
+class WorkspaceSession:
+    def __init__(self, user_id: str, account_id: str | None = None, tile_size: int = WORKSPACE_TILE_SIZE):
+        self.user_id = user_id
+        # authenticated account (token subject), renders are recorded in its generation history
+        self.account_id = account_id
+        self.tile_size = tile_size
+        self.width = 0
+        self.height = 0
+        self.render = "tiles"
+        self.version = 0
+        # bottom to top
+        self.layers: list[dict] = []
+
+    def _find(self, layer_id: str) -> dict:
+        for layer in self.layers:
+            if layer["id"] == layer_id:
+                return layer
+        raise ValueError(f"图层不存在: {layer_id}")
+
+    def _require_init(self):
+        if not self.width:
+            raise ValueError("请先发送 init 操作初始化工作区")
+
+    @staticmethod
+    def _composite_layer(layer: dict) -> CompositeLayer:
+        return CompositeLayer(
+            local_path=layer["local_path"],
+            x=layer["x"],
+            y=layer["y"],
+            scale=layer["scale"],
+            opacity=layer["opacity"],
+        )
+
+    async def _bounds(self, layer: dict) -> Region | None:
+        # loads (and caches) the decoded layer, which the next composite reuses
+        return await asyncio.to_thread(compositor.bounds, self.width, self.height, self._composite_layer(layer))
+
+    async def _render(self, layer: dict, deadline_ms: float | None = None):
+        """Render the layer from its params and update its local_path"""
+        kind, params = layer["kind"], layer["params"]
+        if kind == "image":
+            if not layer["local_path"]:
+                raise ValueError(f"image 图层必须提供 local_path: {layer['id']}")
+            check_static_path(layer["local_path"])
+            return
+        if kind == "rgb":
+            request = RgbRequest(**{"width": self.width, "height": self.height, **params})
+            result = await layer_rgb(
+                user_id=self.user_id,
+                width=request.width,
+                height=request.height,
+                color=request.color,
+                kind=request.kind,
+                colors=request.colors,
+                angle=request.angle,
+                center=(request.center_x, request.center_y),
+                radius=request.radius,
+                scale=request.scale,
+                octaves=request.octaves,
+                seed=request.seed,
+                pattern=request.pattern,
+                tile=request.tile,
+                account_id=self.account_id,
+            )
+        elif kind == "svg":
+            request = SvgRequest(**params)
+            result = await layer_svg(
+                user_id=self.user_id,
+                text=request.text,
+                x=request.x,
+                y=request.y,
+                font_size=request.font_size,
+                font_family=request.font_family,
+                font_weight=request.font_weight,
+                fill=request.fill,
+                stroke=request.stroke,
+                stroke_width=request.stroke_width,
+                style=request.style,
+                text_mode=request.text_mode,
+                account_id=self.account_id,
+            )
+        else:
+            request = LayerRequest(**{"width": 1024, "height": 1024, **params})
+            result = await layer_trans(
+                user_id=self.user_id,
+                width=request.width,
+                height=request.height,
+                prompt_pos=request.prompt_pos,
+                prompt_neg=request.prompt_neg,
+                seed=request.seed,
+                deadline_ms=deadline_ms,
+                account_id=self.account_id,
+            )
+            params["seed"] = result["images"][0]["seed"]
+        layer["local_path"] = result["local_path"]
+
+    def _tile_origins(self, regions: list[Region | None]) -> list[tuple[int, int]]:
+        # tiles are aligned to the tile grid, so the client can replace them in place;
+        # a move only touches the tiles under the old and the new position, not the area between
+        size = self.tile_size
+        origins = set()
+        for region in regions:
+            if region is None:
+                continue
+            x0, y0, x1, y1 = region
+            for ty in range(y0 // size * size, y1, size):
+                for tx in range(x0 // size * size, x1, size):
+                    origins.add((tx, ty))
+        return sorted(origins, key=lambda origin: (origin[1], origin[0]))
+
+    def _render_tiles(self, origins: list[tuple[int, int]], edit_index: int | None = None) -> tuple[list[dict], int]:
+        stack = [self._composite_layer(layer) for layer in self.layers]
+        canvas, start = compositor.composite(self.width, self.height, stack, edit_index)
+        tiles = []
+        for tx, ty in origins:
+            crop = canvas[ty:min(ty + self.tile_size, self.height), tx:min(tx + self.tile_size, self.width)]
+            tiles.append({
+                "x": tx,
+                "y": ty,
+                "width": crop.shape[1],
+                "height": crop.shape[0],
+                "data": base64.b64encode(encode_image(to_image(crop), "png")).decode("ascii"),
+            })
+        return tiles, start
+
+    async def _patch(self, op_id: str | None, changed: list[dict], removed: list[str], regions: list[Region | None]) -> dict:
+        self.version += 1
+        patch = {
+            "type": "patch",
+            "op_id": op_id,
+            "version": self.version,
+            "layers": [dict(layer) for layer in changed],
+            "removed": removed,
+            "order": [layer["id"] for layer in self.layers],
+            "tiles": [],
+        }
+        origins = self._tile_origins(regions)
+        if self.render == "tiles" and origins:
+            # a layer edited once is usually edited again (moves, regeneration), keep the prefix below it
+            edit_index = None
+            if len(changed) == 1:
+                edit_index = next((i for i, layer in enumerate(self.layers) if layer["id"] == changed[0]["id"]), None)
+            patch["tiles"], patch["reblended_from"] = await asyncio.to_thread(self._render_tiles, origins, edit_index)
+        return patch
+
+    def _new_layer(self, spec: WorkspaceLayer) -> dict:
+        if any(layer["id"] == spec.id for layer in self.layers):
+            raise ValueError(f"图层ID重复: {spec.id}")
+        if len(self.layers) >= WORKSPACE_MAX_LAYERS:
+            raise ValueError(f"工作区最多包含 {WORKSPACE_MAX_LAYERS} 个图层")
+        if spec.local_path:
+            # a client supplied file of any kind must be one of the generated assets
+            check_static_path(spec.local_path)
+        return spec.model_dump()
+
+    async def init(self, op: InitOp, deadline_ms: float | None = None) -> dict:
+        self.width, self.height, self.render = op.width, op.height, op.render
+        self.layers = []
+        try:
+            for spec in op.layers:
+                layer = self._new_layer(spec)
+                if not layer["local_path"] or layer["kind"] == "image":
+                    await self._render(layer, deadline_ms)
+                self.layers.append(layer)
+        except BaseException:
+            self.width = self.height = 0
+            self.layers = []
+            raise
+        return await self._patch(op.op_id, self.layers, [], [(0, 0, self.width, self.height)])
+
+    async def add(self, op: AddOp, deadline_ms: float | None = None) -> dict:
+        self._require_init()
+        layer = self._new_layer(op.layer)
+        if not layer["local_path"] or layer["kind"] == "image":
+            await self._render(layer, deadline_ms)
+        index = len(self.layers) if op.index is None else min(op.index, len(self.layers))
+        self.layers.insert(index, layer)
+        return await self._patch(op.op_id, [layer], [], [await self._bounds(layer)])
+
+    async def move(self, op: MoveOp) -> dict:
+        self._require_init()
+        layer = self._find(op.layer_id)
+        before = await self._bounds(layer)
+        layer["x"], layer["y"] = op.x, op.y
+        if op.scale is not None:
+            layer["scale"] = op.scale
+        if op.opacity is not None:
+            layer["opacity"] = op.opacity
+        return await self._patch(op.op_id, [layer], [], [before, await self._bounds(layer)])
+
+    async def _rerender(self, op_id: str | None, layer: dict, params: dict, deadline_ms: float | None = None) -> dict:
+        before = await self._bounds(layer)
+        previous = dict(layer["params"])
+        layer["params"].update(params)
+        try:
+            await self._render(layer, deadline_ms)
+        except BaseException:
+            # a failed render leaves the document unchanged
+            layer["params"] = previous
+            raise
+        return await self._patch(op_id, [layer], [], [before, await self._bounds(layer)])
+
+    async def recolor(self, op: RecolorOp) -> dict:
+        self._require_init()
+        layer = self._find(op.layer_id)
+        if layer["kind"] == "rgb":
+            params = {"color": op.color}
+            if op.colors is not None:
+                params["colors"] = op.colors
+        elif layer["kind"] == "svg":
+            params = {"fill": op.color}
+        else:
+            raise ValueError(f"只有 rgb 和 svg 图层可以修改颜色: {op.layer_id}")
+        return await self._rerender(op.op_id, layer, params)
+
+    async def text(self, op: TextOp) -> dict:
+        self._require_init()
+        layer = self._find(op.layer_id)
+        if layer["kind"] != "svg":
+            raise ValueError(f"只有 svg 图层可以修改文本: {op.layer_id}")
+        return await self._rerender(op.op_id, layer, {**op.params, "text": op.text})
+
+    async def regenerate(self, op: RegenerateOp, deadline_ms: float | None = None) -> dict:
+        self._require_init()
+        layer = self._find(op.layer_id)
+        if layer["kind"] != "layer":
+            raise ValueError(f"只有 layer 图层可以重新生成: {op.layer_id}")
+        params = {"seed": op.seed}
+        if op.prompt_pos is not None:
+            params["prompt_pos"] = op.prompt_pos
+        if op.prompt_neg is not None:
+            params["prompt_neg"] = op.prompt_neg
+        return await self._rerender(op.op_id, layer, params, deadline_ms)
+
+    async def remove(self, op: RemoveOp) -> dict:
+        self._require_init()
+        layer = self._find(op.layer_id)
+        region = await self._bounds(layer)
+        self.layers.remove(layer)
+        return await self._patch(op.op_id, [], [layer["id"]], [region])
+
+    async def apply(self, op, deadline_ms: float | None = None) -> dict:
+        if isinstance(op, InitOp):
+            return await self.init(op, deadline_ms)
+        if isinstance(op, AddOp):
+            return await self.add(op, deadline_ms)
+        if isinstance(op, MoveOp):
+            return await self.move(op)
+        if isinstance(op, RecolorOp):
+            return await self.recolor(op)
+        if isinstance(op, TextOp):
+            return await self.text(op)
+        if isinstance(op, RegenerateOp):
+            return await self.regenerate(op, deadline_ms)
+        return await self.remove(op)
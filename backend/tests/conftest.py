@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# the backend modules are imported top level (config, algorithms, utils, ...), as when running from backend/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
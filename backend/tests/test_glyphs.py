@@ -0,0 +1,57 @@
+import pytest
+
+pytest.importorskip("fontTools")
+
+from fontTools.fontBuilder import FontBuilder
+from fontTools.pens.ttGlyphPen import TTGlyphPen
+from fontTools.ttLib import TTCollection
+
+from algorithms.Img_gen.Svg import glyphs
+
+
+def _square():
+    pen = TTGlyphPen(None)
+    pen.moveTo((100, 0))
+    pen.lineTo((100, 700))
+    pen.lineTo((500, 700))
+    pen.lineTo((500, 0))
+    pen.closePath()
+    return pen.glyph()
+
+
+def _font(family: str, char: str, weight: int = 400):
+    builder = FontBuilder(1000, isTTF=True)
+    builder.setupGlyphOrder([".notdef", "glyph1"])
+    builder.setupCharacterMap({ord(char): "glyph1"})
+    builder.setupGlyf({".notdef": TTGlyphPen(None).glyph(), "glyph1": _square()})
+    builder.setupHorizontalMetrics({".notdef": (600, 0), "glyph1": (600, 100)})
+    builder.setupHorizontalHeader(ascent=800, descent=-200)
+    builder.setupNameTable({"familyName": family, "styleName": "Regular"})
+    builder.setupOS2(usWeightClass=weight)
+    builder.setupPost()
+    return builder.font
+
+
+@pytest.fixture
+def font_dir(tmp_path, monkeypatch):
+    collection = TTCollection()
+    collection.fonts = [_font("Test Latin", "A"), _font("Test CJK", "中", weight=700)]
+    collection.save(str(tmp_path / "test.ttc"))
+    monkeypatch.setattr(glyphs, "SVG_FONT_DIRS", [str(tmp_path)])
+    monkeypatch.setattr(glyphs, "SVG_FALLBACK_FONTS", ["Test CJK"])
+    glyphs.font_index.cache_clear()
+    yield tmp_path
+    glyphs.font_index.cache_clear()
+
+
+def test_font_index_reads_every_face_of_a_collection(font_dir):
+    index = glyphs.font_index()
+    assert [(f.family, f.number, f.weight) for f in index["test latin"]] == [("Test Latin", 0, 400)]
+    assert [(f.family, f.number, f.weight) for f in index["test cjk"]] == [("Test CJK", 1, 700)]
+
+
+def test_layout_falls_back_to_a_later_face(font_dir):
+    layout = glyphs.layout_text("A中", "Test Latin", "normal", 100, required=True)
+    assert layout.fonts == ["Test CJK", "Test Latin"]
+    assert len(layout.placements) == 2
+    assert layout.width == pytest.approx(120)
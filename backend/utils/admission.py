@@ -0,0 +1,152 @@
+"""
+Admission control for the GPU-bound endpoints
+
+Each model pool (SDXL layers, LLM chat, posters) gets a bounded queue in front of a
+fixed number of execution slots. The service time of a job is tracked as an EWMA, so
+the wait of a new request can be estimated from the queue depth. A request is rejected
+with 429 and a Retry-After computed from that estimate when
+    - the queue is full, or
+    - the estimated wait plus its own service time exceeds the client's deadline
+      (X-Deadline-Ms header, milliseconds the client is willing to wait)
+instead of piling up until the client times out.
+"""
+
+import asyncio
+import contextlib
+import math
+import time
+
+from fastapi import Header, HTTPException, status
+
+from config import ADMISSION_POOLS
+
+# every pool the services admit into, ADMISSION_POOLS overrides them per name
+DEFAULT_POOLS = "trans=1:16:20,llm=1:8:10,poster=1:4:60"
+DEADLINE_HEADER = Header(None, alias="X-Deadline-Ms", description="客户端愿意等待的最长时间(毫秒), 预计等待超出时立即返回429")
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, pool: str, reason: str, retry_after: float):
+        self.pool = pool
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f"{pool}: {reason}")
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class AdmissionQueue:
+    # all state is only touched from the event loop, no locking needed
+    def __init__(self, name: str, concurrency: int = 1, max_queue: int = 16, prior_service_s: float = 10.0, alpha: float = 0.2):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.service_s = prior_service_s
+        self.alpha = alpha
+        self._slots = asyncio.Semaphore(concurrency)
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected_full = 0
+        self.rejected_deadline = 0
+
+    def estimated_wait(self) -> float:
+        """Seconds a request arriving now would wait for a slot"""
+        if self.running < self.concurrency and self.waiting == 0:
+            return 0.0
+        return (self.waiting + 1) / self.concurrency * self.service_s
+
+    @property
+    def throughput(self) -> float:
+        """Jobs per second at the current service time"""
+        return self.concurrency / self.service_s
+
+    def _record(self, seconds: float):
+        self.service_s = self.alpha * seconds + (1 - self.alpha) * self.service_s
+
+    @contextlib.asynccontextmanager
+    async def admit(self, deadline_ms: float | None = None):
+        wait = self.estimated_wait()
+        if self.waiting >= self.max_queue:
+            self.rejected_full += 1
+            raise AdmissionRejected(self.name, "queue full", wait)
+        if deadline_ms is not None and (wait + self.service_s) * 1000 > deadline_ms:
+            self.rejected_deadline += 1
+            # once the queue ahead has drained enough for the request to fit its deadline
+            raise AdmissionRejected(self.name, "deadline", wait + self.service_s - deadline_ms / 1000)
+
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self.completed += 1
+            self._record(time.monotonic() - start)
+            self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue,
+            "waiting": self.waiting,
+            "running": self.running,
+            "completed": self.completed,
+            "rejected_full": self.rejected_full,
+            "rejected_deadline": self.rejected_deadline,
+            "service_s": round(self.service_s, 3),
+            "throughput_per_s": round(self.throughput, 4),
+            "estimated_wait_s": round(self.estimated_wait(), 3),
+        }
+
+
+def _parse_pools(value: str) -> dict[str, AdmissionQueue]:
+    # "name=concurrency:max_queue:prior_service_s,..."
+    pools = {}
+    for item in value.split(","):
+        name, _, spec = item.strip().partition("=")
+        if not name or not spec:
+            continue
+        concurrency, max_queue, prior = (spec.split(":") + ["", ""])[:3]
+        pools[name] = AdmissionQueue(name, int(concurrency), int(max_queue or 16), float(prior or 10.0))
+    return pools
+
+
+admission_pools = {**_parse_pools(DEFAULT_POOLS), **_parse_pools(ADMISSION_POOLS)}
+
+
+def admit(pool: str, deadline_ms: float | None = None):
+    return admission_pools[pool].admit(deadline_ms)
+
+
+def admission_stats() -> dict:
+    return {name: queue.stats() for name, queue in admission_pools.items()}
+
+
+def too_many_requests(e: AdmissionRejected, user_id: str) -> HTTPException:
+    message = "服务繁忙, 请求队列已满" if e.reason == "queue full" else "预计等待时间超出请求截止时间"
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail={
+            "user_id": user_id,
+            "error_message": f"{message}, 请在 {e.retry_after_header} 秒后重试",
+        },
+        headers={"Retry-After": e.retry_after_header},
+    )
+
+
+def deadline_exceeded(user_id: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+        detail={
+            "user_id": user_id,
+            "error_message": "等待结果超出请求截止时间, 生成仍在后台进行",
+        },
+    )
@@ -3,19 +3,28 @@ Dependency injection utilities for FastAPI application
 Provides database sessions, authentication, and other common dependencies
 """
 
-from typing import Generator, Optional
-from fastapi import Depends, HTTPException, status, Request
+from typing import AsyncGenerator, Generator, Optional
+from fastapi import Depends, HTTPException, status, Request, WebSocket
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.exc import SQLAlchemyError
+import base64
 import jwt
+from datetime import datetime
 from jwt.exceptions import ExpiredSignatureError, InvalidTokenError
-from datetime import datetime, timezone
 
 from models.db_models import Base, User
+from services.auth.auth_service import AsyncAuthService, auth_cache
 from utils.security import get_api_key
-from config import DATABASE_URL, SECRET_KEY, ALGORITHM
+from utils.rate_limit import RateLimiter, client_ip
+from utils.middleware import CLAIMS_SCOPE_KEY, ERROR_SCOPE_KEY
+from config import (
+    DATABASE_URL, ASYNC_DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, SQLITE_POOL_SIZE,
+    SECRET_KEY, ALGORITHM,
+)
 
 # Database setup
 engine = create_engine(
@@ -27,6 +36,39 @@ engine = create_engine(
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async database setup, used by the request handlers; the sync engine above stays for scripts
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg", "mysql": "aiomysql"}
+
+def async_database_url(url: str) -> str:
+    """Swap the sync driver of a database URL for its async counterpart"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for database backend: {backend}")
+    return parsed.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+def async_pool_options(url: str) -> dict:
+    """Connection pool sizing per database backend"""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite":
+        if parsed.database in (None, "", ":memory:"):
+            # in-memory databases live in a single connection
+            return {}
+        return {"pool_size": SQLITE_POOL_SIZE, "max_overflow": 0, "pool_timeout": DB_POOL_TIMEOUT}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_pre_ping": True,
+        "pool_recycle": 300,
+    }
+
+_async_url = ASYNC_DATABASE_URL or async_database_url(DATABASE_URL)
+async_engine = create_async_engine(_async_url, echo=False, **async_pool_options(_async_url))
+
+# expire_on_commit=False: attributes stay readable after commit without another (async) load
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 # Security setup
 security = HTTPBearer(auto_error=False)
 
@@ -37,6 +79,10 @@ def create_tables():
     """
     try:
         Base.metadata.create_all(bind=engine)
+        # create_all skips existing tables, indexes added later are created here
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=engine, checkfirst=True)
         print("Database tables created successfully")
     except Exception as e:
         print(f"Error creating database tables: {e}")
@@ -60,54 +106,130 @@ def get_db() -> Generator[Session, None, None]:
     finally:
         db.close()
 
-def get_current_user(
-    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
     """
-    Dependency for getting current authenticated user
-    Validates JWT token and returns user object
+    Dependency for getting an async database session
+    Queries don't block the event loop
     """
-    if not credentials:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Authentication credentials required",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-
-    try:
-        payload = jwt.decode(
-            credentials.credentials,
-            SECRET_KEY,
-            algorithms=[ALGORITHM]
-        )
-        user_id: str = payload.get("sub")
-        if user_id is None:
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        except SQLAlchemyError as e:
+            await db.rollback()
             raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication credentials",
-                headers={"WWW-Authenticate": "Bearer"},
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Database error: {str(e)}"
             )
-    except ExpiredSignatureError:
+
+def _token_claims(request: Request, token: str) -> dict:
+    """
+    Claims of the bearer token, as decoded by JWTAuthMiddleware for this request
+    Falls back to decoding here when the middleware is not installed
+    """
+    claims = request.scope.get(CLAIMS_SCOPE_KEY)
+    error = request.scope.get(ERROR_SCOPE_KEY)
+    if claims is None and error is None:
+        claims = auth_cache.get_claims(token)
+        if claims is None:
+            try:
+                claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            except ExpiredSignatureError:
+                error = "expired"
+            except InvalidTokenError:
+                error = "invalid"
+            else:
+                auth_cache.set_claims(token, claims)
+    if error == "expired":
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token has expired",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    except InvalidTokenError:
+    if claims is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    return claims
 
-    user: User | None = db.query(User).filter(User.id == user_id).first()
-    if user is None:
+def get_token_claims(
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
+) -> dict:
+    """
+    Dependency for the claims of the bearer token, without loading the user
+    """
+    if not credentials:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Authentication credentials required",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return _token_claims(request, credentials.credentials)
+
+def get_websocket_claims(websocket: WebSocket) -> Optional[dict]:
+    """
+    Claims of a WebSocket connection: bearer header (decoded by JWTAuthMiddleware)
+    or ?token=, since browsers cannot set headers on WebSocket requests
+    None without a token, HTTPException for an invalid one
+    """
+    token = websocket.query_params.get("token")
+    if token is None and websocket.scope.get(CLAIMS_SCOPE_KEY) is None and websocket.scope.get(ERROR_SCOPE_KEY) is None:
+        return None
+    if token is not None:
+        # the middleware decoded the header, not the query string
+        websocket.scope.pop(CLAIMS_SCOPE_KEY, None)
+        websocket.scope.pop(ERROR_SCOPE_KEY, None)
+    return _token_claims(websocket, token or "")
+
+def get_optional_token_claims(
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
+) -> Optional[dict]:
+    """
+    Dependency for the claims of the bearer token, None without a valid token
+    """
+    if not credentials:
+        return None
+    try:
+        return _token_claims(request, credentials.credentials)
+    except HTTPException:
+        return None
+
+def get_account_id(claims: Optional[dict] = Depends(get_optional_token_claims)) -> Optional[str]:
+    """
+    Dependency for the account of a request: the user of a valid bearer token, None for
+    requests authenticated by the API key only; generation history is recorded under it
+    """
+    return claims.get("sub") if claims else None
+
+async def _authenticated_user(
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials],
+    db: AsyncSession,
+    fresh: bool
+) -> User:
+    payload = get_token_claims(request, credentials)
+
+    user_id: str | None = payload.get("sub")
+    if user_id is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found",
+            detail="Invalid authentication credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+    user = None if fresh else auth_cache.get_user(user_id)
+    if user is None:
+        user = await AsyncAuthService.get_user_by_id(db, user_id)
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User not found",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        auth_cache.set_user(user)
     
     if user.is_active is False:
         raise HTTPException(
@@ -117,9 +239,33 @@ def get_current_user(
 
     return user
 
-def get_optional_current_user(
+async def get_current_user(
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+    db: AsyncSession = Depends(get_async_db)
+) -> User:
+    """
+    Dependency for getting current authenticated user
+    Uses the claims decoded by JWTAuthMiddleware and returns user object
+    Users are cached for AUTH_CACHE_TTL seconds, so hot paths skip the database
+    (invalidation is per process: other workers see a deactivation or a new password after at most the TTL)
+    """
+    return await _authenticated_user(request, credentials, db, fresh=False)
+
+async def get_fresh_user(
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+    db: AsyncSession = Depends(get_async_db)
+) -> User:
+    """
+    Dependency for sensitive routes: the user (active flag, password hash) is always read from the database
+    """
+    return await _authenticated_user(request, credentials, db, fresh=True)
+
+async def get_optional_current_user(
+    request: Request,
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> Optional[User]:
     """
     Dependency for optionally getting current user
@@ -129,11 +275,11 @@ def get_optional_current_user(
         return None
     
     try:
-        return get_current_user(credentials, db)
+        return await get_current_user(request, credentials, db)
     except HTTPException:
         return None
 
-def get_active_user(current_user: User = Depends(get_current_user)) -> User:
+async def get_active_user(current_user: User = Depends(get_current_user)) -> User:
     """
     Dependency that ensures user is active
     """
@@ -153,17 +299,9 @@ def require_api_key(api_key: str = Depends(get_api_key)) -> str:
 def get_client_ip(request: Request) -> str:
     """
     Dependency for getting client IP address
-    Handles proxy headers
+    Proxy headers are honoured only from TRUSTED_PROXIES
     """
-    forwarded_for = request.headers.get("X-Forwarded-For")
-    if forwarded_for:
-        return forwarded_for.split(",")[0].strip()
-    
-    real_ip = request.headers.get("X-Real-IP")
-    if real_ip:
-        return real_ip
-    
-    return request.client.host if request.client else "unknown"
+    return client_ip(request)
 
 def get_user_agent(request: Request) -> str:
     """
@@ -171,41 +309,10 @@ def get_user_agent(request: Request) -> str:
     """
     return request.headers.get("User-Agent", "Unknown")
 
-class RateLimitDependency:
-    """
-    Rate limiting dependency
-    Can be extended with Redis or other storage backends
-    """
-    def __init__(self, calls: int, period: int):
-        self.calls = calls
-        self.period = period
-        self._requests = {}
-
-    def __call__(self, client_ip: str = Depends(get_client_ip)):
-        now = datetime.now(timezone.utc).timestamp()
-        
-        if client_ip not in self._requests:
-            self._requests[client_ip] = []
-        
-        # Clean old requests
-        self._requests[client_ip] = [
-            req_time for req_time in self._requests[client_ip]
-            if now - req_time < self.period
-        ]
-        
-        if len(self._requests[client_ip]) >= self.calls:
-            raise HTTPException(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail=f"Rate limit exceeded: {self.calls} calls per {self.period} seconds"
-            )
-        
-        self._requests[client_ip].append(now)
-        return True
-
-# Common rate limiters
-rate_limit_strict = RateLimitDependency(calls=5, period=60)  # 5 calls per minute
-rate_limit_moderate = RateLimitDependency(calls=20, period=60)  # 20 calls per minute
-rate_limit_relaxed = RateLimitDependency(calls=100, period=60)  # 100 calls per minute
+# Common rate limiters, see utils/rate_limit.py
+rate_limit_strict = RateLimiter(calls=5, period=60)  # 5 calls per minute
+rate_limit_moderate = RateLimiter(calls=20, period=60)  # 20 calls per minute
+rate_limit_relaxed = RateLimiter(calls=100, period=60)  # 100 calls per minute
 
 def validate_content_type(
     request: Request,
@@ -258,6 +365,41 @@ def get_pagination_params(
         "offset": offset
     }
 
+def get_keyset_params(
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    max_limit: int = 100
+) -> dict:
+    """
+    Dependency for keyset (cursor) pagination parameters
+    The cursor is the opaque `next_cursor` of the previous page; unlike page/offset
+    the cost of fetching a page doesn't grow with how deep it is
+    """
+    params = get_pagination_params(page=1, limit=limit, max_limit=max_limit)
+    before = None
+    if cursor:
+        try:
+            created_at, _, result_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").partition("|")
+            before = (datetime.fromisoformat(created_at), result_id)
+        except (ValueError, UnicodeError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor"
+            )
+        if not result_id:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor"
+            )
+    return {"limit": params["limit"], "before": before}
+
+def encode_cursor(position: tuple[datetime, str] | None) -> Optional[str]:
+    """Opaque cursor for the position returned by a keyset query"""
+    if position is None:
+        return None
+    created_at, result_id = position
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{result_id}".encode("utf-8")).decode("ascii")
+
 # Health check dependencies
 def check_database_health(db: Session = Depends(get_db)) -> bool:
     """
@@ -0,0 +1,97 @@
+"""
+Liveness, readiness and model warmup
+
+The heavy ML stacks (torch, diffusers, transformers) are imported lazily by the
+services, so the API answers health and auth requests right after startup.
+Configured warmups load the models in background threads afterwards; readiness
+reports which models are resident and whether every configured warmup finished.
+"""
+
+import sys
+import threading
+import time
+
+from sqlalchemy import text
+
+from config import LLM_WARMUP, STUB_ENGINE, TRANS_WARMUP
+
+STARTED_AT = time.time()
+
+# warmup name -> pending / loading / ready / failed: <error>
+_warmups: dict[str, str] = {}
+_lock = threading.Lock()
+
+
+def _set(name: str, state: str):
+    with _lock:
+        _warmups[name] = state
+
+
+def _run(name: str, load):
+    _set(name, "loading")
+    try:
+        load()
+    except Exception as e:
+        _set(name, f"failed: {e}")
+    else:
+        _set(name, "ready")
+
+
+def _warm_llm():
+    from algorithms.stub import llm_engine
+    llm_engine().warmup()
+
+
+def _warm_trans():
+    if STUB_ENGINE:
+        return
+    from algorithms.Img_gen.Trans.trans import load_trans_models
+    load_trans_models()
+
+
+def start_warmup():
+    """Load the configured models in background threads, startup does not wait"""
+    jobs = {"llm": (LLM_WARMUP, _warm_llm), "trans": (TRANS_WARMUP, _warm_trans)}
+    for name, (enabled, load) in jobs.items():
+        if enabled:
+            _set(name, "pending")
+            threading.Thread(target=_run, args=(name, load), name=f"warmup-{name}", daemon=True).start()
+
+
+def loaded_models() -> dict:
+    """Models resident in this process, without importing anything that is not loaded yet"""
+    if STUB_ENGINE:
+        from algorithms.stub import stub_pool
+        return {"trans": True, "llm": [backend["model_id"] for backend in stub_pool.describe()], "stub": True}
+    models = {"trans": False, "llm": []}
+    trans = sys.modules.get("algorithms.Img_gen.Trans.trans")
+    if trans is not None:
+        models["trans"] = trans.load_trans_models.cache_info().currsize > 0
+    pool = sys.modules.get("algorithms.LLM.pool")
+    if pool is not None:
+        models["llm"] = [backend["model_id"] for backend in pool.llm_pool.describe() if backend.get("loaded")]
+    return models
+
+
+async def database_ready() -> bool:
+    from utils.dependencies import async_engine
+    try:
+        async with async_engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+        return True
+    except Exception:
+        return False
+
+
+async def readiness() -> tuple[bool, dict]:
+    with _lock:
+        warmups = dict(_warmups)
+    database = await database_ready()
+    ready = database and all(state == "ready" for state in warmups.values())
+    return ready, {
+        "status": "ready" if ready else "not_ready",
+        "database": database,
+        "warmup": warmups,
+        "models": loaded_models(),
+        "uptime_s": round(time.time() - STARTED_AT, 1),
+    }
@@ -0,0 +1,378 @@
+"""
+Prometheus metrics
+
+Counters and histograms are sharded per thread: a thread only ever writes to its own
+shard, so recording is a dict lookup and an increment with no lock shared between
+the event loop and the worker threads (sampling, encoding, bcrypt). The shards are
+summed when /metrics is scraped; a scrape may miss an increment that is in flight,
+never lose it. Gauges (queue depths, cache sizes, memory) are read from their owners
+at scrape time, nothing is recorded for them on the request path.
+"""
+
+import bisect
+import contextlib
+import os
+import resource
+import sys
+import threading
+import time
+from typing import Callable, Iterable
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# seconds; requests range from a cached background (ms) to a poster (minutes)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+Labels = tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Sharded:
+    """Per thread storage, the list of shards is only locked when a new thread first writes"""
+    def __init__(self):
+        self._local = threading.local()
+        self._shards: list[dict] = []
+        self._lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def _snapshot(self) -> list[dict]:
+        with self._lock:
+            shards = list(self._shards)
+        # copy() of a dict another thread inserts into can fail, retry until it doesn't
+        snapshots = []
+        for shard in shards:
+            while True:
+                try:
+                    snapshots.append(shard.copy())
+                    break
+                except RuntimeError:
+                    continue
+        return snapshots
+
+
+class Counter(_Sharded):
+    def __init__(self, name: str, documentation: str, labelnames: Labels = ()):
+        super().__init__()
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+
+    def inc(self, labels: Labels = (), amount: float = 1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def values(self) -> dict[Labels, float]:
+        totals: dict[Labels, float] = {}
+        for shard in self._snapshot():
+            for labels, value in shard.items():
+                totals[labels] = totals.get(labels, 0) + value
+        return totals
+
+    def expose(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self.values().items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram(_Sharded):
+    def __init__(self, name: str, documentation: str, labelnames: Labels = (), buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__()
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, labels: Labels, value: float):
+        shard = self._shard()
+        # [count per bucket..., +Inf count, sum]
+        state = shard.get(labels)
+        if state is None:
+            state = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        state[bisect.bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    @contextlib.contextmanager
+    def time(self, labels: Labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(labels, time.perf_counter() - start)
+
+    def values(self) -> dict[Labels, list[float]]:
+        totals: dict[Labels, list[float]] = {}
+        for shard in self._snapshot():
+            for labels, state in shard.items():
+                total = totals.setdefault(labels, [0] * len(state))
+                for i, value in enumerate(list(state)):
+                    total[i] += value
+        return totals
+
+    def expose(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        names = self.labelnames + ("le",)
+        for labels, state in sorted(self.values().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state[:-1]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(names, labels + (_number(bound),))} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_number(state[-1])}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Value read from its owner at scrape time: `collect` returns {labels: value}"""
+    def __init__(self, name: str, documentation: str, labelnames: Labels, collect: Callable[[], dict[Labels, float]], kind: str = "gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.collect = collect
+        self.kind = kind
+
+    def expose(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in sorted(self.collect().items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Labels = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Labels = (), buckets: tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, labelnames: Labels, collect: Callable[[], dict[Labels, float]], kind: str = "gauge") -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, collect, kind))
+
+    def expose(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            try:
+                lines.extend(metric.expose())
+            except Exception as e:
+                # a failing collector must not take the whole scrape down
+                lines.append(f"# {metric.name} unavailable: {_escape(str(e))}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.counter(
+    "diffart_http_requests_total", "HTTP requests by route template, method and status", ("method", "route", "status"))
+http_latency = registry.histogram(
+    "diffart_http_request_duration_seconds", "Time until the last response byte was sent", ("method", "route"))
+stage_latency = registry.histogram(
+    "diffart_model_stage_duration_seconds", "Model pipeline stages (sdxl: text_encode, sampling, sampling_step, decode, encode; LLMs: prefill, decode)",
+    ("model", "stage"), STAGE_BUCKETS)
+llm_tokens = registry.counter(
+    "diffart_llm_tokens_total", "LLM tokens processed, phase is prompt (prefill) or generated (decode)", ("model", "phase"))
+llm_seconds = registry.counter(
+    "diffart_llm_seconds_total", "LLM time spent per phase, tokens_total / seconds_total is the token rate", ("model", "phase"))
+
+
+@contextlib.contextmanager
+def stage(model: str, name: str):
+    """Time one pipeline stage of a model"""
+    with stage_latency.time((model, name)):
+        yield
+
+
+def route_template(scope) -> str:
+    """Path template of the matched route, it keeps the label set bounded (no ids in labels)"""
+    route = scope.get("route")
+    template = getattr(route, "path_format", None) or getattr(route, "path", None)
+    if template is None:
+        return "unmatched"
+    path, regex = scope["path"], getattr(route, "path_regex", None)
+    if regex is None or regex.match(path):
+        return template
+    # recent FastAPI versions store the route as declared in its router, without the include prefix
+    for i, char in enumerate(path):
+        if char == "/" and i and regex.match(path[i:]):
+            return path[:i] + template
+    return template
+
+
+def record_request(method: str, route: str, status: int, seconds: float):
+    http_requests.inc((method, route, str(status)))
+    http_latency.observe((method, route), seconds)
+
+
+# ---- gauges read at scrape time ----
+
+def _admission() -> dict[Labels, float]:
+    from utils.admission import admission_pools
+    values = {}
+    for name, queue in admission_pools.items():
+        values[(name, "waiting")] = queue.waiting
+        values[(name, "running")] = queue.running
+    return values
+
+
+def _admission_rejections() -> dict[Labels, float]:
+    from utils.admission import admission_pools
+    values = {}
+    for name, queue in admission_pools.items():
+        values[(name, "queue_full")] = queue.rejected_full
+        values[(name, "deadline")] = queue.rejected_deadline
+    return values
+
+
+def _admission_wait() -> dict[Labels, float]:
+    from utils.admission import admission_pools
+    return {(name,): queue.estimated_wait() for name, queue in admission_pools.items()}
+
+
+def _history_queue() -> dict[Labels, float]:
+    from services.db.db_service import history_writer
+    stats = history_writer.stats()
+    return {("queued",): stats["queued"]}
+
+
+def _caches() -> dict[str, object]:
+    """Caches that exist in this process, modules that were never imported are skipped"""
+    caches: dict[str, object] = {}
+    auth = sys.modules.get("services.auth.auth_service")
+    if auth is not None:
+        caches["auth_claims"] = auth.auth_cache.claims
+        caches["auth_users"] = auth.auth_cache.users
+    llm_cache = sys.modules.get("algorithms.LLM.cache")
+    if llm_cache is not None:
+        caches["llm_response"] = llm_cache.response_cache
+    rgb = sys.modules.get("algorithms.Img_gen.Rgb.rgb")
+    if rgb is not None:
+        caches["background_pixels"] = rgb._pixels
+        caches["background_encoded"] = rgb._encoded
+    glyphs = sys.modules.get("algorithms.Img_gen.Svg.glyphs")
+    if glyphs is not None:
+        caches["svg_glyphs"] = glyphs.glyph_cache
+    img = sys.modules.get("services.img.img_service")
+    if img is not None:
+        caches["composite_layers"] = img.compositor.layers
+        caches["composite_prefixes"] = img.compositor.prefixes
+    return caches
+
+
+def _cache_stat(field: str) -> Callable[[], dict[Labels, float]]:
+    def collect():
+        return {(name,): cache.stats()[field] for name, cache in _caches().items()}
+    return collect
+
+
+def _cache_entries() -> dict[Labels, float]:
+    return {(name,): len(cache) for name, cache in _caches().items()}
+
+
+def _single_flights() -> dict[Labels, float]:
+    flights = []
+    img = sys.modules.get("services.img.img_service")
+    if img is not None:
+        flights += [img.rgb_flight, img.trans_flight]
+    llm = sys.modules.get("services.llm.llm_services")
+    if llm is not None:
+        flights.append(llm.chat_flight)
+    values = {}
+    for flight in flights:
+        stats = flight.stats()
+        for outcome in ("leaders", "joined", "timeouts"):
+            values[(flight.name, outcome)] = stats[outcome]
+    return values
+
+
+def _retention() -> dict[Labels, float]:
+    retention = sys.modules.get("services.storage.retention_service")
+    if retention is None:
+        return {}
+    stats = retention.retention_service.stats()
+    return {("objects",): stats["deleted_objects"], ("bytes",): stats["reclaimed_bytes"]}
+
+
+def _llm_rate() -> dict[Labels, float]:
+    pool = sys.modules.get("algorithms.LLM.pool")
+    if pool is None:
+        return {}
+    return {
+        (backend["model_id"],): backend["decode_tok_s"]
+        for backend in pool.llm_pool.describe()
+        if backend.get("loaded")
+    }
+
+
+def _rss() -> dict[Labels, float]:
+    try:
+        with open("/proc/self/statm") as f:
+            return {(): int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")}
+    except (OSError, ValueError):
+        # peak instead of current RSS: KiB on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {(): peak if sys.platform == "darwin" else peak * 1024}
+
+
+def _accelerator_memory() -> dict[Labels, float]:
+    # only report when torch is already loaded, a scrape must never initialize CUDA
+    torch = sys.modules.get("torch")
+    if torch is None or not torch.cuda.is_available() or not torch.cuda.is_initialized():
+        return {}
+    values = {}
+    for device in range(torch.cuda.device_count()):
+        values[(f"cuda:{device}", "allocated")] = torch.cuda.memory_allocated(device)
+        values[(f"cuda:{device}", "reserved")] = torch.cuda.memory_reserved(device)
+        values[(f"cuda:{device}", "peak_allocated")] = torch.cuda.max_memory_allocated(device)
+    return values
+
+
+registry.gauge("diffart_admission_queue", "Requests waiting for / holding an execution slot per model pool",
+               ("pool", "state"), _admission)
+registry.gauge("diffart_admission_rejected_total", "Requests rejected by admission control",
+               ("pool", "reason"), _admission_rejections, kind="counter")
+registry.gauge("diffart_admission_estimated_wait_seconds", "Estimated wait of a request arriving now",
+               ("pool",), _admission_wait)
+registry.gauge("diffart_history_queue", "Generation history records waiting to be written",
+               ("state",), _history_queue)
+registry.gauge("diffart_cache_hits_total", "Cache hits", ("cache",), _cache_stat("hits"), kind="counter")
+registry.gauge("diffart_cache_misses_total", "Cache misses", ("cache",), _cache_stat("misses"), kind="counter")
+registry.gauge("diffart_cache_hit_ratio", "Cache hits / lookups since startup", ("cache",), _cache_stat("hit_ratio"))
+registry.gauge("diffart_cache_entries", "Entries held by the cache", ("cache",), _cache_entries)
+registry.gauge("diffart_single_flight_total", "Requests that started a computation (leaders), attached to one in flight (joined) or stopped waiting (timeouts)",
+               ("flight", "outcome"), _single_flights, kind="counter")
+registry.gauge("diffart_storage_reclaimed_total", "Objects deleted and bytes reclaimed by storage retention",
+               ("unit",), _retention, kind="counter")
+registry.gauge("diffart_llm_decode_tokens_per_second", "Smoothed (EWMA) decode rate of the loaded LLM backends",
+               ("model",), _llm_rate)
+registry.gauge("diffart_process_resident_memory_bytes", "Resident memory of this process", (), _rss)
+registry.gauge("diffart_accelerator_memory_bytes", "Accelerator memory held by torch", ("device", "kind"),
+               _accelerator_memory)
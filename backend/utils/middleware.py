@@ -1,65 +1,229 @@
-from fastapi import Request
-from fastapi.security.utils import get_authorization_scheme_param
-from starlette.middleware.base import BaseHTTPMiddleware
+"""
+Pure ASGI middleware
 
-class JWTAuthMiddleware(BaseHTTPMiddleware):
+Unlike BaseHTTPMiddleware these don't wrap the request in an extra task and
+don't re-stream the response body, streaming responses pass straight through.
+"""
+
+import gzip
+import time
+
+import anyio
+import jwt
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config import SECRET_KEY, ALGORITHM, COMPRESS_BROTLI_QUALITY, COMPRESS_GZIP_LEVEL, COMPRESS_MIN_SIZE
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+from services.auth.auth_service import auth_cache
+from utils.metrics import record_request, route_template
+
+# scope keys set by JWTAuthMiddleware, read by utils.dependencies
+CLAIMS_SCOPE_KEY = "jwt_claims"
+ERROR_SCOPE_KEY = "jwt_error"
+
+
+def bearer_token(scope: Scope) -> str | None:
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                return token.strip()
+            return None
+    return None
+
+
+class JWTAuthMiddleware:
     """
-    Middleware to handle JWT authentication for protected routes
+    Decodes the bearer token once per request and stores the claims in the scope
+    (scope["jwt_claims"]); an invalid or expired token is recorded in
+    scope["jwt_error"] ("invalid" / "expired"). Requests are never rejected here,
+    the dependencies decide whether authentication is required.
     """
-    
-    def __init__(self, app, exclude_paths: list[str] | None = None):
-        super().__init__(app)
-        self.exclude_paths = exclude_paths or [
-            "/docs", "/redoc", "/openapi.json", 
+
+    def __init__(self, app: ASGIApp, exclude_paths: list[str] | None = None):
+        self.app = app
+        self.exclude_paths = tuple(exclude_paths or [
+            "/docs", "/redoc", "/openapi.json",
             "/api/auth/login", "/api/auth/register",
-            "/", "/health", "/static"
-        ]
-    
-    async def dispatch(self, request: Request, call_next):
-        # Skip authentication for excluded paths
-        if any(request.url.path.startswith(path) for path in self.exclude_paths):
-            response = await call_next(request)
-            return response
-        
-        # Get authorization header
-        authorization: str | None = request.headers.get("Authorization")
-        
-        if not authorization:
-            # Allow request to continue, let individual endpoints handle auth
-            response = await call_next(request)
-            return response
-            
-        scheme, token = get_authorization_scheme_param(authorization)
-        
-        if scheme.lower() != "bearer":
-            # Allow request to continue, let individual endpoints handle auth
-            response = await call_next(request)
-            return response
-        
+            "/health", "/static"
+        ])
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] not in ("http", "websocket") or scope["path"].startswith(self.exclude_paths):
+            await self.app(scope, receive, send)
+            return
+
+        token = bearer_token(scope)
+        if token is not None:
+            claims = auth_cache.get_claims(token)
+            if claims is None:
+                try:
+                    claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+                    auth_cache.set_claims(token, claims)
+                except jwt.ExpiredSignatureError:
+                    scope[ERROR_SCOPE_KEY] = "expired"
+                except jwt.InvalidTokenError:
+                    scope[ERROR_SCOPE_KEY] = "invalid"
+            if claims is not None:
+                scope[CLAIMS_SCOPE_KEY] = claims
+        await self.app(scope, receive, send)
+
+
+class CORSMiddleware:
+    """
+    Adds security headers to every HTTP response
+    """
+
+    HEADERS = {
+        "X-Content-Type-Options": "nosniff",
+        "X-Frame-Options": "DENY",
+        "X-XSS-Protection": "1; mode=block",
+        "Referrer-Policy": "strict-origin-when-cross-origin",
+    }
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_headers(message: Message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                for name, value in self.HEADERS.items():
+                    headers[name] = value
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+class MetricsMiddleware:
+    """
+    Counts HTTP requests and records their latency per route template, from the
+    request to the last byte of the response (streaming responses included)
+    """
+
+    def __init__(self, app: ASGIApp, exclude_paths: list[str] | None = None):
+        self.app = app
+        self.exclude_paths = tuple(exclude_paths or ["/metrics", "/static"])
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"].startswith(self.exclude_paths):
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
         try:
-            # Import here to avoid circular imports
-            from services.auth.auth_service import AuthService
-            # Verify token (this will raise exception if invalid)
-            AuthService.verify_token(token)
-            response = await call_next(request)
-            return response
-        except Exception:
-            # Let the request continue, individual endpoints will handle invalid tokens
-            response = await call_next(request)
-            return response
-
-class CORSMiddleware(BaseHTTPMiddleware):
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # the router stores the matched route in the scope
+            record_request(scope["method"], route_template(scope), status_code, time.perf_counter() - start)
+
+
+def accepted_encoding(accept_encoding: str) -> str | None:
+    """The preferred encoding the client accepts: br (when brotli is installed), gzip or None"""
+    weights = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        weight = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[name.strip()] = weight
+    supported = ("br", "gzip") if brotli is not None else ("gzip",)
+    candidates = [(weights.get(name, weights.get("*", 0.0)), -rank, name) for rank, name in enumerate(supported)]
+    weight, _, name = max(candidates)
+    return name if weight > 0 else None
+
+
+class CompressionMiddleware:
     """
-    Custom CORS middleware with additional security headers
+    Compresses complete response bodies (JSON, text, SVG) above a size threshold with
+    the encoding negotiated from Accept-Encoding. Streamed responses (more_body) and
+    binary media pass through untouched, so streaming keeps its time to first byte.
+    Partial responses (206 / Content-Range) are never compressed, their byte offsets refer
+    to the identity representation; a compressed response's ETag is made weak, it is not
+    byte-identical to the representation the strong tag names (If-None-Match still matches).
     """
-    
-    async def dispatch(self, request: Request, call_next):
-        response = await call_next(request)
-        
-        # Add security headers
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["X-Frame-Options"] = "DENY"
-        response.headers["X-XSS-Protection"] = "1; mode=block"
-        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-        
-        return response
\ No newline at end of file
+
+    COMPRESSIBLE = ("application/json", "text/", "image/svg+xml", "application/javascript", "application/xml")
+    # larger bodies are compressed in a worker thread instead of the event loop
+    THREAD_MIN_SIZE = 256 * 1024
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESS_MIN_SIZE,
+                 gzip_level: int = COMPRESS_GZIP_LEVEL, brotli_quality: int = COMPRESS_BROTLI_QUALITY):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        encoding = accepted_encoding(Headers(scope=scope).get("accept-encoding", "")) if scope["type"] == "http" else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Message | None = None
+        decided = False
+
+        async def send_compressed(message: Message):
+            nonlocal start_message, decided
+            if decided:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            decided = True
+            if message["type"] != "http.response.body":
+                await send(start_message)
+                await send(message)
+                return
+            headers = MutableHeaders(scope=start_message)
+            body = message.get("body", b"")
+            compressible = headers.get("content-type", "").startswith(self.COMPRESSIBLE)
+            if compressible:
+                headers.add_vary_header("Accept-Encoding")
+            if (not compressible or message.get("more_body") or len(body) < self.minimum_size
+                    or "content-encoding" in headers or start_message["status"] == 206
+                    or "content-range" in headers):
+                await send(start_message)
+                await send(message)
+                return
+            if len(body) >= self.THREAD_MIN_SIZE:
+                body = await anyio.to_thread.run_sync(self.compress, body, encoding)
+            else:
+                body = self.compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = "W/" + etag
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
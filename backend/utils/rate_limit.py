@@ -0,0 +1,275 @@
+"""
+Token bucket rate limiting
+
+Every key (limiter name + client identity) owns a bucket of `calls` tokens that refills
+at calls/period tokens per second; a request takes one token. A check is O(1): the
+bucket is refilled lazily from the time elapsed since its last update.
+
+Backends:
+    - MemoryBackend: per process, LRU ordered; buckets idle long enough to be full again
+      are indistinguishable from new ones and are evicted, and the key count is capped
+    - SQLiteBackend: one shared file, so the limits hold across uvicorn workers
+Limits are set per limiter (usually one per router, bucketed per route) and can be
+overridden per user, see RATE_LIMITS / RATE_LIMIT_USERS in config.py
+The client IP comes from forwarding headers only when the TCP peer is one of
+TRUSTED_PROXIES, otherwise any client could pick a fresh bucket per request.
+"""
+
+import ipaddress
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import anyio
+import jwt
+from fastapi import HTTPException, Request, status
+
+from config import (
+    ALGORITHM,
+    RATE_LIMIT_BACKEND,
+    RATE_LIMIT_DB_PATH,
+    RATE_LIMIT_MAX_KEYS,
+    RATE_LIMIT_USERS,
+    RATE_LIMITS,
+    SECRET_KEY,
+    TRUSTED_PROXIES,
+)
+from utils.middleware import CLAIMS_SCOPE_KEY
+
+
+def parse_limit(value: str) -> tuple[int, float]:
+    """'20/60' -> 20 calls per 60 seconds"""
+    calls, _, period = value.partition("/")
+    return int(calls), float(period or 60)
+
+
+def parse_limits(value: str) -> dict[str, tuple[int, float]]:
+    """'img=20/60,llm=10/60' -> {'img': (20, 60.0), 'llm': (10, 60.0)}"""
+    limits = {}
+    for item in value.split(","):
+        name, _, limit = item.strip().partition("=")
+        if name and limit:
+            limits[name.strip()] = parse_limit(limit.strip())
+    return limits
+
+
+def _refill(tokens: float, updated: float, now: float, rate: float, capacity: float) -> float:
+    return min(capacity, tokens + (now - updated) * rate)
+
+
+def _retry_after(tokens: float, rate: float, cost: float) -> float:
+    return (cost - tokens) / rate
+
+
+class MemoryBackend:
+    blocking = False
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        # key -> [tokens, updated, idle time after which the bucket is full again]
+        self._buckets: OrderedDict[str, list[float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now: float):
+        # least recently used first: stop at the first bucket that is still refilling
+        while self._buckets:
+            _, (_, updated, full_after) = next(iter(self._buckets.items()))
+            if now - updated < full_after and len(self._buckets) <= self.max_keys:
+                break
+            self._buckets.popitem(last=False)
+
+    def acquire(self, key: str, rate: float, capacity: float, cost: float = 1.0) -> tuple[bool, float]:
+        """Take `cost` tokens, return (allowed, seconds until the request would be allowed)"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            tokens = capacity if bucket is None else _refill(bucket[0], bucket[1], now, rate, capacity)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = [tokens, now, capacity / rate]
+            self._buckets.move_to_end(key)
+            self._evict(now)
+        return allowed, 0.0 if allowed else _retry_after(tokens, rate, cost)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class SQLiteBackend:
+    blocking = True
+
+    # idle buckets are swept every `sweep_every` checks
+    def __init__(self, path: str = RATE_LIMIT_DB_PATH, sweep_every: int = 1000):
+        self.sweep_every = sweep_every
+        self._checks = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            " key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, full_at REAL NOT NULL)"
+            " WITHOUT ROWID"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS buckets_full_at ON buckets (full_at)")
+
+    def acquire(self, key: str, rate: float, capacity: float, cost: float = 1.0) -> tuple[bool, float]:
+        # wall clock, shared by every worker process
+        now = time.time()
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so read-modify-write is atomic across processes
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+                tokens = capacity if row is None else _refill(row[0], row[1], now, rate, capacity)
+                allowed = tokens >= cost
+                if allowed:
+                    tokens -= cost
+                self._db.execute(
+                    "INSERT OR REPLACE INTO buckets VALUES (?, ?, ?, ?)",
+                    (key, tokens, now, now + (capacity - tokens) / rate),
+                )
+                self._checks += 1
+                if self._checks % self.sweep_every == 0:
+                    self._db.execute("DELETE FROM buckets WHERE full_at <= ?", (now,))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return allowed, 0.0 if allowed else _retry_after(tokens, rate, cost)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM buckets").fetchone()[0]
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Process-wide backend selected by RATE_LIMIT_BACKEND"""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if RATE_LIMIT_BACKEND == "sqlite":
+                _backend = SQLiteBackend(RATE_LIMIT_DB_PATH)
+            elif RATE_LIMIT_BACKEND == "memory":
+                _backend = MemoryBackend(RATE_LIMIT_MAX_KEYS)
+            else:
+                raise ValueError(f"Unknown rate limit backend: {RATE_LIMIT_BACKEND}")
+        return _backend
+
+
+_trusted_networks = [ipaddress.ip_network(proxy, strict=False) for proxy in TRUSTED_PROXIES]
+
+
+def _trusted(host: str) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in _trusted_networks)
+
+
+def client_ip(request: Request) -> str:
+    peer = request.client.host if request.client else "unknown"
+    if not _trusted(peer):
+        return peer
+    forwarded_for = request.headers.get("X-Forwarded-For")
+    if forwarded_for:
+        # proxies append the address they received the request from, so the client is
+        # the rightmost hop that is not a trusted proxy; entries left of it are client supplied
+        hops = [hop.strip() for hop in forwarded_for.split(",") if hop.strip()]
+        for hop in reversed(hops):
+            if not _trusted(hop):
+                return hop
+        return hops[0] if hops else peer
+    real_ip = request.headers.get("X-Real-IP")
+    if real_ip:
+        return real_ip.strip()
+    return peer
+
+
+def bearer_subject(request: Request) -> str | None:
+    """User id (`sub`) of a valid bearer token, without touching the database"""
+    claims = request.scope.get(CLAIMS_SCOPE_KEY)
+    if claims is not None:
+        # already decoded by JWTAuthMiddleware
+        return claims.get("sub")
+    authorization = request.headers.get("Authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+    except jwt.InvalidTokenError:
+        return None
+
+
+class RateLimiter:
+    """
+    Rate limiting dependency
+
+    - per="ip" buckets by client IP, per="user" by the bearer token subject (falling
+      back to the IP for anonymous requests)
+    - with a `name` every route using the limiter shares one bucket per client,
+      without one each route gets its own
+    - `user_limits` overrides (calls, period) for specific user ids
+    """
+    def __init__(
+        self,
+        calls: int,
+        period: float,
+        per: str = "ip",
+        name: str | None = None,
+        user_limits: dict[str, tuple[int, float]] | None = None,
+        backend=None,
+    ):
+        if per not in ("ip", "user"):
+            raise ValueError("per must be 'ip' or 'user'")
+        self.calls = calls
+        self.period = period
+        self.per = per
+        self.name = name
+        self.user_limits = user_limits or {}
+        self._backend = backend
+
+    @property
+    def backend(self):
+        return self._backend or get_backend()
+
+    def _identity(self, request: Request) -> tuple[str, tuple[int, float]]:
+        if self.per == "user":
+            user_id = bearer_subject(request)
+            if user_id is not None:
+                return f"user:{user_id}", self.user_limits.get(user_id, (self.calls, self.period))
+        return f"ip:{client_ip(request)}", (self.calls, self.period)
+
+    async def __call__(self, request: Request):
+        identity, (calls, period) = self._identity(request)
+        route = request.scope.get("route")
+        scope = self.name or getattr(route, "path", request.url.path)
+        key = f"{scope}|{identity}"
+
+        backend = self.backend
+        if backend.blocking:
+            allowed, retry_after = await anyio.to_thread.run_sync(backend.acquire, key, calls / period, calls)
+        else:
+            allowed, retry_after = backend.acquire(key, calls / period, calls)
+        if not allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"Rate limit exceeded: {calls} calls per {period:g} seconds",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+        return True
+
+
+def configured_limiter(name: str, default: str, per: str = "user") -> RateLimiter:
+    """Limiter for a router, its limit can be overridden through RATE_LIMITS"""
+    calls, period = parse_limits(RATE_LIMITS).get(name, parse_limit(default))
+    return RateLimiter(calls, period, per=per, user_limits=parse_limits(RATE_LIMIT_USERS))
@@ -0,0 +1,77 @@
+"""
+Response helpers shared by the routers
+"""
+
+import asyncio
+import json
+import mimetypes
+from typing import Any, Callable, Literal
+
+from starlette.background import BackgroundTask
+from starlette.responses import JSONResponse, Response, StreamingResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ResponseFormat = Literal["json", "binary", "stream"]
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+def media_type_for(file_format: str) -> str:
+    return mimetypes.guess_type(f"file.{file_format}")[0] or "application/octet-stream"
+
+def direct_response(
+    data: bytes,
+    file_format: str,
+    response_format: ResponseFormat,
+    persist: Callable[[], object],
+    headers: dict[str, str] | None = None,
+) -> Response:
+    """
+    Return the encoded output as the response body instead of a JSON body with local_path
+
+    - binary: the body is sent first, `persist` runs as a background task afterwards
+    - stream: the body is streamed in chunks while `persist` runs concurrently in a thread
+    """
+    media_type = media_type_for(file_format)
+    if response_format == "binary":
+        return Response(content=data, media_type=media_type, headers=headers, background=BackgroundTask(persist))
+
+    async def body():
+        write = asyncio.get_running_loop().run_in_executor(None, persist)
+        view = memoryview(data)
+        for start in range(0, len(view), STREAM_CHUNK_SIZE):
+            yield bytes(view[start:start + STREAM_CHUNK_SIZE])
+        await write
+
+    return StreamingResponse(body(), media_type=media_type, headers={**(headers or {}), "content-length": str(len(data))})
+
+
+def _default(obj: Any):
+    # arrays orjson does not serialize natively (non-contiguous, object dtype) and the stdlib fallback
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def json_dumps(content: Any) -> bytes:
+    """Serialize to compact UTF-8 JSON, NumPy arrays and scalars included"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response serialized with orjson (stdlib json when it is not installed)
+
+    For routes without a response_model: routes with one keep FastAPI's own path,
+    which serializes the validated model to bytes in pydantic-core. Returning an
+    instance directly also skips jsonable_encoder, so NumPy arrays are written
+    without a .tolist() copy.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return json_dumps(content)
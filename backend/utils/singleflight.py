@@ -0,0 +1,78 @@
+"""
+Single-flight coalescing of identical in-flight requests
+
+Double clicks and client retries send the same request while the first one is
+still running. The first caller (the leader) starts the computation as its own
+task; identical requests arriving before it finishes attach to that task and get
+the same result (or exception) instead of queueing a second generation.
+
+Every caller waits with its own timeout, and a caller that times out or
+disconnects does not cancel the computation, the other callers keep waiting
+for it. Once it finishes the key is released, later requests compute again
+(repeated results are the job of the caches, not of this layer).
+"""
+
+import asyncio
+import copy
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
+
+
+def canonical_key(*parts: Any, **params: Any) -> str:
+    """Hash of the request parameters, independent of keyword order"""
+    payload = json.dumps({"parts": parts, "params": params}, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    # all state is only touched from the event loop, no locking needed
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: dict[str, asyncio.Task] = {}
+        self.leaders = 0
+        self.joined = 0
+        self.timeouts = 0
+
+    def _release(self, key: str, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # the result may have no waiter left, retrieve the exception so it is not reported as unhandled
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]], timeout: float | None = None) -> T:
+        """
+        Run fn() once per key among concurrent callers and return its result
+        `timeout` (seconds) bounds this caller's wait only, raises TimeoutError
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._release(key, done))
+            self.leaders += 1
+        else:
+            self.joined += 1
+        try:
+            # shield: a caller giving up must not cancel the computation the others wait for
+            result = await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        # callers must not see each other's modifications of a shared dict
+        return copy.copy(result)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "joined": self.joined,
+            "timeouts": self.timeouts,
+        }
+
+
+def deadline_timeout(deadline_ms: float | None) -> float | None:
+    return None if deadline_ms is None else deadline_ms / 1000
@@ -0,0 +1,205 @@
+"""
+Static file serving for generated assets
+
+- legacy static/user_<id>/<timestamp>/... URLs resolve through the object store lookup table
+- ?w=<width>&format=<png|webp|jpeg>&q=<quality> returns a resized/re-encoded derivative,
+  produced on first request and cached on disk under static/derived/; widths round up to
+  DERIVED_WIDTHS, qualities to the nearest of DERIVED_QUALITIES (ignored for PNG) and the
+  directory is kept under DERIVED_MAX_MB, so a source only ever has a few derivatives
+- strong ETags; content-addressed objects (and their derivatives) are served with
+  Cache-Control: immutable, everything else must be revalidated
+- conditional (If-None-Match / If-Modified-Since) and Range requests are handled by
+  starlette's FileResponse/StaticFiles machinery using these headers
+"""
+
+import hashlib
+import io
+import os
+import stat
+import threading
+from pathlib import Path
+from urllib.parse import parse_qs
+
+import anyio
+from PIL import Image
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+from config import AI_IMAGE_ROOT, DERIVED_MAX_MB, DERIVED_QUALITIES, DERIVED_WIDTHS
+from utils.storage import OBJECTS_DIR, object_store, write_atomic
+
+DERIVED_DIR = "derived"
+DERIVED_FORMATS = {"png": "png", "webp": "webp", "jpeg": "jpeg", "jpg": "jpeg"}
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+
+def derivative_params(scope: Scope) -> dict | None:
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    if not any(name in query for name in ("w", "format", "q")):
+        return None
+    try:
+        width = int(query["w"][0]) if "w" in query else None
+        quality = int(query["q"][0]) if "q" in query else 85
+    except ValueError:
+        raise HTTPException(status_code=400, detail="w and q must be integers")
+    file_format = query.get("format", ["png"])[0].lower()
+    if file_format not in DERIVED_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(DERIVED_FORMATS)}")
+    if width is not None and not 0 < width <= DERIVED_WIDTHS[-1]:
+        raise HTTPException(status_code=400, detail=f"w must be between 1 and {DERIVED_WIDTHS[-1]}")
+    if not 1 <= quality <= 100:
+        raise HTTPException(status_code=400, detail="q must be between 1 and 100")
+    if width is not None:
+        width = next(step for step in DERIVED_WIDTHS if step >= width)
+    file_format = DERIVED_FORMATS[file_format]
+    # PNG is lossless, the quality does not change the file
+    quality = None if file_format == "png" else min(DERIVED_QUALITIES, key=lambda step: (abs(step - quality), -step))
+    return {"width": width, "format": file_format, "quality": quality}
+
+
+def make_derivative(source: str, params: dict) -> bytes:
+    with Image.open(source) as img:
+        if params["width"] is not None and params["width"] < img.width:
+            height = max(1, round(img.height * params["width"] / img.width))
+            # reducing_gap does most of the downscale with a cheap box reduction first
+            img = img.resize((params["width"], height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        if params["format"] == "jpeg" and img.mode != "RGB":
+            # JPEG has no alpha, flatten on white
+            rgba = img.convert("RGBA")
+            img = Image.new("RGB", rgba.size, (255, 255, 255))
+            img.paste(rgba, mask=rgba.getchannel("A"))
+        buffer = io.BytesIO()
+        save_kwargs = {} if params["quality"] is None else {"quality": params["quality"]}
+        img.save(buffer, format=params["format"], **save_kwargs)
+        return buffer.getvalue()
+
+
+class DerivedCache:
+    """
+    Size bound of the derivative directory
+    Written bytes are counted in memory, above the limit the oldest files are removed
+    down to 90% of it (the directory is rescanned, so other workers' files are counted too)
+    """
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._size: int | None = None
+        self._lock = threading.Lock()
+
+    def _scan(self) -> list[tuple[float, int, Path]]:
+        files = []
+        for path in self.root.rglob("*"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            if stat.S_ISREG(st.st_mode):
+                files.append((st.st_mtime, st.st_size, path))
+        return files
+
+    def added(self, new_path: Path, size: int):
+        if not self.max_bytes:
+            return
+        with self._lock:
+            if self._size is None:
+                # the new file is already on disk
+                self._size = sum(size for _, size, _ in self._scan())
+            else:
+                self._size += size
+            if self._size <= self.max_bytes:
+                return
+            files = sorted(self._scan())
+            total = sum(size for _, size, _ in files)
+            for _, size, path in files:
+                if total <= self.max_bytes * 0.9:
+                    break
+                if path == new_path:
+                    # about to be served
+                    continue
+                path.unlink(missing_ok=True)
+                total -= size
+            self._size = total
+
+
+class ObjectStaticFiles(StaticFiles):
+    """
+    StaticFiles for the generated assets, see the module docstring
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.root = Path(os.path.realpath(AI_IMAGE_ROOT))
+        self.objects_root = self.root / OBJECTS_DIR
+        self.derived_root = self.root / DERIVED_DIR
+        self.derived_cache = DerivedCache(self.derived_root, DERIVED_MAX_MB * 1024 * 1024)
+
+    def lookup_path(self, path: str) -> tuple[str, os.stat_result | None]:
+        full_path, stat_result = super().lookup_path(path)
+        if stat_result is None:
+            target = object_store.resolve_legacy(path.replace(os.sep, "/"))
+            if target is not None:
+                return super().lookup_path(target)
+        return full_path, stat_result
+
+    def _is_object(self, full_path: str) -> bool:
+        return Path(full_path).is_relative_to(self.objects_root)
+
+    @staticmethod
+    def _source_tag(full_path: str, stat_result: os.stat_result, immutable: bool) -> str:
+        # content-addressed objects are named after the sha256 of their bytes
+        if immutable:
+            return Path(full_path).stem
+        identity = f"{full_path}|{stat_result.st_mtime_ns}|{stat_result.st_size}"
+        return hashlib.sha256(identity.encode("utf-8")).hexdigest()
+
+    def _response(self, full_path, stat_result, scope: Scope, etag: str, immutable: bool, status_code: int = 200) -> Response:
+        headers = {"etag": f'"{etag}"', "cache-control": IMMUTABLE if immutable else REVALIDATE}
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, headers=headers)
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
+
+    def file_response(self, full_path, stat_result, scope: Scope, status_code: int = 200) -> Response:
+        immutable = self._is_object(str(full_path))
+        if immutable:
+            # last use for the LRU retention policy
+            object_store.touch(full_path)
+        etag = self._source_tag(str(full_path), stat_result, immutable)
+        return self._response(full_path, stat_result, scope, etag, immutable, status_code)
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        params = derivative_params(scope)
+        if params is None:
+            return await super().get_response(path, scope)
+        if scope["method"] not in ("GET", "HEAD"):
+            raise HTTPException(status_code=405, headers={"Allow": "GET, HEAD"})
+
+        full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path)
+        if stat_result is None or not stat.S_ISREG(stat_result.st_mode):
+            raise HTTPException(status_code=404)
+        if full_path.lower().endswith(".svg"):
+            raise HTTPException(status_code=400, detail="SVG files have no raster derivatives")
+
+        immutable = self._is_object(full_path)
+        if immutable:
+            object_store.touch(full_path)
+        source_tag = self._source_tag(full_path, stat_result, immutable)
+        key = hashlib.sha256(
+            f"{source_tag}|{params['width']}|{params['format']}|{params['quality']}".encode("utf-8")
+        ).hexdigest()
+        derived_path = self.derived_root / key[:2] / f"{key}.{params['format']}"
+
+        def ensure() -> os.stat_result:
+            try:
+                return os.stat(derived_path)
+            except FileNotFoundError:
+                write_atomic(derived_path, make_derivative(full_path, params))
+                derived_stat = os.stat(derived_path)
+                self.derived_cache.added(derived_path, derived_stat.st_size)
+                return derived_stat
+
+        derived_stat = await anyio.to_thread.run_sync(ensure)
+        return self._response(str(derived_path), derived_stat, scope, key, immutable)
@@ -0,0 +1,233 @@
+"""
+Content-addressed storage for generated assets
+
+Objects live under static/objects/<aa>/<bb>/<sha256>.<ext>, so identical bytes are
+stored once and no directory ever holds more than a few hundred entries.
+Writes go to a temp file in the target shard and are renamed into place.
+A compact SQLite index (outside the served directory) keeps:
+    - user_objects: which user produced which object
+    - legacy_paths: old static/user_<id>/<timestamp>/... paths -> object, so URLs
+      handed out before the migration keep resolving
+    - object_access: last time an object was served, for the LRU retention policy;
+      reads are collected in memory and written in batches by flush_access()
+An object file is deleted only once no user references it any more, see
+services/storage/retention_service.py.
+"""
+
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from config import AI_IMAGE_ROOT, STORAGE_INDEX_PATH
+
+OBJECTS_DIR = "objects"
+
+
+class ObjectStore:
+    def __init__(self, root: Path = AI_IMAGE_ROOT, index_path: str = STORAGE_INDEX_PATH):
+        self.root = Path(root)
+        self.objects = self.root / OBJECTS_DIR
+        os.makedirs(self.objects, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(index_path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS user_objects ("
+            " user_id TEXT NOT NULL, digest TEXT NOT NULL, ext TEXT NOT NULL,"
+            " size INTEGER NOT NULL, is_output INTEGER NOT NULL, created_at REAL NOT NULL,"
+            " PRIMARY KEY (user_id, digest, ext)) WITHOUT ROWID"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS legacy_paths ("
+            " path TEXT PRIMARY KEY, digest TEXT NOT NULL, ext TEXT NOT NULL) WITHOUT ROWID"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS object_access ("
+            " digest TEXT NOT NULL, ext TEXT NOT NULL, accessed_at REAL NOT NULL,"
+            " PRIMARY KEY (digest, ext)) WITHOUT ROWID"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS user_objects_digest ON user_objects (digest, ext)")
+        # (digest, ext) -> last access, flushed to object_access in batches
+        self._accessed: dict[tuple[str, str], float] = {}
+        # touch() runs on the event loop, flush_access() in a worker thread
+        self._access_lock = threading.Lock()
+
+    def relative_path(self, digest: str, ext: str) -> str:
+        return f"{OBJECTS_DIR}/{digest[:2]}/{digest[2:4]}/{digest}.{ext}"
+
+    def object_path(self, digest: str, ext: str) -> Path:
+        return self.root / self.relative_path(digest, ext)
+
+    @staticmethod
+    def digest(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def write(self, data: bytes, file_format: str, digest: str | None = None) -> tuple[str, Path]:
+        """Store the bytes if they are new, return (digest, path)"""
+        ext = file_format.lower()
+        digest = digest or self.digest(data)
+        path = self.object_path(digest, ext)
+        # deduplication: identical bytes are already in place
+        if not path.exists():
+            write_atomic(path, data)
+        return digest, path
+
+    def index(self, user_id: str, digest: str, ext: str, size: int, is_output: bool = True):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR IGNORE INTO user_objects VALUES (?, ?, ?, ?, ?, ?)",
+                (user_id, digest, ext.lower(), size, int(is_output), time.time()),
+            )
+
+    def put(self, user_id: str, data: bytes, file_format: str = "png", is_output: bool = True, digest: str | None = None) -> str:
+        """Store bytes for a user and return the local path (relative to the working directory)"""
+        digest, path = self.write(data, file_format, digest)
+        self.index(user_id, digest, file_format, len(data), is_output)
+        # retention may have removed the unreferenced file between write() and index()
+        if not path.exists():
+            write_atomic(path, data)
+        return str(path)
+
+    def put_image(self, user_id: str, img, file_format: str = "png", is_output: bool = True) -> str:
+        return self.put(user_id, encode_image(img, file_format), file_format, is_output)
+
+    def put_text(self, user_id: str, text: str, file_format: str = "svg", is_output: bool = True) -> str:
+        return self.put(user_id, text.encode("utf-8"), file_format, is_output)
+
+    def user_objects(self, user_id: str) -> list[str]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT digest, ext FROM user_objects WHERE user_id = ? ORDER BY created_at", (user_id,)
+            ).fetchall()
+        return [str(self.object_path(digest, ext)) for digest, ext in rows]
+
+    def touch(self, path: str | Path):
+        """Record that an object was served, only a dict assignment on the request path"""
+        path = Path(path)
+        with self._access_lock:
+            self._accessed[(path.stem, path.suffix.lstrip("."))] = time.time()
+
+    def flush_access(self) -> int:
+        with self._access_lock:
+            accessed, self._accessed = self._accessed, {}
+        if accessed:
+            with self._lock:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO object_access VALUES (?, ?, ?)",
+                    [(digest, ext, at) for (digest, ext), at in accessed.items()],
+                )
+        return len(accessed)
+
+    def references(self) -> list[tuple[str, str, str, int, float, float]]:
+        """Every (user_id, digest, ext, size, created_at, last_used) reference"""
+        with self._lock:
+            return self._db.execute(
+                "SELECT u.user_id, u.digest, u.ext, u.size, u.created_at, MAX(u.created_at, COALESCE(a.accessed_at, 0))"
+                " FROM user_objects u LEFT JOIN object_access a ON a.digest = u.digest AND a.ext = u.ext"
+            ).fetchall()
+
+    def legacy_targets(self) -> dict[str, tuple[str, str]]:
+        with self._lock:
+            rows = self._db.execute("SELECT path, digest, ext FROM legacy_paths").fetchall()
+        return {path: (digest, ext) for path, digest, ext in rows}
+
+    def drop_references(self, references: list[tuple[str, str, str]]):
+        """Remove (user_id, digest, ext) references, the files are left to delete_unreferenced"""
+        with self._lock:
+            self._db.executemany("DELETE FROM user_objects WHERE user_id = ? AND digest = ? AND ext = ?", references)
+
+    def delete_unreferenced(self, digest: str, ext: str) -> int:
+        """
+        Delete an object file that no user references any more, return the bytes reclaimed
+        The check and the unlink happen under the index lock, put() re-creates a file
+        removed between its write and its index entry
+        """
+        path = self.object_path(digest, ext)
+        with self._lock:
+            referenced = self._db.execute(
+                "SELECT 1 FROM user_objects WHERE digest = ? AND ext = ? LIMIT 1", (digest, ext)
+            ).fetchone()
+            if referenced:
+                return 0
+            try:
+                size = path.stat().st_size
+                path.unlink()
+            except FileNotFoundError:
+                size = 0
+            self._db.execute("DELETE FROM object_access WHERE digest = ? AND ext = ?", (digest, ext))
+            self._db.execute("DELETE FROM legacy_paths WHERE digest = ? AND ext = ?", (digest, ext))
+        return size
+
+    def resolve_legacy(self, path: str) -> str | None:
+        """Map an old path (relative to the static root) to its object path (relative to the static root)"""
+        with self._lock:
+            row = self._db.execute("SELECT digest, ext FROM legacy_paths WHERE path = ?", (path,)).fetchone()
+        return self.relative_path(*row) if row else None
+
+    def migrate_legacy(self, remove: bool = True) -> dict:
+        """
+        Move every file of the old static/user_<id>/<timestamp>/{output,input}/ layout into
+        the object store and record the old path in the lookup table
+        """
+        migrated, deduplicated = 0, 0
+        for user_dir in self.root.glob("user_*"):
+            user_id = user_dir.name[len("user_"):]
+            for file in list(user_dir.rglob("*")):
+                if not file.is_file():
+                    continue
+                data = file.read_bytes()
+                ext = file.suffix.lstrip(".") or "bin"
+                digest = self.digest(data)
+                if self.object_path(digest, ext).exists():
+                    deduplicated += 1
+                self.write(data, ext)
+                self.index(user_id, digest, ext, len(data), is_output=file.parent.name == "output")
+                legacy = file.relative_to(self.root).as_posix()
+                with self._lock:
+                    self._db.execute("INSERT OR REPLACE INTO legacy_paths VALUES (?, ?, ?)", (legacy, digest, ext))
+                if remove:
+                    file.unlink()
+                migrated += 1
+            if remove:
+                # remove the emptied per-second directories, deepest first
+                for directory in sorted(user_dir.rglob("*"), key=lambda p: len(p.parts), reverse=True):
+                    if directory.is_dir() and not any(directory.iterdir()):
+                        directory.rmdir()
+                if not any(user_dir.iterdir()):
+                    user_dir.rmdir()
+        return {"migrated": migrated, "deduplicated": deduplicated}
+
+
+def write_atomic(path: Path, data: bytes):
+    """Write through a temp file in the same directory and rename it into place"""
+    os.makedirs(path.parent, exist_ok=True)
+    tmp_path = path.parent / f".{path.name}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            os.remove(tmp_path)
+
+
+def encode_image(img, file_format: str = "png") -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, format=file_format)
+    return buffer.getvalue()
+
+
+object_store = ObjectStore()
+
+
+if __name__ == "__main__":
+    # python -m utils.storage: migrate the old per-second directories into the object store
+    print(object_store.migrate_legacy())